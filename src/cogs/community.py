@@ -13,7 +13,7 @@ from utils.cog_class import Cog
 from utils.ctx_class import MyContext
 from utils.human_time import ShortTime
 from utils.interaction import make_message_embed
-from utils.models import AccessLevel, get_from_db
+from utils.models import ACCESS_LEVELS, AccessLevel
 
 async def wait_cd(monitored_player, ctx, name, dt):
     _ = await ctx.get_translate_function(user_language=True)
@@ -117,8 +117,7 @@ class Community(Cog):
         if not await self.is_in_server(message):
             return
 
-        ctx: MyContext = await self.bot.get_context(message, cls=MyContext)
-        db_member = None
+        ctx: MyContext = await self.bot.get_message_dispatch(message).context()
 
         if message.author.id == 555955826880413696:
             await self.epic_rpg_cooldowns(message)
@@ -155,10 +154,7 @@ class Community(Cog):
                             or not permissions.read_messages
                     ):
                         # The user can't read messages
-                        db_member = db_member or await get_from_db(
-                            message.author, as_user=True
-                        )
-                        if db_member.access_level_override < AccessLevel.BOT_MODERATOR:
+                        if ACCESS_LEVELS.get_access_level(message.author.id) < AccessLevel.BOT_MODERATOR:
                             # And isn't a BOT_MODERATOR or higher, so we won't show anything.
                             continue
                     try:
@@ -333,7 +329,7 @@ class Community(Cog):
                 )
 
         if is_pingable:
-            ctx: MyContext = await self.bot.get_context(message, cls=MyContext)
+            ctx: MyContext = await self.bot.get_message_dispatch(message).context()
             rpg_role = await self.get_rpg_role(ctx)
             _ = await ctx.get_translate_function()
             await ctx.send(
@@ -352,7 +348,7 @@ class Community(Cog):
             return
 
         if is_cooldown:
-            ctx: MyContext = await self.bot.get_context(message, cls=MyContext)
+            ctx: MyContext = await self.bot.get_message_dispatch(message).context()
             try:
                 monitored_player_id = int(embed.author.icon_url.split("/")[4])  # ID
             except ValueError:
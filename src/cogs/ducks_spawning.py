@@ -1,17 +1,35 @@
 import asyncio
+import collections
 import datetime
+import functools
+import gc
 import json
+import math
 import random
 from time import time
-from typing import Dict
+from typing import Deque, Dict, Iterable, List, Tuple
 
 import discord
 
 from utils import ducks
 from utils.cog_class import Cog
-from utils.ducks import deserialize_duck, GhostDuck
+from utils.ducks import GhostDuck, restore_channel_ducks
 from utils.events import Events
-from utils.models import DiscordChannel, DucksLeft, get_enabled_channels
+from utils.models import (
+    DIRTY_CHANNELS,
+    QUERY_STATS,
+    DiscordChannel,
+    DucksLeft,
+    get_channels,
+    get_enabled_channels,
+    get_from_db,
+    give_back_to_all_players,
+    invalidate_cache,
+)
+from utils.planning import plan_channels
+from utils.rate_limits import FairShares, SpawnDispatcher, TokenBucket
+from utils.snapshots import SpawnSnapshot, dump_snapshot, paused_gc, read_snapshot, write_snapshot
+from utils.spawn_timeline import SpawnTimeline
 
 SECOND = 1
 MINUTE = 60 * SECOND
@@ -19,55 +37,119 @@ HOUR = 60 * MINUTE
 DAY = 24 * HOUR
 
 
+class ShardSpawner:
+    """
+    The spawning state of a single shard: the timeline of its channels, the spawns waiting for the rate limits, and
+    how long its last iterations took. Its loop also makes the ducks of the shard leave.
+    """
+
+    def __init__(self, shard_id: int, dispatcher: SpawnDispatcher):
+        self.shard_id = shard_id
+        self.timeline = SpawnTimeline()
+        self.dispatcher = dispatcher
+        self.task: asyncio.Task = None
+
+        self.paused = True
+        # Whether bot.allow_ducks_spawning was off on the last iteration
+        self.spawning_disabled = False
+        # Spawns waiting for the rate limits when the shard last dispatched, its demand for the global bucket
+        self.waiting_spawns = 0
+        self.last_tick_at = 0
+        self.tick_durations: Deque[float] = collections.deque(maxlen=600)
+
+    def tick_duration_percentile(self, percentile: float) -> float:
+        if not self.tick_durations:
+            return 0
+        tick_durations = sorted(self.tick_durations)
+        return tick_durations[min(len(tick_durations) - 1, int(len(tick_durations) * percentile / 100))]
+
+
 class DucksSpawning(Cog):
     hidden = True
     DISCORD_BUG_THRESHOLD = 250
+    DISABLE_BATCH_SIZE = 100
+    NEVER_DISABLE_CHANNELS = {
+        853566725621809172,  # Dank memer channel, they lock the server every so often
+    }
+    SNAPSHOT_PATH = "cache/spawn_state.snapshot"
+    LEGACY_CACHE_PATH = "cache/ducks_spawned_cache.json"
+    EVENT_CACHE_PATH = "cache/event_cache.json"
+    READY_DELAY = 5
 
     def __init__(self, bot, *args, **kwargs):
         super().__init__(bot, *args, **kwargs)
         self.index = 0
+        self.shards: Dict[int, ShardSpawner] = {}
+        # Channels whose spawn settings changed, replanned on the next iteration
+        self.dirty_channels: Dict[int, DiscordChannel] = DIRTY_CHANNELS
+        # Channels left to refresh from the database for the new day, with the DucksLeft they were planned with when
+        # the day changed, and the settings it was planned from
+        self.rollover_queue: Deque[Tuple[discord.TextChannel, DucksLeft, tuple]] = collections.deque()
+        self.rollover_total = 0
+        self.rollover_started_at = 0
 
     async def cog_load(self) -> None:
         self.background_loop = self.bot.loop.create_task(self.loop())
         self.interval = 1
         self.last_planned_day = 0
         self.current_iteration_public = 0
+        self.snapshot_interval = self.config().get("snapshot_interval", 60)
+        self.rollover_window = self.config().get("rollover_window", 10 * MINUTE)
+        # Don't overwrite the last snapshot with an empty state before it has been restored
+        self.restored = False
+
+        now = int(time())
+        rate_limits = dict(self.config().get("spawn_rate_limits", {}))
+        # All the shards use the same bot token, so they share the global rate limit.
+        self.global_bucket = TokenBucket(
+            rate_limits.pop("global_rate", 20), rate_limits.pop("global_burst", 20), now
+        )
+        self.global_shares = FairShares(self.global_bucket)
+        self.shard_rate_limits = rate_limits
+
+    def get_shard(self, shard_id: int) -> ShardSpawner:
+        """
+        Get the spawning state of a shard, starting its loop the first time it is seen.
+        """
+        spawner = self.shards.get(shard_id)
+        if spawner is None:
+            dispatcher = SpawnDispatcher(
+                self.global_bucket, **self.shard_rate_limits, now=int(time())
+            )
+            spawner = self.shards[shard_id] = ShardSpawner(shard_id, dispatcher)
+            spawner.task = self.bot.loop.create_task(self.shard_loop(spawner))
+        return spawner
 
-    async def loop(self):
-        try:
-            await self.before()
-        except:
-            self.bot.logger.exception("Error in before_loop")
-            raise
+    async def run_every_second(self, name: str, callback):
         now = time()
         current_iteration = int(now)
-        while not self.background_loop.cancelled():
+        while True:
             # Precalculate timings
             now = time()
             current_iteration = current_iteration + self.interval
-            self.current_iteration_public = current_iteration
 
             delay = now - current_iteration
             if delay >= 30:
                 self.bot.logger.error(
-                    f"Ignoring iterations to compensate for delays ({delay} seconds)!"
+                    f"{name}: Ignoring iterations to compensate for delays ({delay} seconds)!"
                 )
                 current_iteration = int(now)
             elif delay >= 5:
                 self.bot.logger.warning(
-                    f"Loop running with severe delays ({delay} seconds)!"
+                    f"{name}: Loop running with severe delays ({delay} seconds)!"
                 )
 
             self.bot.logger.debug(
-                f"Ducks spawning loop : [{int(current_iteration)}/{int(now)}]"
+                f"{name} : [{int(current_iteration)}/{int(now)}]"
             )
 
             # Loop part
             try:
-                await self.spawn_ducks(current_iteration)
+                with QUERY_STATS.scope(f"task {name}"):
+                    await callback(current_iteration)
             except Exception as e:
                 self.bot.logger.exception(
-                    "Ignoring exception inside loop and hoping for the best..."
+                    f"{name}: Ignoring exception inside loop and hoping for the best..."
                 )
 
             # Loop the loop
@@ -75,97 +157,54 @@ class DucksSpawning(Cog):
             next_iteration = current_iteration + self.interval
             await asyncio.sleep(max(0.0, next_iteration - now))
 
-    async def spawn_ducks(self, now: int):
-        SECONDS_SPENT_TODAY = now % 86400
-        SECONDS_LEFT_TODAY = 86400 - SECONDS_SPENT_TODAY
-
-        if self.bot.allow_ducks_spawning:
-            start_spawning = time()
-            ducks_spawned = 0
-            for channel, ducks_left_to_spawn in self.bot.enabled_channels.items():
-                maybe_spawn_type = await ducks_left_to_spawn.maybe_spawn_type(now)
-                if maybe_spawn_type is not None:
-                    if (
-                            self.bot.current_event == Events.CONNECTION
-                            and random.randint(1, 10) == 10
-                    ):
-                        continue
-
-                    if self.bot.current_event == Events.HAUNTED_HOUSE:
-                        asyncio.ensure_future(
-                            GhostDuck(
-                                self.bot,
-                                channel,
-                            ).spawn()
-                        )
-                    else:
-                        asyncio.ensure_future(
-                            ducks.spawn_random_weighted_duck(
-                                self.bot,
-                                channel,
-                                ducks_left_to_spawn.db_channel,
-                                sun=maybe_spawn_type,
-                            )
-                        )
-                    ducks_spawned += 1
-
-                    if (
-                            self.bot.current_event == Events.MIGRATING
-                            and random.randint(1, 10) == 10
-                    ):
-                        asyncio.ensure_future(
-                            ducks.spawn_random_weighted_duck(
-                                self.bot,
-                                channel,
-                                ducks_left_to_spawn.db_channel,
-                                sun=maybe_spawn_type,
-                            )
-                        )
-                        ducks_spawned += 1
-
-                if ducks_spawned > 20:
-                    self.bot.logger.warning(
-                        f"Tried to make more than {ducks_spawned} ducks spawn at once, "
-                        f"stopping there to protect rate limits..."
-                    )
-                    break
+    async def loop(self):
+        try:
+            await self.before()
+        except:
+            self.bot.logger.exception("Error in before_loop")
+            raise
 
-            end_spawning = time()
+        for shard_id in self.bot.shards.keys():
+            self.get_shard(shard_id)
 
-            if end_spawning - start_spawning > 0.7:
-                duration = round(end_spawning - start_spawning, 2)
-                self.bot.logger.error(
-                    f"Spawning {ducks_spawned} ducks took more than {duration} seconds..."
-                )
+        await self.run_every_second("Ducks spawning loop", self.tick)
 
-        start_leaving = time()
-        total_leaves = 0
-        for channel, ducks_queue in self.bot.ducks_spawned.copy().items():
-            for duck in ducks_queue.copy():
-                left = await duck.maybe_leave()
-                if not left:
-                    break
-                else:
-                    total_leaves += 1
+    async def shard_loop(self, spawner: ShardSpawner):
+        await self.run_every_second(
+            f"Shard {spawner.shard_id} spawning loop", functools.partial(self.shard_tick, spawner)
+        )
 
-            if total_leaves > 25:
-                self.bot.logger.warning(
-                    f"Tried to make more than {total_leaves} ducks leave at once, "
-                    f"stopping there to protect rate limits..."
-                )
-                break
+    async def shard_tick(self, spawner: ShardSpawner, now: int):
+        if spawner.shard_id not in self.bot.shards_ready:
+            # Spawns and departures that become due while the shard is offline stay in the timeline and in the
+            # departures index, and are caught up (through the rate limits) once it reconnects.
+            spawner.paused = True
+            return
+
+        spawner.paused = False
+        start = time()
+        await self.leave_ducks(now, spawner)
+        await self.spawn_ducks(now, spawner)
+        spawner.last_tick_at = now
+        spawner.tick_durations.append(time() - start)
+
+    def waiting_spawns(self) -> Dict[int, int]:
+        return {
+            shard_id: spawner.waiting_spawns
+            for shard_id, spawner in self.shards.items()
+            if not spawner.paused
+        }
 
-        end_leaving = time()
+    async def tick(self, now: int):
+        self.current_iteration_public = now
 
-        if end_leaving - start_leaving > 0.7:
-            duration = round(end_leaving - start_leaving, 2)
-            self.bot.logger.error(
-                f"Leaving {total_leaves} ducks took more than {duration} seconds..."
-            )
+        self.replan_dirty(now)
 
         CURRENT_PLANNED_DAY = now - (now % DAY)
         if CURRENT_PLANNED_DAY != self.last_planned_day:
-            await self.planify(now)
+            self.start_rollover(now)
+            # Don't block the spawns while the database is busy
+            self.bot.loop.create_task(self.daily_giveback())
             embed = discord.Embed()
 
             embed.colour = discord.Colour.green()
@@ -179,96 +218,293 @@ class DucksSpawning(Cog):
                 embed.set_footer(text="Freetime happens every 24 hours.")
             await self.bot.log_to_channel(embed=embed)
 
+        SECONDS_LEFT_TODAY = DAY - (now % DAY)
         if SECONDS_LEFT_TODAY % HOUR == 0:
             await self.change_event()
 
+        if self.rollover_queue:
+            await self.continue_rollover(now)
+
+        if now % self.snapshot_interval == 0:
+            await self.save_snapshot(now)
+
+    async def spawn_ducks(self, now: int, spawner: ShardSpawner):
+        if not self.bot.allow_ducks_spawning:
+            spawner.spawning_disabled = True
+            spawner.waiting_spawns = 0
+            return
+
+        if spawner.spawning_disabled:
+            # The spawns that became due while spawning was disabled would all come out at once: the ducks left are
+            # planned again over the rest of the day instead.
+            spawner.spawning_disabled = False
+            spawner.timeline.rebuild(
+                (
+                    ducks_left
+                    for channel, ducks_left in self.bot.enabled_channels.items()
+                    if channel.guild.shard_id == spawner.shard_id
+                ),
+                now,
+            )
+
+        timeline = spawner.timeline
+        dispatcher = spawner.dispatcher
+
+        start_spawning = time()
+        while True:
+            due = timeline.pop_due(now)
+            if due is None:
+                break
+
+            planned_at, ducks_left_to_spawn, maybe_spawn_type = due
+            channel = ducks_left_to_spawn.channel
+
+            if self.bot.enabled_channels.get(channel) is not ducks_left_to_spawn:
+                # The channel was replanned or disabled since this spawn was planned.
+                continue
+
+            if not ducks_left_to_spawn.consume(maybe_spawn_type):
+                continue
+
+            timeline.plan(ducks_left_to_spawn, planned_at)
+
+            if (
+                    self.bot.current_event == Events.CONNECTION
+                    and random.randint(1, 10) == 10
+            ):
+                continue
+
+            dispatcher.push(
+                planned_at,
+                channel.guild.id,
+                channel.id,
+                (ducks_left_to_spawn, maybe_spawn_type, True),
+            )
+
+        # The shards tick in their own tasks, so the first one to dispatch computes the shares of this second before
+        # the others have pushed their due spawns. The shares are computed from the spawns every shard had waiting on
+        # the previous second instead, so that the order in which the shards tick doesn't matter.
+        global_share = self.global_shares.share(spawner.shard_id, now, self.waiting_spawns)
+        spawner.waiting_spawns = len(dispatcher)
+
+        ducks_spawned = 0
+        for ducks_left_to_spawn, maybe_spawn_type, can_migrate in dispatcher.dispatch(now, global_share):
+            channel = ducks_left_to_spawn.channel
+
+            if channel not in self.bot.enabled_channels:
+                # The channel was disabled while the spawn was waiting for the rate limits.
+                continue
+
+            if self.bot.current_event == Events.HAUNTED_HOUSE:
+                asyncio.ensure_future(
+                    GhostDuck(
+                        self.bot,
+                        channel,
+                    ).spawn()
+                )
+            else:
+                asyncio.ensure_future(
+                    ducks.spawn_random_weighted_duck(
+                        self.bot,
+                        channel,
+                        ducks_left_to_spawn.db_channel,
+                        sun=maybe_spawn_type,
+                    )
+                )
+            ducks_spawned += 1
+
+            if (
+                    can_migrate
+                    and self.bot.current_event == Events.MIGRATING
+                    and random.randint(1, 10) == 10
+            ):
+                # Another duck comes along, it has to wait for the rate limits too.
+                dispatcher.push(
+                    now,
+                    channel.guild.id,
+                    channel.id,
+                    (ducks_left_to_spawn, maybe_spawn_type, False),
+                )
+
+        if len(dispatcher) >= 100 and now % MINUTE == 0:
+            self.bot.logger.warning(
+                f"{len(dispatcher)} ducks spawns are deferred on shard {spawner.shard_id} to protect rate limits, "
+                f"p90 wait time is {dispatcher.wait_time_percentile(90)} seconds."
+            )
+
+        if now % MINUTE == 0:
+            dispatcher.prune(now)
+
+        end_spawning = time()
+
+        if end_spawning - start_spawning > 0.7:
+            duration = round(end_spawning - start_spawning, 2)
+            self.bot.logger.error(
+                f"Spawning {ducks_spawned} ducks on shard {spawner.shard_id} took more than {duration} seconds..."
+            )
+
+    async def leave_ducks(self, now: int, spawner: ShardSpawner):
+        start_leaving = time()
+        total_leaves = 0
+        while True:
+            duck = self.bot.ducks_departures.pop_due(now, spawner.shard_id)
+            if duck is None:
+                break
+
+            if duck not in self.bot.ducks_spawned.get(duck.channel, ()):
+                # The duck was removed from the channel without despawning (channel cleared, kamikaze, ...)
+                continue
+
+            time_left = await duck.get_time_left()
+            if time_left > 0:
+                # Time to live was raised since the duck spawned
+                self.bot.ducks_departures.schedule(duck, now + time_left, spawner.shard_id)
+                continue
+
+            await duck.leave()
+            total_leaves += 1
+
+            if total_leaves > 25:
+                self.bot.logger.warning(
+                    f"Tried to make more than {total_leaves} ducks leave at once on shard {spawner.shard_id}, "
+                    f"stopping there to protect rate limits. The others will leave on the next iterations..."
+                )
+                break
+
+        end_leaving = time()
+
+        if end_leaving - start_leaving > 0.7:
+            duration = round(end_leaving - start_leaving, 2)
+            self.bot.logger.error(
+                f"Leaving {total_leaves} ducks on shard {spawner.shard_id} took more than {duration} seconds..."
+            )
+
     def cog_unload(self):
         self.bot.logger.warning(f"Unloading DucksSpawning cog...")
 
         try:
             self.background_loop.cancel()
+            for spawner in self.shards.values():
+                spawner.task.cancel()
         except:
-            self.bot.logger.exception(f"Couldn't cancel the background loop...")
-
-        self.bot.logger.info(f"Saving ducks to cache...")
-
-        ducks_spawned = self.bot.ducks_spawned
+            self.bot.logger.exception(f"Couldn't cancel the background loops...")
+
+        if self.restored:
+            self.bot.logger.info(f"Saving ducks to cache...")
+            snapshot = self.build_snapshot(time())
+            write_snapshot(self.SNAPSHOT_PATH, dump_snapshot(snapshot))
+            self.bot.logger.info(f"Saved {len(snapshot.ducks)} ducks to {self.SNAPSHOT_PATH}")
+
+    def build_snapshot(self, now: float) -> SpawnSnapshot:
+        ducks_spawned = [
+            (channel.id, duck.serialize())
+            # Copy to avoid
+            # RuntimeError: dictionary changed size during iteration
+            for channel, channel_ducks in self.bot.ducks_spawned.copy().items()
+            for duck in channel_ducks
+        ]
+
+        ducks_left = {
+            channel.id: (ducks_left.day_ducks, ducks_left.night_ducks)
+            for channel, ducks_left in self.bot.enabled_channels.items()
+        }
 
-        ducks_count = 0
+        rollover_pending = frozenset(
+            channel.id
+            for channel, ducks_left, _ in self.rollover_queue
+            if self.bot.enabled_channels.get(channel) is ducks_left
+        )
 
-        serialized = {}
+        return SpawnSnapshot(now, self.last_planned_day, ducks_spawned, ducks_left, rollover_pending)
 
-        # Copy to avoid
-        # RuntimeError: dictionary changed size during iteration
-        for channel, ducks in ducks_spawned.copy().items():
-            ducks_in_channel = []
-            for duck in ducks:
-                ducks_in_channel.append(duck.serialize())
-                ducks_count += 1
-            serialized[channel.id] = ducks_in_channel
+    async def save_snapshot(self, now: float):
+        start = time()
+        data = dump_snapshot(self.build_snapshot(now))
+        await self.bot.loop.run_in_executor(None, write_snapshot, self.SNAPSHOT_PATH, data)
 
-        with open("cache/ducks_spawned_cache.json", "w") as f:
-            json.dump(serialized, f)
+        self.bot.logger.debug(
+            f"Saved a {len(data)} bytes snapshot of the spawning state in {round(time() - start, 3)} seconds"
+        )
 
-        self.bot.logger.info(f"Saved {ducks_count} to cache/ducks_spawned_cache.json")
+    async def planify(self, now=None, db_channels=None, ducks_left_counts=None):
+        """
+        Plan the ducks spawns for the rest of the day on every enabled channel.
 
-    async def planify(self, now=None):
+        ducks_left_counts maps channel IDs to (day ducks, night ducks) left to spawn, for channels that shouldn't
+        be planned again (restored from a snapshot taken the same day).
+        """
         if now is None:
             now = int(time())
 
         self.last_planned_day = now - (now % DAY)
 
-        db_channels = await get_enabled_channels()
+        if db_channels is None:
+            db_channels = await get_enabled_channels()
+
+        if ducks_left_counts is None:
+            ducks_left_counts = {}
 
         self.bot.logger.debug(f"Planifying ducks spawns on {len(db_channels)} channels")
 
         channels_to_disable = []
+        enabled_channels: Dict[discord.TextChannel, DucksLeft] = {}
 
         channels: Dict[int, discord.TextChannel] = {
             c.id: c for c in self.bot.get_all_channels()
         }
-        i = 0
 
+        available_channels = []
+        available_db_channels = []
         for db_channel in db_channels:
-            i += 1
             channel = channels.get(db_channel.discord_id)
 
-            if i % 500 == 0:
-                await asyncio.sleep(0)
-                self.bot.logger.debug(
-                    f"Planifying ducks spawns on {i}/{len(db_channels)} channels"
-                )
-
             if channel:
-                self.bot.enabled_channels[channel] = await DucksLeft(
-                    channel
-                ).compute_ducks_count(db_channel, now)
+                available_channels.append(channel)
+                available_db_channels.append(db_channel)
             else:
                 # self.bot.logger.warning(
                 #    f"Channel {db_channel.name} is unknown, marking for disable"
                 # )
                 channels_to_disable.append(db_channel)
 
+        day_ducks, night_ducks = plan_channels(available_db_channels, now)
+
+        for channel, db_channel, channel_day_ducks, channel_night_ducks in zip(
+            available_channels,
+            available_db_channels,
+            day_ducks.tolist(),
+            night_ducks.tolist(),
+        ):
+            channel_day_ducks, channel_night_ducks = ducks_left_counts.get(
+                channel.id, (channel_day_ducks, channel_night_ducks)
+            )
+            enabled_channels[channel] = DucksLeft(
+                channel,
+                day_ducks=channel_day_ducks,
+                night_ducks=channel_night_ducks,
+                db_channel=db_channel,
+            )
+
+        self.bot.enabled_channels = enabled_channels
+
+        shards_channels: Dict[int, List[DucksLeft]] = collections.defaultdict(list)
+        for channel, ducks_left in enabled_channels.items():
+            shards_channels[channel.guild.shard_id].append(ducks_left)
+
+        for shard_id in set(shards_channels.keys()) | set(self.shards.keys()):
+            self.get_shard(shard_id).timeline.rebuild(shards_channels[shard_id], now)
+
+        self.bot.logger.debug(
+            f"Planned the next ducks spawns on {len(enabled_channels)} channels, over {len(self.shards)} shards"
+        )
+
         if 0 < len(channels_to_disable) < self.DISCORD_BUG_THRESHOLD:
             self.bot.logger.warning(
                 f"Disabling {len(channels_to_disable)} channels "
                 f"that are no longer available to the bot."
             )
-            for db_channel in channels_to_disable:
-                # TODO : We can probably only do 1 big query here, but for that I'd have to learn Tortoise.
-                # To be honest, improvement would be limited since 100 queries max isn't that slow and there obviously
-                # aren't that many channels that get disabled during a reboot...
-                if db_channel.discord_id == 853566725621809172:
-                    # Skip dank memer channel, they lock the server every so often
-                    continue
-
-                db_channel.enabled = False
-                await db_channel.save()
-                await asyncio.sleep(0)  # Just in case
-            self.bot.logger.warning(
-                f"Disabled {len(channels_to_disable)} channels "
-                f"that are no longer available to the bot."
-            )
+            # Don't block the spawns while the database is busy
+            self.bot.loop.create_task(self.disable_channels(channels_to_disable))
         elif len(channels_to_disable) >= self.DISCORD_BUG_THRESHOLD:
             self.bot.logger.error(
                 f"Too many unavailable channels ({len(channels_to_disable)}) "
@@ -284,49 +520,102 @@ class DucksSpawning(Cog):
         else:
             self.bot.logger.debug(f"All the channels are available :)")
 
+    async def disable_channels(self, db_channels: List[DiscordChannel]):
+        """
+        Disable channels that are no longer available to the bot, with one UPDATE query per batch of channels.
+        """
+        channels_ids = [
+            db_channel.discord_id
+            for db_channel in db_channels
+            if db_channel.discord_id not in self.NEVER_DISABLE_CHANNELS
+        ]
+
+        try:
+            for i in range(0, len(channels_ids), self.DISABLE_BATCH_SIZE):
+                await DiscordChannel.filter(
+                    discord_id__in=channels_ids[i:i + self.DISABLE_BATCH_SIZE]
+                ).update(enabled=False)
+        except Exception:
+            self.bot.logger.exception(f"Couldn't disable {len(channels_ids)} unavailable channels")
+            return
+
+        for channel_id in channels_ids:
+            invalidate_cache(DiscordChannel, channel_id)
+
+        self.bot.logger.warning(
+            f"Disabled {len(channels_ids)} channels "
+            f"that are no longer available to the bot."
+        )
+
+    async def daily_giveback(self):
+        """
+        Refill the magazines and give back the confiscated weapons of every player at freetime, with a few UPDATE
+        queries, rather than one per player on their first command of the day.
+        """
+        start = time()
+        try:
+            with QUERY_STATS.scope("task Daily giveback"):
+                players_count = await give_back_to_all_players()
+        except Exception:
+            self.bot.logger.exception("Couldn't run the daily giveback, players will get it on their next command")
+            return
+
+        self.bot.logger.info(f"Gave back to {players_count} players in {round(time() - start, 3)} seconds")
+
     async def before(self):
         self.bot.logger.info(f"Waiting for ready-ness to planify duck spawns...")
 
         await self.bot.wait_until_ready()
-        # Wait 5 seconds because discord.py can send the ready event a little bit too early
-        await asyncio.sleep(5)
+        # Wait because discord.py can send the ready event a little bit too early
+        await asyncio.sleep(self.READY_DELAY)
         # Then try again to make sure we are still good.
         await self.bot.wait_until_ready()
 
         self.bot.logger.info(f"Restoring ducks from cache...")
 
-        ducks_count = 0
-        try:
-            with open("cache/ducks_spawned_cache.json", "r") as f:
-                serialized = json.load(f)
-        except FileNotFoundError:
-            self.bot.logger.warning(
-                "No ducks_spawned_cache.json found. Normal on first run."
-            )
-            serialized = {}
+        now = int(time())
+        with paused_gc():
+            try:
+                snapshot = read_snapshot(self.SNAPSHOT_PATH)
+            except ValueError:
+                self.bot.logger.exception(f"Couldn't read {self.SNAPSHOT_PATH}, ignoring it.")
+                snapshot = None
 
-        self.bot.logger.info(f"Loaded JSON file...")
+            if snapshot is None:
+                snapshot = self.read_legacy_cache(now)
 
-        self.bot.logger.debug(f"Building channels hash table for fast-access...")
-        channels = {c.id: c for c in self.bot.get_all_channels()}
-        self.bot.logger.debug(f"Hash table built, restoring ducks...")
+            self.bot.logger.info(f"Loaded snapshot taken at {int(snapshot.taken_at)}...")
 
-        for channel_id, ducks in serialized.items():
-            channel = channels.get(int(channel_id), None)
+            self.bot.logger.debug(f"Building channels hash table for fast-access...")
+            channels = {c.id: c for c in self.bot.get_all_channels()}
+            db_channels = await get_enabled_channels()
+            db_channels_by_id = {db_channel.discord_id: db_channel for db_channel in db_channels}
+            self.bot.logger.debug(f"Hash table built, restoring ducks...")
 
-            if channel:
-                for data in ducks:
-                    ducks_count += 1
-                    duck = deserialize_duck(self.bot, channel, data)
-                    await duck.spawn(loud=False)
+            ducks_count = await self.restore_ducks(snapshot, channels, db_channels_by_id)
 
-        self.bot.logger.info(f"{ducks_count} ducks restored!")
+            # The ducks and the channels stay alive for minutes at least: move them out of the garbage collector
+            # generations, so that the next collections don't go through all of them again. They are still freed
+            # when they aren't referenced anymore.
+            gc.freeze()
 
-        await asyncio.sleep(1)
+        self.bot.logger.info(f"{ducks_count} ducks restored!")
 
-        self.bot.logger.info(f"Planifying ducks spawns for the rest of the day")
+        if snapshot.planned_day == now - (now % DAY):
+            self.bot.logger.info(f"Restoring ducks spawns for the rest of the day")
+            # The channels the rollover didn't refresh from the database before the restart are planned again, from
+            # their current settings
+            ducks_left_counts = {
+                channel_id: counts
+                for channel_id, counts in snapshot.ducks_left.items()
+                if channel_id not in snapshot.rollover_pending
+            }
+        else:
+            self.bot.logger.info(f"Planifying ducks spawns for the rest of the day")
+            ducks_left_counts = None
 
-        await self.planify()
+        await self.planify(now, db_channels=db_channels, ducks_left_counts=ducks_left_counts)
+        self.restored = True
 
         embed = discord.Embed()
 
@@ -349,7 +638,7 @@ class DucksSpawning(Cog):
         self.bot.logger.info(f"Restoring an event for the rest of the hour")
 
         try:
-            with open("cache/event_cache.json", "r") as f:
+            with open(self.EVENT_CACHE_PATH, "r") as f:
                 event_cache = json.load(f)
             event_name = event_cache["current_event"]
             event = Events[event_name]
@@ -372,25 +661,181 @@ class DucksSpawning(Cog):
 
         self.bot.logger.info(f"Ducks spawning started")
 
-    async def calculate_ducks_per_day(self, db_channel: DiscordChannel, now: int):
-        # TODO : Compute ducks sleep
-        ducks_per_day = db_channel.ducks_per_day
+    async def restore_ducks(
+        self,
+        snapshot: SpawnSnapshot,
+        channels: Dict[int, discord.TextChannel],
+        db_channels_by_id: Dict[int, DiscordChannel],
+    ) -> int:
+        """
+        Put the ducks of a snapshot back on their channels. The channels that aren't enabled anymore are loaded with
+        a query per batch, instead of a lookup per duck.
+        """
+        # Grouped by ID, discord objects are slower to hash
+        ducks_by_channel_id: Dict[int, List[dict]] = collections.defaultdict(list)
+        for channel_id, data in snapshot.ducks:
+            ducks_by_channel_id[channel_id].append(data)
+
+        ducks_by_channel: Dict[discord.TextChannel, List[dict]] = {}
+        for channel_id, channel_ducks in ducks_by_channel_id.items():
+            channel = channels.get(channel_id, None)
+            if channel:
+                ducks_by_channel[channel] = channel_ducks
 
-        seconds_elapsed = now % DAY
-        seconds_left_in_day = DAY - seconds_elapsed
+        db_channels_by_id = dict(db_channels_by_id)
+        missing_ids = [channel.id for channel in ducks_by_channel if channel.id not in db_channels_by_id]
+        for db_channel in await get_channels(missing_ids):
+            db_channels_by_id[db_channel.discord_id] = db_channel
 
-        pct_day = round(seconds_elapsed / DAY, 2) * 100
+        ducks_count = 0
+        departures: Dict[int, List[Tuple[ducks.Duck, float]]] = collections.defaultdict(list)
+        for channel, channel_ducks in ducks_by_channel.items():
+            db_channel = db_channels_by_id.get(channel.id)
+            if db_channel is None:
+                # Not in the database at all
+                db_channel = await get_from_db(channel)
+
+            departures[channel.guild.shard_id].extend(
+                restore_channel_ducks(self.bot, channel, db_channel, channel_ducks)
+            )
+            ducks_count += len(channel_ducks)
+
+        for shard_id, shard_departures in departures.items():
+            self.bot.ducks_departures.schedule_many(shard_departures, shard_id)
+
+        return ducks_count
 
-        ducks = int((seconds_left_in_day * ducks_per_day) / DAY)
+    def read_legacy_cache(self, now: int) -> SpawnSnapshot:
+        """
+        Read the ducks saved by older versions, that didn't save the ducks left to spawn.
+        """
+        try:
+            with open(self.LEGACY_CACHE_PATH, "r") as f:
+                serialized = json.load(f)
+        except FileNotFoundError:
+            self.bot.logger.warning(
+                f"No {self.SNAPSHOT_PATH} found. Normal on first run."
+            )
+            serialized = {}
 
-        # self.bot.logger.debug(f"Recomputing : {pct_day}% day done, {ducks}/{ducks_per_day} ducks to spawn today")
+        ducks_spawned = [
+            (int(channel_id), data)
+            for channel_id, channel_ducks in serialized.items()
+            for data in channel_ducks
+        ]
+
+        return SpawnSnapshot(now, 0, ducks_spawned, {})
+
+    def mark_dirty(self, db_channel: DiscordChannel):
+        """
+        Replan a channel on the next iteration, after its enabled status, ducks per day or night changed. Saving the
+        channel does it, this is only needed when it's changed some other way.
+
+        The db_channel given is used as is to plan the spawns, so it must be up-to-date.
+        """
+        self.dirty_channels[db_channel.discord_id] = db_channel
+
+    def replan_dirty(self, now: int):
+        if not self.dirty_channels:
+            return
+
+        dirty_channels = list(self.dirty_channels.values())
+        self.dirty_channels.clear()
+        self.replan_channels(now, dirty_channels)
+
+        self.bot.logger.debug(f"Replanned {len(dirty_channels)} dirty channels")
+
+    def replan_channels(self, now: int, db_channels: Iterable[DiscordChannel]):
+        """
+        Plan the spawns for the rest of the day on a few channels, enabling or disabling them as needed.
+        """
+        channels = []
+        enabled_db_channels = []
+        for db_channel in db_channels:
+            channel = self.bot.get_channel(db_channel.discord_id)
+            if channel is None:
+                continue
+
+            if db_channel.enabled:
+                channels.append(channel)
+                enabled_db_channels.append(db_channel)
+            else:
+                self.bot.enabled_channels.pop(channel, None)
+
+        if not enabled_db_channels:
+            return
+
+        day_ducks, night_ducks = plan_channels(enabled_db_channels, now)
+
+        for channel, db_channel, channel_day_ducks, channel_night_ducks in zip(
+            channels,
+            enabled_db_channels,
+            day_ducks.tolist(),
+            night_ducks.tolist(),
+        ):
+            ducks_left = DucksLeft(
+                channel,
+                day_ducks=channel_day_ducks,
+                night_ducks=channel_night_ducks,
+                db_channel=db_channel,
+            )
+            self.bot.enabled_channels[channel] = ducks_left
+            self.get_shard(channel.guild.shard_id).timeline.plan(ducks_left, now)
+
+    def start_rollover(self, now: int):
+        """
+        Plan the new day. Every channel is planned right away, from the settings in use. Their settings are then
+        refreshed from the database a few channels at a time over the rollover window, so that the database isn't hit
+        by every channel at midnight, and the channels whose settings changed there are planned again.
+        """
+        self.last_planned_day = now - (now % DAY)
+        db_channels = [ducks_left.db_channel for ducks_left in self.bot.enabled_channels.values()]
+        self.replan_channels(now, db_channels)
+
+        self.rollover_queue = collections.deque(
+            (channel, ducks_left, ducks_left.db_channel.spawn_planning_settings())
+            for channel, ducks_left in self.bot.enabled_channels.items()
+        )
+        self.rollover_total = len(self.rollover_queue)
+        self.rollover_started_at = now
+
+        self.bot.logger.info(
+            f"Refreshing the settings of {self.rollover_total} channels over {self.rollover_window} seconds"
+        )
+
+    async def continue_rollover(self, now: int):
+        elapsed = now - self.rollover_started_at + 1
+        target = math.ceil(self.rollover_total * min(1.0, elapsed / self.rollover_window))
+        done = self.rollover_total - len(self.rollover_queue)
+
+        batch = []
+        for _ in range(min(len(self.rollover_queue), target - done)):
+            channel, ducks_left, planning_settings = self.rollover_queue.popleft()
+            if self.bot.enabled_channels.get(channel) is ducks_left:
+                # Otherwise, the channel was replanned or disabled since the day changed
+                batch.append((channel, ducks_left, planning_settings))
+
+        if not batch:
+            return
+
+        # Shared with the cache, so that settings changes reach the planned channels
+        db_channels = await get_channels(channel.id for channel, _, _ in batch)
+        db_channels_by_id = {db_channel.discord_id: db_channel for db_channel in db_channels}
+
+        changed_db_channels = []
+        for channel, ducks_left, planning_settings in batch:
+            db_channel = db_channels_by_id.get(channel.id)
+            if db_channel is None:
+                self.bot.enabled_channels.pop(channel, None)
+            elif db_channel.spawn_planning_settings() != planning_settings:
+                changed_db_channels.append(db_channel)
+            else:
+                ducks_left.db_channel = db_channel
 
-        return ducks
+        self.replan_channels(now, changed_db_channels)
 
-    async def recompute_channel(self, channel: discord.TextChannel):
-        self.bot.enabled_channels[channel] = await DucksLeft(
-            channel
-        ).compute_ducks_count()
+        if not self.rollover_queue:
+            self.bot.logger.info(f"Refreshed the settings of {self.rollover_total} channels")
 
     async def change_event(self, force_choice=None, force=False):
         can_not_select_event = not force and not force_choice
@@ -444,7 +889,7 @@ class DucksSpawning(Cog):
 
         await self.bot.log_to_channel(embed=embed)
 
-        with open("cache/event_cache.json", "w") as f:
+        with open(self.EVENT_CACHE_PATH, "w") as f:
             json.dump({
                 "current_event": self.bot.current_event.name,
                 "stay_tuned_was_n_events_ago": self.bot.stay_tuned_was_n_events_ago,
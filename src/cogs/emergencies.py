@@ -1,6 +1,7 @@
 """
 The emergencies command group, allowing for finer control of the bot, raw debugging and statistics.
 """
+import time
 from typing import Set
 
 import discord
@@ -13,7 +14,8 @@ from utils.cog_class import Cog
 from utils.ctx_class import MyContext
 from utils.ducks import Map
 from utils.events import Events
-from utils.models import AccessLevel, get_from_db
+from utils.models import ACCESS_LEVELS, AccessLevel, DB_CACHE, DB_LOCKS, LEADERBOARDS, PLAYERS_WRITE_BUFFER, QUERY_STATS, get_from_db
+from utils.query_stats import ScopeStats
 
 
 def _(message):
@@ -58,6 +60,33 @@ class Emergencies(Cog):
             f"Ducks spawns have been reset based on the current time of the day."
         )
 
+    @manage_bot.command(aliases=["spawns_queue", "deferred_spawns"])
+    async def spawn_queue(self, ctx: MyContext):
+        """
+        Show statistics about the ducks spawns deferred to protect Discord rate limits, and about the spawning
+        loop of every shard.
+        """
+        ducks_spawning = self.bot.get_cog("DucksSpawning")
+        now = int(time.time())
+
+        message = [f"Global bucket: {ducks_spawning.global_bucket.tokens:.1f} tokens left."]
+        for shard_id, spawner in sorted(ducks_spawning.shards.items()):
+            dispatcher = spawner.dispatcher
+            status = "paused" if spawner.paused else "running"
+            message.append(
+                f"**Shard {shard_id}** ({status}, last tick {now - spawner.last_tick_at}s ago): "
+                f"{len(dispatcher)} spawns waiting (max {dispatcher.max_depth}), "
+                f"{dispatcher.total_dispatched} dispatched, {dispatcher.total_deferred} deferrals, "
+                f"wait p50={dispatcher.wait_time_percentile(50)}s p90={dispatcher.wait_time_percentile(90)}s "
+                f"p99={dispatcher.wait_time_percentile(99)}s, "
+                f"tick p50={spawner.tick_duration_percentile(50) * 1000:.1f}ms "
+                f"p99={spawner.tick_duration_percentile(99) * 1000:.1f}ms."
+            )
+
+        # Keep messages under the 2000 characters limit
+        for i in range(0, len(message), 5):
+            await ctx.reply("\n".join(message[i:i + 5]))
+
     @manage_bot.command(aliases=["disable_spawns"])
     async def stop_spawns(self, ctx: MyContext):
         """
@@ -229,12 +258,97 @@ class Emergencies(Cog):
 
     @manage_bot.command()
     async def locks(self, ctx):
-        ret = []
-        for chid, sema in ctx.bot.concurrency._mapping.items():
-            channel = ctx.bot.get_channel(chid)
-            ret.append(f"{channel.guild.id} ({channel.guild.name}) - {channel.id} ({channel.name} <#{channel.id}>) - {sema}")
+        serializer = ctx.bot.commands_serializer
+        total = serializer.total
+        ret = [
+            f"**Commands queues**: {len(serializer)} channels running commands (peak: {serializer.peak}), "
+            f"{total.commands} commands, {total.waited} waited {total.wait_time:.2f}s in total "
+            f"(average: {total.average_wait_time:.2f}s, max: {total.max_wait_time:.2f}s), "
+            f"{total.refused} refused with more than {serializer.max_queue_length} waiting."
+        ]
+        for channel_id, waiting, running_for in serializer.busiest():
+            ret.append(f"- <#{channel_id}> ({channel_id}): {waiting} waiting, running for {running_for:.1f}s")
+        for channel_id, stats in serializer.slowest():
+            if stats.waited:
+                ret.append(
+                    f"- <#{channel_id}> ({channel_id}): {stats.waited}/{stats.commands} commands waited "
+                    f"{stats.wait_time:.2f}s (max: {stats.max_wait_time:.2f}s), {stats.refused} refused"
+                )
+
+        ret.append(
+            f"**Database locks**: {len(DB_LOCKS)} in use (peak: {DB_LOCKS.peak}), "
+            f"{DB_LOCKS.acquisitions} acquisitions, {DB_LOCKS.contended} contended "
+            f"({DB_LOCKS.contention_rate:.1%}), {DB_LOCKS.wait_time:.2f}s spent waiting, "
+            f"at most {DB_LOCKS.max_waiters} waiters on a key."
+        )
+        for key, waiters in DB_LOCKS.most_contended():
+            ret.append(f"- `{key}`: {waiters} waiting")
 
         await ctx.send("\n".join(ret))
 
+    @manage_bot.command(aliases=["cache"])
+    async def db_cache(self, ctx: MyContext, clear: bool = False):
+        """
+        Show statistics about the get_from_db and leaderboards caches, and optionally clear them.
+        """
+        if clear:
+            DB_CACHE.clear()
+            LEADERBOARDS.clear()
+
+        await ctx.reply(
+            f"{len(DB_CACHE)} objects cached, using about {DB_CACHE.memory / 1024 / 1024:.1f}MiB "
+            f"of the {DB_CACHE.max_memory / 1024 / 1024:.0f}MiB budget (TTL: {DB_CACHE.ttl}s).\n"
+            f"{DB_CACHE.hits} hits, {DB_CACHE.misses} misses, {DB_CACHE.refreshes} refreshes "
+            f"(hit rate: {DB_CACHE.hit_rate:.1%}), {DB_CACHE.evictions} evictions, "
+            f"{DB_CACHE.invalidations} invalidations."
+        )
+        await ctx.send(
+            f"Leaderboards of {len(LEADERBOARDS)}/{LEADERBOARDS.max_channels} channels cached "
+            f"(TTL: {LEADERBOARDS.ttl}s), {LEADERBOARDS.hits} hits, {LEADERBOARDS.loads} loads "
+            f"(hit rate: {LEADERBOARDS.hit_rate:.1%}), {LEADERBOARDS.evictions} evictions."
+        )
+        await ctx.send(
+            f"{len(ACCESS_LEVELS)} access levels in memory, {len(ACCESS_LEVELS.banned_users())} banned users, "
+            f"{ACCESS_LEVELS.reloads} reloads (every {ACCESS_LEVELS.ttl}s)."
+        )
+        if PLAYERS_WRITE_BUFFER.enabled:
+            await ctx.send(
+                f"Players write-behind ({PLAYERS_WRITE_BUFFER.interval}s): {len(PLAYERS_WRITE_BUFFER)} pending, "
+                f"{PLAYERS_WRITE_BUFFER.coalesced_saves} saves coalesced in {PLAYERS_WRITE_BUFFER.rows_written} "
+                f"rows written ({PLAYERS_WRITE_BUFFER.coalescing_ratio:.1f} saves/row) "
+                f"by {PLAYERS_WRITE_BUFFER.statements} batched UPDATEs."
+            )
+
+    @manage_bot.command()
+    async def queries(self, ctx: MyContext, sort_by: str = "queries", reset: bool = False):
+        """
+        Show the commands and tasks running the most database queries.
+        Sort by queries (total), average_queries, max_queries, duration, over_budget or n_plus_one.
+        """
+        if sort_by not in ScopeStats.__slots__ and sort_by != "average_queries":
+            await ctx.reply(f"Can't sort by {sort_by}.")
+            return
+
+        ret = [
+            f"Budget: {QUERY_STATS.budget} queries per command. "
+            f"{QUERY_STATS.unattributed.queries} queries made outside of commands and tasks."
+        ]
+        for name, stats in QUERY_STATS.top(key=sort_by):
+            line = (
+                f"**{name}**: {stats.invocations} runs, {stats.queries} queries "
+                f"(avg {stats.average_queries:.1f}, max {stats.max_queries}), "
+                f"{stats.duration * 1000:.0f}ms, {stats.over_budget} over budget, {stats.n_plus_one} N+1"
+            )
+            if stats.repeated_statement:
+                line += f"\n> `{stats.repeated_statement[:150]}`"
+            ret.append(line)
+
+        if reset:
+            QUERY_STATS.reset()
+
+        # Keep messages under the 2000 characters limit
+        for i in range(0, len(ret), 5):
+            await ctx.reply("\n".join(ret[i:i + 5]))
+
 
 setup = Emergencies.setup
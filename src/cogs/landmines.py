@@ -4,7 +4,7 @@ from typing import List, Optional
 import babel.lists
 import discord
 from babel.dates import format_timedelta
-from discord import HTTPException, Thread
+from discord import HTTPException
 from discord.ext import commands
 from discord.ext.commands import BucketType, MaxConcurrency
 from tortoise import timezone
@@ -13,7 +13,7 @@ from utils import checks, models
 from utils.bot_class import MyBot
 from utils.cog_class import Cog
 from utils.ctx_class import MyContext
-from utils.models import AccessLevel, DiscordMember, get_from_db
+from utils.models import ACCESS_LEVELS
 
 
 def _(message):
@@ -34,9 +34,7 @@ class Event2021(Cog):
         if user.bot:
             return False
 
-        db_member: DiscordMember = await get_from_db(user)
-
-        if db_member.get_access_level() == AccessLevel.BANNED:
+        if ACCESS_LEVELS.is_banned(user.id, user.guild.id):
             return False
 
         return True
@@ -63,31 +61,26 @@ class Event2021(Cog):
             # No perms
             return
 
-        if isinstance(message.channel, Thread):
-            channel = message.channel.parent
-        else:
-            channel = message.channel
-
-        db_channel = await models.get_from_db(channel)
+        dispatch = self.bot.get_message_dispatch(message)
+        db_channel = await dispatch.db_channel()
 
         if not db_channel:
-            ctx: MyContext = await self.bot.get_context(message, cls=MyContext)
+            ctx: MyContext = await dispatch.context()
             ctx.logger.warning(
-                f"Channel {channel} ({type(channel).__name__}) not found in database by get_from_db, weird.."
+                f"Channel {message.channel} ({type(message.channel).__name__}) not found in database by get_from_db, weird.."
             )
             ctx.logger.warning(
-                f"Channel {channel.id} not found in database by get_from_db, weird."
+                f"Channel {message.channel.id} not found in database by get_from_db, weird."
             )
             return
 
         if not db_channel.landmines_enabled:
             return
 
-        if not await self.user_can_play(message.author):
+        if message.author.bot or dispatch.is_banned():
             return
 
-        ctx: MyContext = await self.bot.get_context(message, cls=MyContext)
-        if ctx.valid:
+        if await dispatch.is_command():
             # It's just a command.
             return
 
@@ -104,6 +97,7 @@ class Event2021(Cog):
             landmine = await models.get_landmine(message.guild, message.content)
 
             if landmine:
+                ctx: MyContext = await dispatch.context()
                 _ = await ctx.get_translate_function()
                 landmine.stopped_by = db_target
                 landmine.stopped_at = timezone.now()
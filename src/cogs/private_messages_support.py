@@ -748,8 +748,7 @@ class PrivateMessagesSupport(Cog):
             return
 
         guild = message.guild
-        ctx = await self.bot.get_context(message, cls=MyContext)
-        if ctx.valid:
+        if await self.bot.get_message_dispatch(message).is_command():
             # It's just a command.
             return
 
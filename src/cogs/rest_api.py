@@ -3,10 +3,11 @@ from typing import Optional, Union
 
 import aiohttp_cors
 from aiohttp import web
-from aiohttp.web_exceptions import HTTPForbidden, HTTPNotFound
+from aiohttp.web_exceptions import HTTPBadRequest, HTTPForbidden, HTTPNotFound
 from discord.ext.commands import Group
 
 from utils.cog_class import Cog
+from utils.leaderboards import get_leaderboard_players
 from utils.models import AccessLevel, DiscordChannel, Player, get_from_db
 
 
@@ -19,7 +20,7 @@ class RestAPI(Cog):
     `/api/channels`  [Global Authentication required] -> Returns some information about all channels enabled on the bot.
     `/api/channels/{channel_id}`  [Authentication required] -> Returns information about the channel, like the ducks currently spawned.
     `/api/channels/{channel_id}/settings`  [Authentication required] -> Returns channel settings
-    `/api/channels/{channel_id}/top` [No authentication required] -> Returns the top scores (all players on the channel and some info about players)
+    `/api/channels/{channel_id}/top` [No authentication required] -> Returns the top scores (the players on the channel and some info about players), a page of 100 players at a time. Use `?limit=N` to get pages of up to 1000 players, and `&after=` with the X-Next-After header of the previous page to get the next one.
     `/api/channels/{channel_id}/player/{player_id}` [No authentication required] -> Returns *all* the data for a specific user
 
     **Authentication**:
@@ -34,6 +35,10 @@ class RestAPI(Cog):
     Api keys (local or global) are uuid4, and look like this : `d84af260-c806-4066-8387-1d5144b7fa72`
     """
 
+    # Players per page of /top
+    TOP_PAGE_SIZE = 100
+    TOP_MAX_PAGE_SIZE = 1000
+
     def __init__(self, bot, *args, **kwargs):
         super().__init__(bot, *args, **kwargs)
 
@@ -166,15 +171,14 @@ class RestAPI(Cog):
         if not channel:
             raise HTTPNotFound(reason="Unknown channel")
 
-        players = (
-            await Player.all()
-            .filter(channel__discord_id=channel.id)
-            .order_by("-experience")
-            .prefetch_related("member__user")
-        )
+        try:
+            limit = int(request.query.get("limit", self.TOP_PAGE_SIZE))
+            after = tuple(map(int, request.query["after"].split(","))) if "after" in request.query else None
+        except ValueError:
+            raise HTTPBadRequest(reason="limit must be a number, and after <experience>,<id>")
 
-        if not players:
-            raise HTTPNotFound(reason="Unknown channel in database")
+        if not 1 <= limit <= self.TOP_MAX_PAGE_SIZE:
+            raise HTTPBadRequest(reason=f"limit must be between 1 and {self.TOP_MAX_PAGE_SIZE}")
 
         fields = [
             "experience",
@@ -184,8 +188,18 @@ class RestAPI(Cog):
             "shooting_stats",
         ]
 
+        players = await get_leaderboard_players(channel.id, fields, after=after, limit=limit)
+
+        if not players and after is None:
+            raise HTTPNotFound(reason="Unknown channel in database")
+
+        headers = {}
+        if len(players) == limit:
+            # Cursor for the next page
+            headers["X-Next-After"] = f"{players[-1].experience},{players[-1].id}"
+
         return web.json_response(
-            [player.serialize(serialize_fields=fields) for player in players]
+            [player.serialize(serialize_fields=fields) for player in players], headers=headers
         )
 
     async def player_info(self, request):
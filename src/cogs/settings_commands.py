@@ -483,6 +483,7 @@ class SettingsCommands(Cog):
             db_guild.prefix = new_prefix
 
             await db_guild.save()
+            self.bot.prefix_index.set_guild_prefix(ctx.guild.id, new_prefix)
 
         if db_guild.prefix:
             await ctx.send(
@@ -690,7 +691,6 @@ class SettingsCommands(Cog):
             await ctx.send(
                 _("Ducks will spawn on {channel.mention}", channel=ctx.channel)
             )
-            await self.bot.get_cog("DucksSpawning").recompute_channel(ctx.channel)
         else:
             await ctx.send(
                 _("Ducks won't spawn on {channel.mention}", channel=ctx.channel)
@@ -1005,8 +1005,7 @@ class SettingsCommands(Cog):
                 )
                 return
             elif value > maximum_value:
-                db_member = await get_from_db(ctx.author)
-                if db_member.get_access_level() >= models.AccessLevel.BOT_MODERATOR:
+                if models.ACCESS_LEVELS.get_access_level(ctx.author.id, ctx.guild.id) >= models.AccessLevel.BOT_MODERATOR:
                     res = await ConfirmView(ctx, _).send(
                         _(
                             "⚠️️ You should not set that higher than {maximum_value}, however, you have the required permissions to proceed. "
@@ -1047,7 +1046,6 @@ class SettingsCommands(Cog):
                     value = maximum_value
             db_channel.ducks_per_day = value
             await db_channel.save()
-            await self.bot.get_cog("DucksSpawning").recompute_channel(ctx.channel)
 
         await ctx.send(
             _(
@@ -1133,6 +1131,9 @@ class SettingsCommands(Cog):
             db_channel.ducks_time_to_live = value
             await db_channel.save()
 
+            for duck in self.bot.ducks_spawned.get(ctx.channel, ()):
+                await duck.schedule_departure(db_channel)
+
         await ctx.send(
             _(
                 "On {channel.mention}, ducks will stay for {value} seconds.",
@@ -1313,9 +1314,8 @@ class SettingsCommands(Cog):
             db_channel.night_end_at = seconds_night_end
 
             await db_channel.save()
-            await self.bot.get_cog("DucksSpawning").recompute_channel(ctx.channel)
 
-        sun, duration_of_night, time_left_sun = await compute_sun_state(ctx.channel)
+        sun, duration_of_night, time_left_sun = await compute_sun_state(ctx.channel, db_channel=db_channel)
 
         duration_of_night_td = format_timedelta(
             datetime.timedelta(seconds=duration_of_night), locale=language_code
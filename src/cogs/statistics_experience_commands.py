@@ -1,4 +1,5 @@
 import asyncio
+import typing
 from typing import Union
 
 import discord
@@ -8,18 +9,51 @@ from utils import checks, models
 from utils.achievements import achievements
 from utils.cog_class import Cog
 from utils.ctx_class import MyContext
-from utils.models import DiscordChannel, Player, get_from_db, get_player
+from utils.leaderboards import LeaderboardCursor, LeaderboardRow, get_leaderboard_page, get_player_rank
+from utils.models import LEADERBOARDS, DiscordChannel, Player, get_from_db, get_player
 
 
 def _(message):
     return message
 
 
-class TopScoresSource(menus.ListPageSource):
-    def __init__(self, ctx: MyContext, data, title):
-        super().__init__(data, per_page=6)
+class TopScoresSource(menus.PageSource):
+    """
+    Leaderboard pages, fetched from the database when shown. Only the previous/next buttons are available, since
+    each page starts where the previous one ended.
+    """
+
+    def __init__(self, ctx: MyContext, title):
         self.ctx = ctx
         self.title = title
+        self.per_page = 6
+        # Page number -> cursor to fetch it
+        self.cursors: typing.Dict[int, typing.Optional[LeaderboardCursor]] = {0: None}
+        self.first_page: typing.List[LeaderboardRow] = []
+        self.has_more_pages = False
+
+    async def prepare(self):
+        rows = await get_leaderboard_page(self.ctx.channel.id, limit=self.per_page + 1)
+        self.has_more_pages = len(rows) > self.per_page
+        self.first_page = rows[:self.per_page]
+        if self.first_page:
+            self.cursors[1] = self.first_page[-1].cursor
+
+    def is_paginating(self):
+        return self.has_more_pages
+
+    async def get_page(self, page_number):
+        if page_number == 0:
+            return self.first_page
+        elif page_number not in self.cursors:
+            raise IndexError(page_number)
+
+        rows = await get_leaderboard_page(self.ctx.channel.id, after=self.cursors[page_number], limit=self.per_page)
+        if not rows:
+            raise IndexError(page_number)
+
+        self.cursors[page_number + 1] = rows[-1].cursor
+        return rows
 
     async def format_page(self, menu, entries):
         _ = await self.ctx.get_translate_function()
@@ -31,9 +65,9 @@ class TopScoresSource(menus.ListPageSource):
         offset = menu.current_page * self.per_page
 
         for i, item in enumerate(entries, start=offset):
-            item: Player
+            item: LeaderboardRow
             e.add_field(
-                name=f"**{i + 1}** - {item.member.user}",
+                name=f"**{i + 1}** - {item.user}",
                 value=_("{exp} experience", exp=item.experience),
                 inline=False,
             )
@@ -42,14 +76,7 @@ class TopScoresSource(menus.ListPageSource):
 
 async def show_topscores_pages(ctx, title: str):
     pages = menus.MenuPages(
-        source=TopScoresSource(
-            ctx,
-            await Player.all()
-            .filter(channel__discord_id=ctx.channel.id)
-            .order_by("-experience")
-            .prefetch_related("member__user"),
-            title,
-        ),
+        source=TopScoresSource(ctx, title),
         clear_reactions_after=True,
     )
     await pages.start(ctx)
@@ -91,6 +118,7 @@ class StatisticsCommands(Cog):
             inline=True,
         )
         embed.add_field(name=_("Experience"), value=db_hunter.experience, inline=True)
+        embed.add_field(name=_("Rank"), value=f"#{await get_player_rank(db_hunter)}", inline=True)
         embed.add_field(
             name=_("Level"),
             value=str(level_info["level"]) + " - " + _(level_info["name"]).title(),
@@ -735,6 +763,7 @@ class StatisticsCommands(Cog):
                 db_channel = await get_from_db(ctx.channel)
 
             await Player.filter(channel=db_channel).delete()
+            LEADERBOARDS.invalidate(db_channel.discord_id)
 
             await ctx.send(
                 _(
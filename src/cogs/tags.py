@@ -10,8 +10,8 @@ from utils.checks import BotIgnore
 from utils.cog_class import Cog
 from utils.ctx_class import MyContext
 from utils.models import (
+    ACCESS_LEVELS,
     AccessLevel,
-    DiscordMember,
     DiscordUser,
     Tag,
     TagAlias,
@@ -281,11 +281,11 @@ class Tags(Cog):
             )
             return
 
-        db_member: DiscordMember = await get_from_db(ctx.author)
+        access = ACCESS_LEVELS.get_access_level(ctx.author.id, ctx.guild.id if ctx.guild else None)
         tag_owner: DiscordUser = await tag.owner
         if (
             tag_owner.discord_id != ctx.author.id
-            and db_member.get_access_level() < AccessLevel.TRUSTED
+            and access < AccessLevel.TRUSTED
         ):
             await ctx.reply(_("❌ You don't own that tag, you can't edit it."))
             return
@@ -317,11 +317,11 @@ class Tags(Cog):
             await ctx.reply(_("❌ This tag doesn't exist."))
             return
 
-        db_member: DiscordMember = await get_from_db(ctx.author)
+        access = ACCESS_LEVELS.get_access_level(ctx.author.id, ctx.guild.id if ctx.guild else None)
         tag_owner: DiscordUser = await tag.owner
         if (
             tag_owner.discord_id != ctx.author.id
-            and db_member.get_access_level() < AccessLevel.TRUSTED
+            and access < AccessLevel.TRUSTED
         ):
             await ctx.reply(_("❌ You don't own that tag, you can't delete it."))
             return
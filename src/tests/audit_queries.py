@@ -0,0 +1,321 @@
+"""
+Query plans audit of the hottest ORM queries.
+
+Every query of HOT_QUERIES is run with EXPLAIN (ANALYZE, BUFFERS) against a PostgreSQL database, and the sequential
+scans in their plans are reported, with their execution time and the buffers they read.
+
+The indexes declared in the models' Meta.indexes can then be created (CONCURRENTLY, so that it can run against a live
+database), and the queries audited again to compare the plans before and after.
+
+Never point this at the production database with --seed: it creates the tables and fills them with synthetic data. By
+default, the [database] section of config.toml is used.
+
+Usage: python ./src/tests/audit_queries.py [--seed 100000] [--create-indexes] [--repeat 3]
+"""
+import argparse
+import asyncio
+import pathlib
+import random
+import sys
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+SRC_DIRECTORY = pathlib.Path(__file__).parent.parent
+sys.path.insert(0, str(SRC_DIRECTORY))
+
+import rapidjson  # noqa: E402
+import toml  # noqa: E402
+from tortoise import Tortoise  # noqa: E402
+from tortoise.backends.base.client import BaseDBAsyncClient  # noqa: E402
+from tortoise.indexes import Index  # noqa: E402
+from tortoise.queryset import QuerySet  # noqa: E402
+
+from utils.models import (  # noqa: E402
+    AccessLevel,
+    DiscordChannel,
+    DiscordGuild,
+    DiscordMember,
+    DiscordUser,
+    LandminesPlaced,
+    LandminesUserData,
+    Player,
+)
+
+PLAYERS_PER_MEMBER = 2
+MEMBERS_PER_GUILD = 50
+CHANNELS_PER_GUILD = 3
+LANDMINES_PER_MEMBER = 3
+BATCH_SIZE = 5000
+
+
+class Sample(NamedTuple):
+    guild_id: int
+    channel_id: int
+    user_id: int
+    member_id: int
+    word: str
+
+
+# name -> query built from an existing row
+HOT_QUERIES: Dict[str, Callable[[Sample], QuerySet]] = {
+    "get_player": lambda s: Player.filter(member_id=s.member_id, channel_id=s.channel_id).first(),
+    "get_from_db (member)": lambda s: DiscordMember.filter(guild_id=s.guild_id, user_id=s.user_id).first(),
+    "API player_info": lambda s: Player.filter(
+        channel__discord_id=s.channel_id, member__user__discord_id=s.user_id
+    ).first(),
+    "leaderboard load": lambda s: Player.filter(channel_id=s.channel_id)
+    .order_by("-experience", "-id")
+    .values_list("id", "experience", "member__user__discord_id", "member__user__name", "member__user__discriminator"),
+    "get_landmine": lambda s: LandminesPlaced.filter(tripped=False, disarmed=False)
+    .order_by("placed")
+    .filter(word__in=[s.word, "duck"])
+    .filter(placed_by__member__guild=s.guild_id)
+    .first(),
+    "banned users": lambda s: DiscordUser.filter(access_level_override=AccessLevel.BANNED).values_list(
+        "discord_id", flat=True
+    ),
+    "get_enabled_channels": lambda s: DiscordChannel.filter(enabled=True),
+}
+
+
+class QueryReport(NamedTuple):
+    execution_time: float
+    seq_scans: List[Tuple[str, int]]
+    shared_hit: int
+    shared_read: int
+
+
+def snowflake(i: int) -> int:
+    return (1_000_000 + i) << 22
+
+
+async def seed(players_count: int):
+    """
+    Fill an empty database with synthetic guilds, channels, users, members, players and landmines.
+    """
+    members_count = players_count // PLAYERS_PER_MEMBER
+    guilds_count = max(1, members_count // MEMBERS_PER_GUILD)
+    words = [f"word{i}" for i in range(2000)]
+    rng = random.Random(42)
+
+    async def bulk_create(model, objects):
+        for i in range(0, len(objects), BATCH_SIZE):
+            await model.bulk_create(objects[i:i + BATCH_SIZE])
+        print(f"\tseeded {len(objects)} {model._meta.db_table}")
+
+    await bulk_create(
+        DiscordGuild, [DiscordGuild(discord_id=snowflake(i), name=f"Guild {i}") for i in range(guilds_count)]
+    )
+    await bulk_create(
+        DiscordChannel,
+        [
+            DiscordChannel(
+                discord_id=snowflake(i),
+                guild_id=snowflake(i // CHANNELS_PER_GUILD),
+                name=f"channel-{i}",
+                enabled=rng.random() < 0.3,
+            )
+            for i in range(guilds_count * CHANNELS_PER_GUILD)
+        ],
+    )
+    await bulk_create(
+        DiscordUser,
+        [
+            DiscordUser(
+                discord_id=snowflake(i),
+                name=f"User {i}",
+                discriminator="0",
+                access_level_override=AccessLevel.BANNED if rng.random() < 0.001 else AccessLevel.DEFAULT,
+            )
+            for i in range(members_count)
+        ],
+    )
+    await bulk_create(
+        DiscordMember,
+        [
+            DiscordMember(id=i + 1, guild_id=snowflake(i // MEMBERS_PER_GUILD), user_id=snowflake(i))
+            for i in range(members_count)
+        ],
+    )
+    # Every member plays on the first channels of their guild
+    await bulk_create(
+        Player,
+        [
+            Player(
+                id=i + 1,
+                member_id=i // PLAYERS_PER_MEMBER + 1,
+                channel_id=snowflake(i // PLAYERS_PER_MEMBER // MEMBERS_PER_GUILD * CHANNELS_PER_GUILD
+                                     + i % PLAYERS_PER_MEMBER),
+                experience=int(rng.paretovariate(1) * 10),
+            )
+            for i in range(members_count * PLAYERS_PER_MEMBER)
+        ],
+    )
+    await bulk_create(LandminesUserData, [LandminesUserData(id=i + 1, member_id=i + 1) for i in range(members_count)])
+    await bulk_create(
+        LandminesPlaced,
+        [
+            LandminesPlaced(
+                placed_by_id=i // LANDMINES_PER_MEMBER + 1,
+                word=rng.choice(words),
+                value=100,
+                # Most landmines exploded or were disarmed long ago
+                tripped=rng.random() < 0.9,
+                disarmed=rng.random() < 0.05,
+            )
+            for i in range(members_count * LANDMINES_PER_MEMBER)
+        ],
+    )
+
+    await Player._meta.db.execute_script("ANALYZE")
+
+
+async def get_sample() -> Sample:
+    # The player with the most experience, on a channel that's probably busy
+    db_player = await Player.all().select_related("member", "channel").order_by("-experience").first()
+    db_landmine = await LandminesPlaced.filter(tripped=False, disarmed=False).first()
+    return Sample(
+        guild_id=db_player.channel.guild_id,
+        channel_id=db_player.channel_id,
+        user_id=db_player.member.user_id,
+        member_id=db_player.member_id,
+        word=db_landmine.word if db_landmine else "duck",
+    )
+
+
+def walk_plan(plan: dict):
+    yield plan
+    for subplan in plan.get("Plans", []):
+        yield from walk_plan(subplan)
+
+
+async def explain(connection: BaseDBAsyncClient, queryset: QuerySet, repeat: int) -> QueryReport:
+    # Parameters are inlined, so that the planner can match them against the partial indexes
+    sql = queryset.sql(params_inline=True)
+    best = None
+    for _ in range(repeat):
+        [row] = await connection.execute_query_dict(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}")
+        plan = row["QUERY PLAN"]
+        if isinstance(plan, str):
+            plan = rapidjson.loads(plan)
+        plan = plan[0]
+        if best is None or plan["Execution Time"] < best["Execution Time"]:
+            best = plan
+
+    nodes = list(walk_plan(best["Plan"]))
+    return QueryReport(
+        execution_time=best["Execution Time"],
+        seq_scans=[(node["Relation Name"], node["Plan Rows"]) for node in nodes if node["Node Type"] == "Seq Scan"],
+        shared_hit=best["Plan"].get("Shared Hit Blocks", 0),
+        shared_read=best["Plan"].get("Shared Read Blocks", 0),
+    )
+
+
+async def audit(connection: BaseDBAsyncClient, sample: Sample, repeat: int) -> Dict[str, QueryReport]:
+    reports = {}
+    for name, query in HOT_QUERIES.items():
+        report = reports[name] = await explain(connection, query(sample), repeat)
+        seq_scans = ", ".join(f"{table} (~{rows} rows)" for table, rows in report.seq_scans) or "none"
+        print(
+            f"\t{'⚠️' if report.seq_scans else '✅'} {name}: {report.execution_time:.3f}ms, "
+            f"{report.shared_hit} buffers hit, {report.shared_read} read. Sequential scans: {seq_scans}"
+        )
+    return reports
+
+
+def declared_indexes() -> List[Tuple[type, Index]]:
+    return [(model, index) for model in Tortoise.apps["models"].values() for index in model._meta.indexes]
+
+
+async def existing_indexes(connection: BaseDBAsyncClient) -> set:
+    rows = await connection.execute_query_dict("SELECT indexname FROM pg_indexes WHERE schemaname = current_schema()")
+    return {row["indexname"] for row in rows}
+
+
+def create_index_sql(schema_generator, model: type, index: Index) -> str:
+    # CONCURRENTLY, so that the table can still be written while the index is built
+    return index.get_sql(schema_generator, model, safe=True).replace("CREATE INDEX", "CREATE INDEX CONCURRENTLY", 1)
+
+
+async def create_indexes(connection: BaseDBAsyncClient, missing: List[Tuple[type, Index]]):
+    schema_generator = connection.schema_generator(connection)
+    for model, index in missing:
+        sql = create_index_sql(schema_generator, model, index)
+        start = time.perf_counter()
+        await connection.execute_script(sql)
+        print(f"\tcreated {index.index_name(schema_generator, model)} in {time.perf_counter() - start:.1f}s: {sql}")
+
+    await connection.execute_script("ANALYZE")
+
+
+async def drop_indexes(connection: BaseDBAsyncClient, indexes: List[Tuple[type, Index]]):
+    schema_generator = connection.schema_generator(connection)
+    for model, index in indexes:
+        await connection.execute_script(f'DROP INDEX IF EXISTS "{index.index_name(schema_generator, model)}"')
+
+
+async def run_audit(database: dict, seed_players: Optional[int], create: bool, repeat: int):
+    await Tortoise.init(
+        {
+            "connections": {"default": {"engine": "tortoise.backends.asyncpg", "credentials": database}},
+            "apps": {"models": {"models": ["utils.models"], "default_connection": "default"}},
+        }
+    )
+    connection = Tortoise.get_connection("default")
+    schema_generator = connection.schema_generator(connection)
+    indexes = declared_indexes()
+
+    try:
+        if seed_players:
+            await Tortoise.generate_schemas(safe=True)
+            if await Player.exists():
+                print("➡️ The database isn't empty, refusing to seed it.")
+                return
+
+            # Audit the plans without the indexes first
+            await drop_indexes(connection, indexes)
+            await seed(seed_players)
+
+        sample = await get_sample()
+        existing = await existing_indexes(connection)
+        missing = [
+            (model, index) for model, index in indexes if index.index_name(schema_generator, model) not in existing
+        ]
+        print(f"➡️ {len(indexes) - len(missing)}/{len(indexes)} declared indexes exist. Auditing with {sample}")
+        before = await audit(connection, sample, repeat)
+
+        if create and missing:
+            print(f"➡️ Creating {len(missing)} indexes")
+            await create_indexes(connection, missing)
+            print("➡️ Auditing again")
+            after = await audit(connection, sample, repeat)
+
+            print("➡️ Before / after")
+            for name in HOT_QUERIES:
+                print(
+                    f"\t{name}: {before[name].execution_time:.3f}ms -> {after[name].execution_time:.3f}ms, "
+                    f"{len(before[name].seq_scans)} -> {len(after[name].seq_scans)} sequential scans"
+                )
+        elif missing:
+            print("➡️ Missing indexes, use --create-indexes to create them:")
+            for model, index in missing:
+                print(f"\t{create_index_sql(schema_generator, model, index)}")
+    finally:
+        await Tortoise.close_connections()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EXPLAIN ANALYZE the hottest queries, and check their indexes.")
+    parser.add_argument("--seed", type=int, metavar="PLAYERS", help="Create and fill an empty database first")
+    parser.add_argument("--create-indexes", action="store_true", help="Create the missing indexes, and audit again")
+    parser.add_argument("--repeat", type=int, default=3, help="Keep the fastest of that many runs of every query")
+    parser.add_argument("--config", type=pathlib.Path, default=SRC_DIRECTORY / "config.toml")
+    args = parser.parse_args()
+
+    config = toml.load(args.config)["database"]
+    database = {key: config[key] for key in ("host", "port", "user", "password", "database")}
+    asyncio.run(run_audit(database, args.seed, args.create_indexes, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
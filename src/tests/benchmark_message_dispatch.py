@@ -0,0 +1,202 @@
+"""
+Per-message cost of the on_message listeners, with and without a shared MessageDispatch.
+
+Every message is dispatched to MyBot.on_message, Event2021.on_message, PrivateMessagesSupport.on_message and
+Monitoring.on_message at the same time, like discord.py does, with the guilds, channels, users and members in an
+in-memory SQLite database. Commands aren't run: process_context is replaced by a no-op. The same messages are handled
+with a new dispatch built for every listener (each of them parsing the message and looking up the database on its own,
+like they used to), then with the MessageDispatch shared by all of them. Both runs start from a new database where only
+the guilds are cached by get_from_db, and are then repeated with a warm cache.
+
+Landmines are enabled in some of the channels, where Event2021.on_message goes on to check the author and look for a
+landmine in the message.
+
+Usage: python ./src/tests/benchmark_message_dispatch.py [--messages 20000] [--guilds 100] [--commands-ratio 0.05]
+    [--landmines-ratio 0.1]
+"""
+import argparse
+import asyncio
+import os
+import pathlib
+import random
+import string
+import sys
+import time
+import types
+
+SRC_DIRECTORY = pathlib.Path(__file__).parent.parent
+sys.path.insert(0, str(SRC_DIRECTORY))
+# MyBot reads config.toml from the working directory
+os.chdir(SRC_DIRECTORY)
+
+import discord  # noqa: E402
+from tortoise import Tortoise  # noqa: E402
+
+from cogs.landmines import Event2021  # noqa: E402
+from cogs.monitoring import Monitoring  # noqa: E402
+from cogs.private_messages_support import PrivateMessagesSupport  # noqa: E402
+from conftest import StubChannel, StubGuild, StubMember  # noqa: E402
+from utils.bot_class import MyBot  # noqa: E402
+from utils.message_dispatch import MessageDispatch  # noqa: E402
+from utils.models import DB_CACHE, QUERY_STATS, DiscordChannel, DiscordGuild, get_from_db  # noqa: E402
+
+
+def snowflake(i: int) -> int:
+    # discord objects hash on the timestamp part of their IDs, so sequential small IDs would all collide.
+    return (1_000_000 + i) << 22
+
+
+class RebuiltDispatch(MessageDispatch):
+    """
+    What each listener did on its own: parsing the message with get_context to see if it's a command, even without a
+    prefix.
+    """
+
+    async def is_command(self) -> bool:
+        return (await self.context()).valid
+
+
+class AdminChannel(StubChannel):
+    # The bot can do anything in the channels of the benchmark
+    def permissions_for(self, obj):
+        return discord.Permissions.all()
+
+
+class StubMessage:
+    attachments = []
+
+    def __init__(self, message_id: int, content: str, channel: StubChannel, author: StubMember, state):
+        self.id = message_id
+        self.content = content
+        self.channel = channel
+        self.guild = channel.guild
+        self.author = author
+        self._state = state
+
+
+def random_chat(rng: random.Random) -> str:
+    words = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(1, 8))) for _ in range(rng.randint(1, 12))]
+    return " ".join(words)
+
+
+def queries_count() -> int:
+    return QUERY_STATS.unattributed.queries + sum(stats.queries for stats in QUERY_STATS.scopes.values())
+
+
+async def handle_all(listeners, messages) -> tuple:
+    QUERY_STATS.reset()
+    start = time.process_time()
+    for message in messages:
+        await asyncio.gather(*(listener(message) for listener in listeners))
+    cpu = time.process_time() - start
+    return cpu / len(messages) * 1_000_000, queries_count() / len(messages)
+
+
+async def init_database(channels, landmines_ratio: float, rng: random.Random):
+    await Tortoise.init(db_url="sqlite://:memory:", modules={"models": ["utils.models"]})
+    await Tortoise.generate_schemas()
+    QUERY_STATS.instrument(Tortoise.get_connection("default"))
+    DB_CACHE.clear()
+
+    guilds = {channel.guild.id: channel.guild for channel in channels}
+    await DiscordGuild.bulk_create([DiscordGuild(discord_id=guild.id, name=guild.name) for guild in guilds.values()])
+    await DiscordChannel.bulk_create(
+        [
+            DiscordChannel(
+                discord_id=channel.id,
+                guild_id=channel.guild.id,
+                name=channel.name,
+                landmines_enabled=rng.random() < landmines_ratio,
+            )
+            for channel in channels
+        ]
+    )
+    # SQLite has a single connection, held by the transactions of get_from_db while they wait for the guild lock: a
+    # guild looked up at the same time as its first member or channel would wait on it forever.
+    for guild in guilds.values():
+        await get_from_db(guild)
+
+
+async def run_benchmark(messages_count: int, guilds_count: int, commands_ratio: float, landmines_ratio: float):
+    rng = random.Random(42)
+    bot = MyBot(intents=discord.Intents.none())
+    bot.is_ready = lambda: True
+
+    async def wait_until_ready():
+        pass
+
+    bot.wait_until_ready = wait_until_ready
+    bot._connection.user = types.SimpleNamespace(id=snowflake(0), name="DuckHunt", discriminator="0")
+    bot.prefix_index.set_mentions(bot.user.id)
+    bot.prefix_index.loaded = True
+
+    async def process_context(ctx, message):
+        pass
+
+    bot.process_context = process_context
+
+    # Those cogs start background loops when they are created
+    private_messages_support = types.SimpleNamespace(bot=bot)
+    monitoring = types.SimpleNamespace(message_timings=[])
+    listeners = [
+        bot.on_message,
+        Event2021(bot).on_message,
+        lambda message: PrivateMessagesSupport.on_message(private_messages_support, message),
+        lambda message: Monitoring.on_message(monitoring, message),
+    ]
+
+    guilds = [StubGuild(snowflake(i)) for i in range(1, guilds_count + 1)]
+    channels = [AdminChannel(snowflake(guilds_count + i), guilds[i % guilds_count]) for i in range(guilds_count * 2)]
+    members = {}
+
+    prefixes = bot.config["bot"]["prefixes"]
+    messages = []
+    for i in range(messages_count):
+        channel = rng.choice(channels)
+        user_id = snowflake(guilds_count * 3 + rng.randint(1, 2_000))
+        author = members.setdefault((channel.guild.id, user_id), StubMember(user_id, channel.guild))
+        content = f"{rng.choice(prefixes)}bang" if rng.random() < commands_ratio else random_chat(rng)
+        messages.append(StubMessage(snowflake(10_000_000 + i), content, channel, author, bot._connection))
+
+    def rebuilt_per_listener(message):
+        return RebuiltDispatch(bot, message)
+
+    shared = bot.get_message_dispatch
+    results = {}
+    for mode, get_message_dispatch in [("rebuilt per listener", rebuilt_per_listener), ("shared", shared)]:
+        # The same channels have landmines enabled in both runs
+        await init_database(channels, landmines_ratio, random.Random(42))
+        bot.get_message_dispatch = get_message_dispatch
+        for cache in ["cold", "warm"]:
+            bot.message_dispatches.clear()
+            results[cache, mode] = await handle_all(listeners, messages)
+        await Tortoise.close_connections()
+
+    print(
+        f"➡️ {messages_count} messages in {guilds_count} guilds, {commands_ratio:.1%} of them commands, "
+        f"landmines enabled in {landmines_ratio:.0%} of the channels"
+    )
+    for cache in ["cold", "warm"]:
+        before = results[cache, "rebuilt per listener"]
+        after = results[cache, "shared"]
+        print(f"\t{cache} get_from_db cache:")
+        print(f"\t\trebuilt per listener: {before[0]:.1f}µs of CPU and {before[1]:.3f} queries per message")
+        print(
+            f"\t\tshared: {after[0]:.1f}µs of CPU and {after[1]:.3f} queries per message "
+            f"({before[0] / after[0]:.1f}x less CPU)"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-message cost of the on_message listeners.")
+    parser.add_argument("--messages", type=int, default=20_000)
+    parser.add_argument("--guilds", type=int, default=100)
+    parser.add_argument("--commands-ratio", type=float, default=0.05)
+    parser.add_argument("--landmines-ratio", type=float, default=0.1)
+    args = parser.parse_args()
+
+    asyncio.run(run_benchmark(args.messages, args.guilds, args.commands_ratio, args.landmines_ratio))
+
+
+if __name__ == "__main__":
+    main()
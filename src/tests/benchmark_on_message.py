@@ -0,0 +1,135 @@
+"""
+Throughput benchmark of MyBot.on_message on ordinary chat.
+
+Messages go through the real on_message, get_context and get_prefix, with the guilds in an in-memory SQLite database
+(already cached by get_from_db, which is the best case for the database lookup). Commands aren't run: process_context
+is replaced by a counter of the messages starting with a prefix. The same messages are handled without, then with the
+prefix index.
+
+Usage: python ./src/tests/benchmark_on_message.py [--messages 100000] [--guilds 1000] [--commands-ratio 0.01]
+"""
+import argparse
+import asyncio
+import os
+import pathlib
+import random
+import string
+import sys
+import time
+
+SRC_DIRECTORY = pathlib.Path(__file__).parent.parent
+sys.path.insert(0, str(SRC_DIRECTORY))
+# MyBot reads config.toml from the working directory
+os.chdir(SRC_DIRECTORY)
+
+import discord  # noqa: E402
+from tortoise import Tortoise  # noqa: E402
+
+from conftest import StubGuild  # noqa: E402
+from utils.bot_class import MyBot  # noqa: E402
+from utils.models import DiscordGuild, get_from_db  # noqa: E402
+
+
+def snowflake(i: int) -> int:
+    # discord objects hash on the timestamp part of their IDs, so sequential small IDs would all collide.
+    return (1_000_000 + i) << 22
+
+
+class StubAuthor:
+    bot = False
+
+    def __init__(self, user_id: int):
+        self.id = user_id
+
+
+class StubMessage:
+    def __init__(self, message_id: int, content: str, guild: StubGuild, author: StubAuthor, state):
+        self.id = message_id
+        self.content = content
+        self.guild = guild
+        self.author = author
+        self.channel = None
+        self._state = state
+
+
+def random_chat(rng: random.Random) -> str:
+    words = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(1, 8))) for _ in range(rng.randint(1, 12))]
+    return " ".join(words).capitalize() if rng.random() < 0.5 else " ".join(words)
+
+
+async def handle_all(bot: MyBot, messages) -> float:
+    start = time.perf_counter()
+    for message in messages:
+        await bot.on_message(message)
+    return len(messages) / (time.perf_counter() - start)
+
+
+async def run_benchmark(messages_count: int, guilds_count: int, commands_ratio: float):
+    await Tortoise.init(db_url="sqlite://:memory:", modules={"models": ["utils.models"]})
+    await Tortoise.generate_schemas()
+
+    rng = random.Random(42)
+    bot = MyBot(intents=discord.Intents.none())
+    bot.is_ready = lambda: True
+    bot._connection.user = StubAuthor(snowflake(0))
+
+    processed = 0
+
+    async def process_context(ctx, message):
+        nonlocal processed
+        # MyContext.prefix is never None, so every message gets there without the index
+        if ctx.invoked_with is not None:
+            processed += 1
+
+    bot.process_context = process_context
+
+    guilds = [StubGuild(snowflake(i)) for i in range(1, guilds_count + 1)]
+    await DiscordGuild.bulk_create(
+        [DiscordGuild(discord_id=guild.id, name=guild.name, prefix=rng.choice(["!", "?", "dh!", None])) for guild in guilds]
+    )
+    for guild in guilds:
+        # Cache them all
+        await get_from_db(guild)
+
+    prefixes = bot.config["bot"]["prefixes"]
+    messages = [
+        StubMessage(
+            snowflake(guilds_count + 10_001 + i),
+            f"{rng.choice(prefixes)}bang" if rng.random() < commands_ratio else random_chat(rng),
+            rng.choice(guilds),
+            StubAuthor(snowflake(guilds_count + rng.randint(1, 10_000))),
+            bot._connection,
+        )
+        for i in range(messages_count)
+    ]
+
+    before = await handle_all(bot, messages)
+    processed_before, processed = processed, 0
+
+    bot.prefix_index.set_mentions(bot.user.id)
+    await bot.prefix_index.load()
+    # Forget what was computed without the index
+    bot.message_dispatches.clear()
+    after = await handle_all(bot, messages)
+
+    await Tortoise.close_connections()
+
+    print(f"➡️ {messages_count} messages in {guilds_count} guilds, {commands_ratio:.1%} of them commands")
+    print(f"\twithout the prefix index: {before:,.0f} messages/s, {processed_before} messages with a prefix")
+    print(f"\twith the prefix index: {after:,.0f} messages/s, {processed} messages with a prefix ({after / before:.1f}x)")
+    print(f"\t{bot.prefix_index.rejected} messages rejected, {bot.prefix_index.accepted} accepted")
+    assert processed == processed_before, "The prefix index rejected commands"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput benchmark of MyBot.on_message on ordinary chat.")
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--guilds", type=int, default=1000)
+    parser.add_argument("--commands-ratio", type=float, default=0.01)
+    args = parser.parse_args()
+
+    asyncio.run(run_benchmark(args.messages, args.guilds, args.commands_ratio))
+
+
+if __name__ == "__main__":
+    main()
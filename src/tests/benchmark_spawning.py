@@ -0,0 +1,213 @@
+"""
+Offline load benchmark of the ducks spawning engine.
+
+The real DucksSpawning cog is driven against a synthetic bot with thousands of enabled channels, backed by an
+in-memory SQLite database, with Duck.send stubbed out so that nothing is sent to Discord. The simulated clock advances
+one second per iteration, as fast as the engine allows.
+
+Usage: python ./src/tests/benchmark_spawning.py [--channels 1000 10000 100000] [--hours 1] [--tracemalloc]
+"""
+import argparse
+import asyncio
+import pathlib
+import random
+import sys
+import time
+import tracemalloc
+from typing import List
+from unittest import mock
+
+SRC_DIRECTORY = pathlib.Path(__file__).parent.parent
+sys.path.insert(0, str(SRC_DIRECTORY))
+
+from tortoise import Tortoise  # noqa: E402
+
+from cogs.ducks_spawning import DucksSpawning  # noqa: E402
+from conftest import StubBot, StubChannel, StubGuild  # noqa: E402
+from utils import ducks  # noqa: E402
+from utils.models import DAY, HOUR, DiscordChannel, DiscordGuild  # noqa: E402
+
+CHANNELS_PER_GUILD = 5
+CHANNELS_PER_SHARD = 2500
+
+
+def snowflake(i: int) -> int:
+    # discord objects hash on the timestamp part of their IDs, so sequential small IDs would all collide.
+    return (1_000_000 + i) << 22
+
+
+class StubLogger:
+    def __init__(self):
+        self.warnings = 0
+
+    def _ignore(self, message, *args, **kwargs):
+        pass
+
+    def _print(self, message, *args, **kwargs):
+        self.warnings += 1
+        print(f"\t⚠️ {message}")
+
+    debug = info = _ignore
+    warning = error = exception = _print
+
+
+class SimulatedClock:
+    def __init__(self, now: float):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+def percentile(values: List[float], percentile: float) -> float:
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percentile / 100))]
+
+
+async def create_channels(channels_count: int, shard_count: int) -> List[StubChannel]:
+    guilds = [
+        StubGuild(snowflake(guild_id), guild_id % shard_count)
+        for guild_id in range(1, channels_count // CHANNELS_PER_GUILD + 2)
+    ]
+    await DiscordGuild.bulk_create(
+        [DiscordGuild(discord_id=guild.id, name=guild.name) for guild in guilds], batch_size=1000
+    )
+    db_guilds = {db_guild.discord_id: db_guild for db_guild in await DiscordGuild.all()}
+
+    channels = []
+    db_channels = []
+    for channel_id in range(1, channels_count + 1):
+        guild = guilds[channel_id // CHANNELS_PER_GUILD]
+        channel = StubChannel(snowflake(channel_id), guild)
+        channels.append(channel)
+
+        night_start_at, night_end_at = random.choice(
+            [(0, 0), (0, 0), (22 * HOUR, 6 * HOUR), (random.randrange(DAY), random.randrange(DAY))]
+        )
+        db_channels.append(
+            DiscordChannel(
+                discord_id=channel.id,
+                name=channel.name,
+                guild=db_guilds[guild.id],
+                enabled=True,
+                use_webhooks=False,
+                ducks_per_day=random.choice([24, 48, 96, 96, 200, 500]),
+                night_start_at=night_start_at,
+                night_end_at=night_end_at,
+            )
+        )
+    await DiscordChannel.bulk_create(db_channels, batch_size=1000)
+
+    return channels
+
+
+async def run_benchmark(channels_count: int, hours: float, trace: bool):
+    await Tortoise.init(db_url="sqlite://:memory:", modules={"models": ["utils.models"]})
+    await Tortoise.generate_schemas()
+
+    random.seed(channels_count)
+    shard_count = max(1, channels_count // CHANNELS_PER_SHARD)
+    channels = await create_channels(channels_count, shard_count)
+    bot = StubBot(
+        channels,
+        shard_ids=range(shard_count),
+        # Don't snapshot to the disk during the benchmark
+        config={"cogs": {"DucksSpawning": {"snapshot_interval": 10 * DAY}}},
+        logger=StubLogger(),
+    )
+
+    start = int(time.time())
+    start = start - start % DAY + 8 * HOUR
+    clock = SimulatedClock(start)
+
+    sent_messages = 0
+
+    async def send(duck, content, **kwargs):
+        nonlocal sent_messages
+        sent_messages += 1
+
+    with mock.patch.object(ducks.Duck, "send", send), \
+            mock.patch("utils.ducks.time", clock), \
+            mock.patch("cogs.ducks_spawning.time", clock.time):
+        cog = DucksSpawning(bot)
+        await cog.cog_load()
+        # The benchmark drives the loops itself
+        cog.background_loop.cancel()
+
+        if trace:
+            tracemalloc.start()
+        blocks_before = sys.getallocatedblocks()
+
+        planify_start = time.perf_counter()
+        await cog.planify(start)
+        planify_duration = time.perf_counter() - planify_start
+
+        for spawner in cog.shards.values():
+            spawner.task.cancel()
+        await asyncio.sleep(0)
+
+        async def settle():
+            # Let the spawned ducks (and the ducks leaving) finish, like they would in the second between iterations
+            while len(asyncio.all_tasks()) > 1:
+                await asyncio.sleep(0)
+
+        ducks_left_at_start = sum(d.day_ducks + d.night_ducks for d in bot.enabled_channels.values())
+
+        tick_durations = []
+        max_live_ducks = 0
+        for now in range(start + 1, start + int(hours * HOUR) + 1):
+            clock.now = now
+
+            tick_start = time.perf_counter()
+            await cog.tick(now)
+            for spawner in cog.shards.values():
+                await cog.shard_tick(spawner, now)
+            tick_durations.append(time.perf_counter() - tick_start)
+
+            await settle()
+            max_live_ducks = max(max_live_ducks, len(bot.ducks_departures))
+
+        blocks_after = sys.getallocatedblocks()
+        if trace:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+        ducks_left_at_end = sum(d.day_ducks + d.night_ducks for d in bot.enabled_channels.values())
+        deferred = sum(len(spawner.dispatcher) for spawner in cog.shards.values())
+
+    await Tortoise.close_connections()
+
+    print(f"➡️ {channels_count} channels, {shard_count} shards, {hours} simulated hours")
+    print(f"\tplanify: {planify_duration * 1000:.1f}ms")
+    print(
+        f"\ttick latency: p50={percentile(tick_durations, 50) * 1000:.3f}ms "
+        f"p90={percentile(tick_durations, 90) * 1000:.3f}ms "
+        f"p99={percentile(tick_durations, 99) * 1000:.3f}ms "
+        f"max={max(tick_durations) * 1000:.3f}ms"
+    )
+    print(
+        f"\tducks: {ducks_left_at_start - ducks_left_at_end} due, {deferred} of them still deferred by the rate limits, "
+        f"{ducks_left_at_end} left today, {max_live_ducks} alive at most, {sent_messages} messages sent"
+    )
+    print(f"\tallocations: {blocks_after - blocks_before} more allocated blocks")
+    if trace:
+        print(f"\tpeak traced memory: {peak / 1024 / 1024:.1f}MiB")
+    if bot.logger.warnings:
+        print(f"\t{bot.logger.warnings} warnings logged")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load benchmark of the ducks spawning engine.")
+    parser.add_argument("--channels", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--hours", type=float, default=1)
+    parser.add_argument("--tracemalloc", action="store_true", help="Also report peak memory (slower)")
+    args = parser.parse_args()
+
+    for channels_count in args.channels:
+        asyncio.run(run_benchmark(channels_count, args.hours, args.tracemalloc))
+
+
+if __name__ == "__main__":
+    main()
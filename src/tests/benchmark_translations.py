@@ -0,0 +1,96 @@
+"""
+Throughput benchmark of the translations lookups.
+
+Every message of the catalogs is translated in a mix of languages, first by looking up the catalog with
+gettext.translation() for each string like translate() used to, then through the preloaded catalogs registry. The
+catalogs are compiled to a temporary directory when locales/ only has the .po files (they are compiled in the docker
+image).
+
+Usage: python ./src/tests/benchmark_translations.py [--rounds 5] [--languages fr,de,es,zh-Hans,pt-BR,en]
+"""
+import argparse
+import gettext
+import pathlib
+import sys
+import tempfile
+import time
+
+import polib
+
+SRC_DIRECTORY = pathlib.Path(__file__).parent.parent
+sys.path.insert(0, str(SRC_DIRECTORY))
+
+from utils.translations import CatalogRegistry, normalize_language_code  # noqa: E402
+
+LOCALES_DIRECTORY = SRC_DIRECTORY / "locales"
+
+
+def compile_locales(localedir: pathlib.Path):
+    for po_path in LOCALES_DIRECTORY.glob("*/LC_MESSAGES/messages.po"):
+        language_directory = localedir / po_path.parent.parent.name / "LC_MESSAGES"
+        language_directory.mkdir(parents=True)
+        polib.pofile(str(po_path)).save_as_mofile(str(language_directory / "messages.mo"))
+
+
+def benchmark(localedir: str, rounds: int, language_codes):
+    po_file = polib.pofile(str(LOCALES_DIRECTORY / "en_US" / "LC_MESSAGES" / "messages.po"))
+    messages = [entry.msgid for entry in po_file if not entry.msgid_plural]
+    plurals = [(entry.msgid, entry.msgid_plural) for entry in po_file if entry.msgid_plural]
+    lookups = rounds * len(language_codes) * (len(messages) + len(plurals))
+
+    def before():
+        for _ in range(rounds):
+            for language_code in language_codes:
+                language_code = normalize_language_code(language_code)
+                for message in messages:
+                    gettext.translation(
+                        "messages", localedir=localedir, languages=[language_code], fallback=True
+                    ).gettext(message)
+                for singular, plural in plurals:
+                    gettext.translation(
+                        "messages", localedir=localedir, languages=[language_code], fallback=True
+                    ).ngettext(singular, plural, 2)
+
+    registry = CatalogRegistry(localedir)
+    load_start = time.perf_counter()
+    registry.load()
+    load_duration = time.perf_counter() - load_start
+
+    def after():
+        for _ in range(rounds):
+            for language_code in language_codes:
+                catalog = registry.get(language_code)
+                for message in messages:
+                    catalog.gettext(message)
+                for singular, plural in plurals:
+                    catalog.ngettext(singular, plural, 2)
+
+    results = []
+    for run in (before, after):
+        start = time.perf_counter()
+        run()
+        results.append(lookups / (time.perf_counter() - start))
+
+    print(f"➡️ {lookups} lookups in {len(language_codes)} languages, {len(registry)} catalogs")
+    print(f"\tloading every catalog: {load_duration * 1000:.1f}ms")
+    print(f"\tgettext.translation() per string: {results[0]:,.0f} lookups/s")
+    print(f"\tpreloaded catalogs: {results[1]:,.0f} lookups/s ({results[1] / results[0]:.0f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput benchmark of the translations lookups.")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--languages", default="fr,de,es,zh-Hans,pt-BR,en")
+    args = parser.parse_args()
+    language_codes = args.languages.split(",")
+
+    if any(LOCALES_DIRECTORY.glob("*/LC_MESSAGES/messages.mo")):
+        benchmark(str(LOCALES_DIRECTORY), args.rounds, language_codes)
+    else:
+        with tempfile.TemporaryDirectory() as localedir:
+            compile_locales(pathlib.Path(localedir))
+            benchmark(localedir, args.rounds, language_codes)
+
+
+if __name__ == "__main__":
+    main()
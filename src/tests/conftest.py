@@ -0,0 +1,174 @@
+"""
+Shared by the tests and benchmarks: stubs of the discord objects, and a new database for every test.
+"""
+import asyncio
+import collections
+import logging
+import typing
+from unittest import mock
+
+import discord
+import pytest
+from tortoise import Tortoise
+
+from cogs.ducks_spawning import DucksSpawning
+from utils.departures import DucksDepartures
+from utils.ducks import DUCKS_CATEGORIES_TO_CLASSES, Duck, restore_channel_ducks
+from utils.events import Events
+from utils.logger import FakeLogger
+from utils.models import DB_CACHE, DIRTY_CHANNELS, LEADERBOARDS
+
+IN_MEMORY_DB_URL = "sqlite://:memory:"
+
+
+class StubGuild(discord.Guild):
+    # discord.Guild computes these from the state of the client
+    shard_id = 0
+    me = None
+
+    def __init__(self, guild_id: int, shard_id: int = 0):
+        self.id = guild_id
+        self.name = f"Guild {guild_id}"
+        self.shard_id = shard_id
+
+
+class StubChannel(discord.TextChannel):
+    def __init__(self, channel_id: int, guild: StubGuild):
+        self.id = channel_id
+        self.name = f"channel-{channel_id}"
+        self.guild = guild
+
+
+class StubMember(discord.Member):
+    # discord.Member forwards these to its user, which stubs don't have
+    id = name = discriminator = guild = None
+    bot = False
+
+    def __init__(self, user_id: int, guild: StubGuild):
+        self.id = user_id
+        self.name = f"User {user_id}"
+        self.discriminator = "0"
+        self.guild = guild
+
+    def __hash__(self):
+        return hash(self.id)
+
+
+class StubBot:
+    """
+    Just enough of MyBot for the spawning engine. Logs aren't written to the cache directory.
+    """
+
+    def __init__(
+        self,
+        channels: typing.Iterable[StubChannel] = (),
+        shard_ids: typing.Iterable[int] = (0,),
+        config: dict = None,
+        logger=None,
+    ):
+        self.logger = logger or FakeLogger(logging.getLogger("tests"))
+        self.config = config or {"cogs": {}}
+        self.loop = asyncio.get_running_loop()
+        self.current_event = Events.CALM
+        self.stay_tuned_was_n_events_ago = 99
+        self.calm_times_ahead_was_n_events_ago = 99
+        self.allow_ducks_spawning = True
+        self.shards = {shard_id: None for shard_id in shard_ids}
+        self.shards_ready = set(self.shards.keys())
+        self.ducks_spawned = collections.defaultdict(collections.deque)
+        self.ducks_departures = DucksDepartures()
+        self.enabled_channels = {}
+        self.guilds = []
+        self.cogs = {}
+        self._channels = {channel.id: channel for channel in channels}
+
+    def get_channel(self, channel_id):
+        return self._channels.get(channel_id)
+
+    def get_all_channels(self):
+        return self._channels.values()
+
+    def get_cog(self, name):
+        return self.cogs.get(name)
+
+    async def wait_until_ready(self):
+        pass
+
+    async def change_presence(self, *args, **kwargs):
+        pass
+
+    async def log_to_channel(self, *args, **kwargs):
+        pass
+
+
+class QuietDuck(Duck):
+    """
+    Leaves without sending anything to discord.
+    """
+
+    left = 0
+
+    async def leave(self):
+        QuietDuck.left += 1
+        self.despawn()
+
+
+def restore_duck(bot: StubBot, channel: StubChannel, db_channel, duck: Duck) -> Duck:
+    """
+    Put back a duck on its channel like the spawning engine restores the ducks of a snapshot, as an instance of the
+    same (test) class. Return the restored duck.
+    """
+    with mock.patch.dict(DUCKS_CATEGORIES_TO_CLASSES, {duck.category: type(duck)}):
+        departures = restore_channel_ducks(bot, channel, db_channel, [duck.serialize()])
+    bot.ducks_departures.schedule_many(departures, channel.guild.shard_id)
+    [(restored, _)] = departures
+    return restored
+
+
+def clear_caches():
+    DB_CACHE.clear()
+    DB_CACHE.configure(ttl=300, max_memory=64 * 1024 * 1024)
+    LEADERBOARDS.clear()
+    DIRTY_CHANNELS.clear()
+
+
+async def run_with_db(coroutine_function, db_url: str = IN_MEMORY_DB_URL):
+    """
+    Run a coroutine function with a new database, and empty caches. Databases other than the in-memory one are
+    created and dropped for it.
+    """
+    in_memory = db_url == IN_MEMORY_DB_URL
+    await Tortoise.init(db_url=db_url, modules={"models": ["utils.models"]}, _create_db=not in_memory)
+    await Tortoise.generate_schemas()
+    clear_caches()
+    try:
+        return await coroutine_function()
+    finally:
+        clear_caches()
+        if in_memory:
+            await Tortoise.close_connections()
+        else:
+            await Tortoise._drop_databases()
+
+
+@pytest.fixture(autouse=True)
+def cache_directory(tmp_path, monkeypatch):
+    """
+    Keep the logs, and the snapshots and event cache written by the spawning engine, out of the cache directory.
+    """
+    monkeypatch.setattr("utils.logger.init_logger", lambda: logging.getLogger("tests"))
+    monkeypatch.setattr(DucksSpawning, "SNAPSHOT_PATH", str(tmp_path / "spawn_state.snapshot"))
+    monkeypatch.setattr(DucksSpawning, "LEGACY_CACHE_PATH", str(tmp_path / "ducks_spawned_cache.json"))
+    monkeypatch.setattr(DucksSpawning, "EVENT_CACHE_PATH", str(tmp_path / "event_cache.json"))
+
+
+@pytest.fixture
+def db():
+    """
+    Call it with a coroutine function to run it with a new database: db(test), or db(test, db_url).
+    """
+
+    def run(coroutine_function, db_url: str = IN_MEMORY_DB_URL):
+        return asyncio.run(run_with_db(coroutine_function, db_url))
+
+    return run
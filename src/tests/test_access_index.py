@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+
+from utils.models import ACCESS_LEVELS, AccessLevel, DiscordGuild, DiscordMember, DiscordUser
+
+GUILD_ID = 1 << 22
+OTHER_GUILD_ID = 2 << 22
+
+
+@pytest.fixture(autouse=True)
+def access_levels_ttl():
+    yield
+    ACCESS_LEVELS.configure(ttl=300)
+
+
+async def create_member(user_id: int, user_access=AccessLevel.DEFAULT, member_access=AccessLevel.DEFAULT):
+    await DiscordGuild.get_or_create(discord_id=GUILD_ID, defaults={"name": "Guild"})
+    db_user = await DiscordUser.create(
+        discord_id=user_id, name=f"User {user_id}", discriminator="0", access_level_override=user_access
+    )
+    db_member = await DiscordMember.create(guild_id=GUILD_ID, user=db_user, access_level=member_access)
+    return db_user, db_member
+
+
+def test_access_levels_are_the_same_as_the_database_ones(db):
+    async def test():
+        await create_member(10 << 22, user_access=AccessLevel.BANNED, member_access=AccessLevel.ADMIN)
+        await create_member(11 << 22, member_access=AccessLevel.MODERATOR)
+        await create_member(12 << 22, user_access=AccessLevel.BOT_MODERATOR)
+        await create_member(13 << 22)
+
+        await ACCESS_LEVELS.load()
+        # Only the levels that aren't the default one
+        assert len(ACCESS_LEVELS) == 4
+
+        for db_member in await DiscordMember.all().select_related("user"):
+            user_id = db_member.user_id
+            assert ACCESS_LEVELS.get_access_level(user_id, GUILD_ID) == db_member.get_access_level()
+            assert ACCESS_LEVELS.get_access_level(user_id) == db_member.user.get_access_level()
+
+        # Member access levels are per guild, but users overrides are global
+        assert ACCESS_LEVELS.get_access_level(11 << 22, OTHER_GUILD_ID) == AccessLevel.DEFAULT
+        assert ACCESS_LEVELS.is_banned(10 << 22, OTHER_GUILD_ID)
+        assert ACCESS_LEVELS.banned_users() == {10 << 22}
+        # Unknown users
+        assert ACCESS_LEVELS.get_access_level(99 << 22, GUILD_ID) == AccessLevel.DEFAULT
+
+    db(test)
+
+
+def test_saves_update_the_index(db):
+    async def test():
+        await ACCESS_LEVELS.load()
+        db_user, db_member = await create_member(10 << 22)
+
+        db_member.access_level = AccessLevel.TRUSTED
+        await db_member.save()
+        assert ACCESS_LEVELS.get_access_level(10 << 22, GUILD_ID) == AccessLevel.TRUSTED
+
+        db_user.access_level_override = AccessLevel.BANNED
+        await db_user.save(update_fields=["access_level_override"])
+        assert ACCESS_LEVELS.is_banned(10 << 22, GUILD_ID)
+
+        db_user.access_level_override = AccessLevel.DEFAULT
+        await db_user.save()
+        assert ACCESS_LEVELS.get_access_level(10 << 22, GUILD_ID) == AccessLevel.TRUSTED
+
+        # Saves that don't write the access level leave it alone
+        partial = await DiscordMember.filter(id=db_member.id).only("id", "guild_id", "user_id").first()
+        await partial.save(update_fields=["guild_id"])
+        assert ACCESS_LEVELS.get_access_level(10 << 22, GUILD_ID) == AccessLevel.TRUSTED
+
+        await db_member.delete()
+        assert ACCESS_LEVELS.get_access_level(10 << 22, GUILD_ID) == AccessLevel.DEFAULT
+        assert len(ACCESS_LEVELS) == 0
+
+    db(test)
+
+
+def test_changes_made_elsewhere_are_reloaded(db):
+    async def test():
+        db_user, db_member = await create_member(10 << 22)
+        await ACCESS_LEVELS.load()
+
+        await DiscordUser.filter(discord_id=db_user.discord_id).update(access_level_override=AccessLevel.BANNED)
+        assert not ACCESS_LEVELS.is_banned(10 << 22)
+
+        ACCESS_LEVELS.configure(ttl=0)
+        reloads = ACCESS_LEVELS.reloads
+        # Still answered from memory, while reloading in the background
+        assert not ACCESS_LEVELS.is_banned(10 << 22)
+        # Saved during the reload, so it's applied after it
+        db_member.access_level = AccessLevel.ADMIN
+        await db_member.save()
+        await asyncio.sleep(0.1)
+
+        assert ACCESS_LEVELS.reloads == reloads + 1
+        ACCESS_LEVELS.configure(ttl=300)
+        assert ACCESS_LEVELS.is_banned(10 << 22)
+        db_user.access_level_override = AccessLevel.DEFAULT
+        await db_user.save()
+        assert ACCESS_LEVELS.get_access_level(10 << 22, GUILD_ID) == AccessLevel.ADMIN
+
+    db(test)
@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+
+from utils.channel_serializer import ChannelBusy, ChannelSerializer
+
+
+def test_commands_run_one_at_a_time_in_order():
+    async def test():
+        serializer = ChannelSerializer(max_queue_length=10)
+        running = []
+        order = []
+
+        async def command(channel_id, i):
+            async with serializer.serialize(channel_id):
+                running.append(channel_id)
+                assert running.count(channel_id) == 1
+                order.append((channel_id, i))
+                await asyncio.sleep(0.01)
+                running.remove(channel_id)
+
+        await asyncio.gather(*(command(channel_id, i) for i in range(5) for channel_id in (1, 2)))
+        assert [i for channel_id, i in order if channel_id == 1] == list(range(5))
+        # Other channels don't wait
+        assert order[:2] == [(1, 0), (2, 0)]
+
+        # Idle channels are forgotten
+        assert len(serializer) == 0
+        assert serializer.peak == 2
+        assert serializer.total.commands == 10
+        assert serializer.total.waited == 8
+        [(_, stats)] = serializer.slowest(1)
+        assert stats.waited == 4 and stats.max_wait_time >= 0.03
+
+    asyncio.run(test())
+
+
+def test_too_many_commands_are_refused():
+    async def test():
+        serializer = ChannelSerializer(max_queue_length=2)
+        release = asyncio.Event()
+
+        async def command():
+            async with serializer.serialize(1):
+                await release.wait()
+
+        tasks = [asyncio.create_task(command()) for _ in range(3)]
+        await asyncio.sleep(0)
+        assert serializer.busiest() == [(1, 2, pytest.approx(0, abs=1))]
+
+        with pytest.raises(ChannelBusy):
+            await command()
+        assert serializer.total.refused == 1
+
+        release.set()
+        await asyncio.gather(*tasks)
+        assert len(serializer) == 0
+
+    asyncio.run(test())
+
+
+def test_released_when_commands_fail_or_are_cancelled():
+    async def test():
+        serializer = ChannelSerializer()
+
+        with pytest.raises(ValueError):
+            async with serializer.serialize(1):
+                raise ValueError()
+        assert len(serializer) == 0
+
+        started = asyncio.Event()
+
+        async def command(event=None):
+            async with serializer.serialize(1):
+                if event:
+                    event.set()
+                await asyncio.sleep(0.01)
+
+        first = asyncio.create_task(command(started))
+        await started.wait()
+        cancelled = asyncio.create_task(command())
+        last = asyncio.create_task(command())
+        await asyncio.sleep(0)
+        cancelled.cancel()
+
+        await asyncio.gather(first, last)
+        assert cancelled.cancelled()
+        assert len(serializer) == 0
+
+        # Cancelled right after its turn came
+        async def handing_over():
+            async with serializer.serialize(1):
+                await asyncio.sleep(0)
+            second.cancel()
+
+        first = asyncio.create_task(handing_over())
+        await asyncio.sleep(0)
+        second = asyncio.create_task(command())
+        last = asyncio.create_task(command())
+        await asyncio.gather(first, last)
+        assert second.cancelled()
+        assert len(serializer) == 0
+
+    asyncio.run(test())
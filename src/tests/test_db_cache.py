@@ -0,0 +1,102 @@
+import gc
+
+from conftest import StubChannel, StubGuild, StubMember
+from utils.models import (
+    DB_CACHE,
+    DIRTY_CHANNELS,
+    DiscordChannel,
+    DiscordMember,
+    get_enabled_channels,
+    get_from_db,
+    invalidate_cache,
+)
+
+
+def test_instances_are_shared(db):
+    async def test():
+        channel = StubChannel(1 << 22, StubGuild(2 << 22))
+
+        db_channel = await get_from_db(channel)
+        misses = DB_CACHE.misses
+        assert await get_from_db(channel) is db_channel
+        assert DB_CACHE.misses == misses
+
+        # The spawning engine and the settings commands see the same object
+        db_channel.enabled = True
+        db_channel.ducks_per_day = 42
+        await db_channel.save()
+        [enabled] = await get_enabled_channels()
+        assert enabled is db_channel and enabled.ducks_per_day == 42
+
+    db(test)
+
+
+def test_partial_saves_are_written_through(db):
+    async def test():
+        channel = StubChannel(1 << 22, StubGuild(2 << 22))
+        db_channel = await get_from_db(channel)
+
+        partial = await DiscordChannel.filter(discord_id=channel.id).only("discord_id", "ducks_per_day").first()
+        partial.ducks_per_day = 12
+        await partial.save(update_fields=["ducks_per_day"])
+
+        assert db_channel.ducks_per_day == 12
+        assert await get_from_db(channel) is db_channel
+        # The spawns of the channel are replanned
+        assert DIRTY_CHANNELS.pop(channel.id) is db_channel
+
+    db(test)
+
+
+def test_stale_objects_are_refreshed_in_place(db):
+    async def test():
+        DB_CACHE.ttl = -1
+        channel = StubChannel(1 << 22, StubGuild(2 << 22))
+        db_channel = await get_from_db(channel)
+
+        await DiscordChannel.filter(discord_id=channel.id).update(ducks_per_day=7)
+        assert await get_from_db(channel) is db_channel
+        assert db_channel.ducks_per_day == 7
+
+        invalidate_cache(DiscordChannel, channel.id)
+        assert await get_from_db(channel) is not db_channel
+
+    db(test)
+
+
+def test_memory_budget(db):
+    async def test():
+        guild = StubGuild(1 << 22)
+        channels = [StubChannel((i + 10) << 22, guild) for i in range(20)]
+        for channel in channels:
+            await get_from_db(channel)
+
+        DB_CACHE.configure(ttl=300, max_memory=DB_CACHE.memory // 2)
+        assert DB_CACHE.memory <= DB_CACHE.max_memory
+        assert DB_CACHE.evictions > 0
+
+        # Evicted objects that are still in use are still shared
+        kept = await get_from_db(channels[0])
+        assert await get_from_db(channels[0]) is kept
+
+        del kept
+        gc.collect()
+        assert len(DB_CACHE) <= 20
+
+    db(test)
+
+
+def test_members_share_their_user(db):
+    async def test():
+        member = StubMember(3 << 22, StubGuild(2 << 22))
+
+        db_member = await get_from_db(member)
+        db_user = await get_from_db(member, as_user=True)
+        assert db_member.user is db_user
+
+        invalidate_cache(DiscordMember, member.guild.id, member.id)
+        db_member = await get_from_db(member)
+        assert db_member.user is db_user
+        assert await get_from_db(member) is db_member
+
+    db(test)
@@ -0,0 +1,126 @@
+import asyncio
+import time
+import types
+
+import pytest
+
+from cogs.ducks_spawning import DucksSpawning, ShardSpawner
+from conftest import QuietDuck, StubBot, StubChannel, StubGuild, restore_duck
+from utils.departures import DucksDepartures
+from utils.ducks import Duck, KamikazeDuck, restore_channel_ducks
+from utils.models import DiscordChannel
+from utils.rate_limits import SpawnDispatcher
+
+SHARD = ShardSpawner(0, SpawnDispatcher())
+
+
+class QuietKamikazeDuck(KamikazeDuck):
+    async def leave(self):
+        self.bot.ducks_spawned[self.channel].clear()
+
+
+async def spawn(duck_class, bot, channel, db_channel, spawned_ago=0):
+    duck = duck_class(bot, channel)
+    duck.spawned_at = time.time() - spawned_ago
+    return restore_duck(bot, channel, db_channel, duck)
+
+
+def test_ducks_leave_in_order():
+    departures = DucksDepartures()
+    for duck, leave_at in [("late", 30), ("first", 10), ("second", 20)]:
+        departures.schedule(duck, leave_at, 0)
+    departures.schedule("other shard", 10, 1)
+
+    assert departures.pop_due(5, 0) is None
+    assert departures.pop_due(15, 0) == "first"
+    assert [departures.pop_due(100, 0) for _ in range(3)] == ["second", "late", None]
+    # Each shard only pops its own ducks
+    assert len(departures) == 1
+    assert departures.pop_due(100, 1) == "other shard"
+
+
+def test_rescheduled_ducks_leave_once_at_the_new_time():
+    departures = DucksDepartures()
+    departures.schedule("duck", 10, 0)
+    departures.schedule("duck", 50, 0)
+    assert len(departures) == 1
+
+    # The old entry is stale
+    assert departures.pop_due(20, 0) is None
+    assert departures.pop_due(50, 0) == "duck"
+    assert departures.pop_due(100, 0) is None
+
+
+def test_restore_schedules_the_departure():
+    async def test():
+        bot = StubBot()
+        channel = StubChannel(1, StubGuild(1))
+        db_channel = DiscordChannel(discord_id=1, name="departures", ducks_time_to_live=600)
+
+        duck = Duck(bot, channel)
+        duck.spawned_at = 1_700_000_000
+        departures = restore_channel_ducks(bot, channel, db_channel, [duck.serialize()])
+        bot.ducks_departures.schedule_many(departures, 0)
+        [(restored, leave_at)] = departures
+        assert leave_at == restored.spawned_at + 600
+
+        assert list(bot.ducks_spawned[channel]) == [restored]
+        assert bot.ducks_departures.pop_due(restored.spawned_at + 599, 0) is None
+        assert bot.ducks_departures.pop_due(restored.spawned_at + 600, 0) is restored
+
+    asyncio.run(test())
+
+
+def test_killed_ducks_and_kamikaze_victims_are_not_popped():
+    async def test():
+        bot = StubBot()
+        cog = types.SimpleNamespace(bot=bot)
+        channel = StubChannel(1, StubGuild(1))
+        db_channel = DiscordChannel(discord_id=1, name="departures", ducks_time_to_live=600)
+
+        killed = await spawn(QuietDuck, bot, channel, db_channel, spawned_ago=700)
+        # Killing a duck despawns it
+        killed.despawn()
+        assert len(bot.ducks_departures) == 0
+
+        QuietDuck.left = 0
+        victims = [await spawn(QuietDuck, bot, channel, db_channel, spawned_ago=650) for _ in range(3)]
+        await spawn(QuietKamikazeDuck, bot, channel, db_channel, spawned_ago=700)
+        staying = await spawn(QuietDuck, bot, channel, db_channel, spawned_ago=10)
+
+        # The kamikaze leaves first, and takes every other duck of the channel with it
+        await DucksSpawning.leave_ducks(cog, int(time.time()), SHARD)
+        assert not bot.ducks_spawned[channel]
+        assert QuietDuck.left == 0
+        assert all(victim not in bot.ducks_spawned[channel] for victim in victims)
+
+        # The duck still in the index isn't spawned anymore either
+        await DucksSpawning.leave_ducks(cog, int(time.time()) + 600, SHARD)
+        assert QuietDuck.left == 0
+        assert staying not in bot.ducks_spawned[channel]
+        assert len(bot.ducks_departures) == 0
+
+    asyncio.run(test())
+
+
+@pytest.mark.parametrize("ttl_raise", [0, 120])
+def test_ducks_stay_when_time_to_live_is_raised(ttl_raise):
+    async def test():
+        bot = StubBot()
+        cog = types.SimpleNamespace(bot=bot)
+        channel = StubChannel(1, StubGuild(1))
+        db_channel = DiscordChannel(discord_id=1, name="departures", ducks_time_to_live=600)
+
+        QuietDuck.left = 0
+        duck = await spawn(QuietDuck, bot, channel, db_channel, spawned_ago=600)
+        db_channel.ducks_time_to_live += ttl_raise
+
+        await DucksSpawning.leave_ducks(cog, int(time.time()) + 1, SHARD)
+        if ttl_raise:
+            assert duck in bot.ducks_spawned[channel]
+            assert len(bot.ducks_departures) == 1
+        else:
+            assert QuietDuck.left == 1
+            assert len(bot.ducks_departures) == 0
+
+    asyncio.run(test())
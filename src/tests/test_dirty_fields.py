@@ -0,0 +1,75 @@
+import logging
+
+import pytest
+
+from utils.models import DiscordChannel, DiscordGuild, DiscordMember, DiscordUser, Player
+
+
+class QueriesRecorder(logging.Handler):
+    def __init__(self):
+        super().__init__(logging.DEBUG)
+        self.queries = []
+
+    def emit(self, record):
+        self.queries.append(record.args)
+
+
+@pytest.fixture
+def queries():
+    """
+    The queries run by Tortoise since the fixture was set up, as (SQL, values).
+    """
+    recorder = QueriesRecorder()
+    logger = logging.getLogger("tortoise.db_client")
+    logger.addHandler(recorder)
+    logger.setLevel(logging.DEBUG)
+    yield recorder.queries
+    logger.removeHandler(recorder)
+
+
+async def create_player(queries: list) -> Player:
+    db_guild = await DiscordGuild.create(discord_id=1 << 22, name="Guild")
+    db_channel = await DiscordChannel.create(discord_id=2 << 22, name="channel", guild=db_guild)
+    db_user = await DiscordUser.create(discord_id=3 << 22, name="User", discriminator="0")
+    db_member = await DiscordMember.create(guild=db_guild, user=db_user)
+    await Player.create(channel=db_channel, member=db_member)
+    db_player = await Player.first()
+    queries.clear()
+    return db_player
+
+
+def test_only_changed_fields_are_saved(db, queries):
+    async def test():
+        db_player = await create_player(queries)
+        db_player.experience += 10
+        db_player.killed["normal"] += 1
+        await db_player.save()
+
+        [(sql, values)] = queries
+        assert sql.startswith('UPDATE "players" SET "experience"=?,"killed"=?')
+        assert len(values) == 3
+
+        # Nothing changed since the last save
+        await db_player.save()
+        assert len(queries) == 1
+
+        reloaded = await Player.first()
+        assert reloaded.experience == 10
+        assert reloaded.killed == {"normal": 1}
+
+    db(test)
+
+
+def test_explicit_update_fields_keep_other_changes_pending(db, queries):
+    async def test():
+        db_player = await create_player(queries)
+        db_player.experience = 5
+        db_player.bullets = 1
+        await db_player.save(update_fields=["bullets"])
+        assert db_player.changed_fields() == ["experience"]
+
+        await db_player.save()
+        assert db_player.changed_fields() == []
+        assert (await Player.first()).experience == 5
+
+    db(test)
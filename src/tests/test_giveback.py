@@ -0,0 +1,53 @@
+import datetime
+
+from utils.levels import LEVELS
+from utils.models import (
+    DiscordChannel,
+    DiscordGuild,
+    DiscordMember,
+    DiscordUser,
+    Player,
+    give_back_to_all_players,
+    last_freetime,
+)
+
+# Both sides of every level boundary
+EXPERIENCES = sorted({-10 ** 7} | {level["expMin"] + delta for level in LEVELS for delta in (-1, 0)})
+
+
+def test_daily_giveback(db):
+    async def test():
+        db_guild = await DiscordGuild.create(discord_id=1 << 22, name="Guild")
+        db_channel = await DiscordChannel.create(discord_id=2 << 22, name="channel", guild=db_guild)
+        yesterday = last_freetime() - datetime.timedelta(hours=1)
+        for i, experience in enumerate(EXPERIENCES):
+            db_user = await DiscordUser.create(discord_id=(10 + i) << 22, name=f"User{i}", discriminator="0")
+            db_member = await DiscordMember.create(guild=db_guild, user=db_user)
+            await Player.create(
+                channel=db_channel,
+                member=db_member,
+                experience=experience,
+                magazines=0,
+                active_powerups={"confiscated": 1, "grease": 12},
+                # The first player already got it today
+                last_giveback=yesterday if i else last_freetime(),
+            )
+
+        assert await give_back_to_all_players(batch_size=7) == len(EXPERIENCES) - 1
+        # Nothing left to do
+        assert await give_back_to_all_players(batch_size=7) == 0
+
+        db_players = await Player.all().order_by("id")
+        assert db_players[0].givebacks == 0
+        assert db_players[0].magazines == 0
+        for db_player in db_players[1:]:
+            assert db_player.magazines == db_player.level_info()["magazines"], db_player.experience
+            assert db_player.active_powerups == {"confiscated": 0, "grease": 12}
+            assert db_player.givebacks == 1
+            assert db_player.last_giveback >= last_freetime()
+
+            # So the commands don't do it again
+            await db_player.maybe_giveback()
+            assert db_player.givebacks == 1
+
+    db(test)
@@ -0,0 +1,160 @@
+import asyncio
+import json
+import types
+
+import pytest
+from aiohttp.web_exceptions import HTTPBadRequest
+
+from cogs.rest_api import RestAPI
+from conftest import StubBot, StubChannel, StubGuild
+from utils import leaderboards
+from utils.leaderboards import get_leaderboard_page, get_leaderboard_players, get_player_rank
+from utils.models import LEADERBOARDS, DiscordChannel, DiscordGuild, DiscordMember, DiscordUser, Player
+
+EXPERIENCES = [50, 10, 30, 30, 30, -5, 30, 0]
+
+
+async def create_players() -> DiscordChannel:
+    db_guild = await DiscordGuild.create(discord_id=1 << 22, name="Guild")
+    db_channel = await DiscordChannel.create(discord_id=2 << 22, name="channel", guild=db_guild)
+    other_channel = await DiscordChannel.create(discord_id=3 << 22, name="other", guild=db_guild)
+    for i, experience in enumerate(EXPERIENCES):
+        db_user = await DiscordUser.create(discord_id=(10 + i) << 22, name=f"User{i}", discriminator="0")
+        db_member = await DiscordMember.create(guild=db_guild, user=db_user)
+        await Player.create(channel=db_channel, member=db_member, experience=experience)
+        await Player.create(channel=other_channel, member=db_member, experience=1000)
+    return db_channel
+
+
+def test_pages_follow_the_leaderboard_order(db):
+    async def test():
+        db_channel = await create_players()
+        expected = await Player.filter(channel=db_channel).order_by("-experience", "-id").values_list("id", flat=True)
+
+        for limit in (1, 3, 4, 8, 20):
+            seen = []
+            after = None
+            while True:
+                page = await get_leaderboard_page(db_channel.pk, after=after, limit=limit)
+                seen.extend(row.player_id for row in page)
+                if len(page) < limit:
+                    break
+                after = page[-1].cursor
+            # Ties on experience are neither skipped nor repeated across pages
+            assert seen == expected, limit
+
+        [first] = await get_leaderboard_page(db_channel.pk, limit=1)
+        assert first.experience == 50
+        assert first.user == "User0"
+
+    db(test)
+
+
+def test_players_only_have_the_requested_fields(db):
+    async def test():
+        db_channel = await create_players()
+        first_page = await get_leaderboard_players(db_channel.pk, ["killed"], limit=5)
+        second_page = await get_leaderboard_players(
+            db_channel.pk, ["killed"], after=(first_page[-1].experience, first_page[-1].id)
+        )
+        assert [player.experience for player in first_page + second_page] == sorted(EXPERIENCES, reverse=True)
+
+        serialized = first_page[0].serialize(serialize_fields=["experience", "killed"])
+        assert serialized["user_name"] == "User0"
+        assert serialized["experience"] == 50
+        assert not hasattr(first_page[0], "best_times")
+
+    db(test)
+
+
+def test_top_endpoint_is_paginated(db, monkeypatch):
+    monkeypatch.setattr(RestAPI, "TOP_PAGE_SIZE", 3)
+
+    async def test():
+        db_channel = await create_players()
+        channel = StubChannel(db_channel.discord_id, StubGuild(1 << 22))
+        cog = RestAPI(StubBot([channel]))
+
+        async def top(**query):
+            request = types.SimpleNamespace(match_info={"channel_id": str(channel.id)}, query=query)
+            return await cog.channel_top(request)
+
+        # Without a limit, the first page is returned, not the whole channel
+        pages = []
+        response = await top()
+        while True:
+            pages.append([player["experience"] for player in json.loads(response.text)])
+            if "X-Next-After" not in response.headers:
+                break
+            response = await top(after=response.headers["X-Next-After"])
+        assert pages == [[50, 30, 30], [30, 30, 10], [0, -5]]
+
+        for limit in ("0", str(RestAPI.TOP_MAX_PAGE_SIZE + 1)):
+            with pytest.raises(HTTPBadRequest):
+                await top(limit=limit)
+
+    db(test)
+
+
+def test_saves_update_the_cached_ranking(db):
+    async def test():
+        db_channel = await create_players()
+        loads = LEADERBOARDS.loads
+        expected = await Player.filter(channel=db_channel).order_by("-experience", "-id")
+        assert [await get_player_rank(player) for player in expected] == list(range(1, len(EXPERIENCES) + 1))
+
+        last = await Player.filter(channel=db_channel, experience=-5).first()
+        last.experience = 100
+        await last.save()
+        assert await get_player_rank(last) == 1
+
+        first_page = await get_leaderboard_page(db_channel.pk, limit=2)
+        assert [row.experience for row in first_page] == [100, 50]
+
+        await last.delete()
+        first_page = await get_leaderboard_page(db_channel.pk, limit=2)
+        assert [row.experience for row in first_page] == [50, 30]
+
+        # Only one query loaded the channel
+        assert LEADERBOARDS.loads == loads + 1
+
+    db(test)
+
+
+def test_queries_serve_the_leaderboard_while_the_channel_is_loading(db, monkeypatch):
+    loaded = asyncio.Event()
+
+    async def slow_load_rows(channel_id):
+        await loaded.wait()
+        return await load_rows(channel_id)
+
+    load_rows = leaderboards._load_rows
+    monkeypatch.setattr(leaderboards, "_load_rows", slow_load_rows)
+
+    async def test():
+        db_channel = await create_players()
+        players = await Player.filter(channel=db_channel)
+        loads, hits = LEADERBOARDS.loads, LEADERBOARDS.hits
+
+        queried_ranks = [await get_player_rank(player) for player in players]
+        queried_pages = [
+            await get_leaderboard_page(db_channel.pk, limit=3),
+            await get_leaderboard_page(db_channel.pk, after=(30, players[4].id), limit=3),
+        ]
+        # One load was started, and nothing is cached until it's done
+        assert LEADERBOARDS.loads == loads + 1
+        assert LEADERBOARDS.get(db_channel.pk) is None
+
+        loaded.set()
+        await asyncio.sleep(0.1)
+        assert LEADERBOARDS.get(db_channel.pk) is not None
+
+        # The queries and the ranking agree
+        assert [await get_player_rank(player) for player in players] == queried_ranks
+        assert [
+            await get_leaderboard_page(db_channel.pk, limit=3),
+            await get_leaderboard_page(db_channel.pk, after=(30, players[4].id), limit=3),
+        ] == queried_pages
+        assert LEADERBOARDS.hits == hits + len(players) + 2
+
+    db(test)
@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+from utils.locks import LockTable
+
+
+def test_locks_are_dropped_once_released():
+    async def test():
+        locks = LockTable()
+        for i in range(1000):
+            async with locks.lock("player", i, 42):
+                assert len(locks) == 1
+        assert len(locks) == 0
+        assert locks.peak == 1
+        assert locks.contended == 0
+
+    asyncio.run(test())
+
+
+def test_locks_are_mutually_exclusive():
+    async def test():
+        locks = LockTable()
+        inside = []
+
+        async def worker(i):
+            async with locks.lock("get_from_db", 1):
+                inside.append(i)
+                assert len(inside) == 1
+                await asyncio.sleep(0)
+                inside.remove(i)
+
+        await asyncio.gather(*(worker(i) for i in range(10)))
+        assert len(locks) == 0
+        assert locks.acquisitions == 10
+        assert locks.contended == 9
+        assert locks.max_waiters == 9
+
+    asyncio.run(test())
+
+
+def test_cancelled_waiters_release_their_reference():
+    async def test():
+        locks = LockTable()
+
+        async with locks.lock("inventory", 1):
+            waiter = asyncio.create_task(locks.lock("inventory", 1).__aenter__())
+            await asyncio.sleep(0)
+            assert locks.most_contended() == [(("inventory", 1), 1)]
+
+            waiter.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiter
+
+        assert len(locks) == 0
+
+    asyncio.run(test())
+
+
+def test_cancelled_during_a_handoff_release_their_reference():
+    async def test():
+        locks = LockTable()
+        holder = locks.lock("inventory", 1)
+        waiter = locks.lock("inventory", 1)
+        late = locks.lock("inventory", 1)
+
+        await holder.__aenter__()
+        waiting = asyncio.create_task(waiter.__aenter__())
+        await asyncio.sleep(0)
+
+        # Runs before the waiter wakes up: the lock isn't locked anymore, but it's handed off to the waiter
+        late_task = asyncio.create_task(late.__aenter__())
+        await holder.__aexit__(None, None, None)
+        await asyncio.sleep(0)
+        assert not late_task.done()
+
+        late_task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await late_task
+
+        await waiting
+        assert locks.most_contended() == []
+        await waiter.__aexit__(None, None, None)
+        assert len(locks) == 0
+
+    asyncio.run(test())
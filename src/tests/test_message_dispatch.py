@@ -0,0 +1,62 @@
+import asyncio
+import types
+
+from conftest import StubChannel, StubGuild, StubMember
+from utils.message_dispatch import MessageDispatchCache
+from utils.models import AccessLevel, get_from_db
+from utils.prefix_index import PrefixIndex
+
+
+class StubBot:
+    def __init__(self):
+        self.prefix_index = PrefixIndex(["dh!"])
+        self.prefix_index.loaded = True
+        self.message_dispatches = MessageDispatchCache(max_messages=2)
+        self.contexts_built = 0
+
+    async def get_context(self, message, cls):
+        self.contexts_built += 1
+        await asyncio.sleep(0)
+        return types.SimpleNamespace(valid=message.content == "dh!bang")
+
+    def get_message_dispatch(self, message):
+        return self.message_dispatches.get(self, message)
+
+
+def make_message(message_id: int, content: str, channel: StubChannel):
+    author = StubMember(3 << 22, channel.guild)
+    return types.SimpleNamespace(id=message_id, content=content, guild=channel.guild, channel=channel, author=author)
+
+
+def test_listeners_share_the_context_and_database_objects(db):
+    async def test():
+        bot = StubBot()
+        channel = StubChannel(1 << 22, StubGuild(2 << 22))
+        message = make_message(10 << 22, "dh!bang", channel)
+
+        async def listener():
+            dispatch = bot.get_message_dispatch(message)
+            return await dispatch.is_command(), await dispatch.db_channel(), dispatch.access_level()
+
+        results = await asyncio.gather(*(listener() for _ in range(5)))
+        assert bot.contexts_built == 1
+        assert all(result == results[0] for result in results)
+        assert results[0][0] is True
+        assert results[0][1] is await get_from_db(channel)
+        assert results[0][2] == AccessLevel.DEFAULT
+        assert bot.prefix_index.accepted == 1
+
+        # Chatting, the context isn't even needed
+        chatting = make_message(11 << 22, "hello", channel)
+        assert not await bot.get_message_dispatch(chatting).is_command()
+        assert bot.contexts_built == 1
+
+        # Only the most recent messages are kept
+        bot.get_message_dispatch(make_message(12 << 22, "hello", channel))
+        assert len(bot.message_dispatches) == 2
+        assert bot.get_message_dispatch(message).message is message
+        assert bot.contexts_built == 1
+        assert await bot.get_message_dispatch(message).is_command()
+        assert bot.contexts_built == 2
+
+    db(test)
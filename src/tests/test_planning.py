@@ -0,0 +1,67 @@
+import asyncio
+import random
+
+import numpy as np
+
+from utils.models import DAY, DiscordChannel, DucksLeft
+from utils.planning import compute_ducks_counts, night_seconds_left
+
+
+def random_channels(count):
+    channels = []
+    for _ in range(count):
+        night_start_at, night_end_at = random.choice(
+            [
+                (0, 0),
+                (random.randrange(DAY), random.randrange(DAY)),
+                # Edges of the night windows
+                (random.choice([0, DAY - 1]), random.randrange(DAY)),
+                (random.randrange(DAY), random.choice([0, DAY - 1])),
+            ]
+        )
+        channels.append(
+            DiscordChannel(
+                discord_id=len(channels),
+                name="parity",
+                ducks_per_day=random.choice([1, 5, 24, 48, 96, 1000, random.randint(1, 5000)]),
+                night_start_at=night_start_at,
+                night_end_at=night_end_at,
+            )
+        )
+    return channels
+
+
+async def reference_ducks_counts(channels, now):
+    counts = []
+    for channel in channels:
+        ducks_left = await DucksLeft(None).compute_ducks_count(channel, now)
+        counts.append((ducks_left.day_ducks, ducks_left.night_ducks))
+    return counts
+
+
+def test_night_seconds_left_parity():
+    random.seed(3)
+    channels = random_channels(2000)
+    night_start_at = np.array([c.night_start_at for c in channels])
+    night_end_at = np.array([c.night_end_at for c in channels])
+
+    for now in [0, 1, DAY - 1, DAY, *random.sample(range(DAY), 50)]:
+        vectorized = night_seconds_left(night_start_at, night_end_at, now)
+        assert vectorized.tolist() == [c.night_seconds_left(now) for c in channels]
+
+
+def test_compute_ducks_counts_parity():
+    random.seed(4)
+    channels = random_channels(2000)
+    ducks_per_day = np.array([c.ducks_per_day for c in channels])
+    night_start_at = np.array([c.night_start_at for c in channels])
+    night_end_at = np.array([c.night_end_at for c in channels])
+
+    for now in [1_700_000_000 + offset for offset in [1, DAY - 1, *random.sample(range(DAY), 20)]]:
+        day_ducks, night_ducks = compute_ducks_counts(
+            ducks_per_day, night_start_at, night_end_at, now
+        )
+
+        assert list(zip(day_ducks.tolist(), night_ducks.tolist())) == asyncio.run(
+            reference_ducks_counts(channels, now)
+        )
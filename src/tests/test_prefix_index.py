@@ -0,0 +1,71 @@
+import asyncio
+import types
+
+from utils.models import DiscordGuild
+from utils.prefix_index import PrefixIndex
+
+GUILD_ID = 1 << 22
+
+
+def message(content, guild_id=GUILD_ID):
+    guild = types.SimpleNamespace(id=guild_id) if guild_id else None
+    return types.SimpleNamespace(content=content, guild=guild)
+
+
+def test_only_messages_starting_with_a_prefix_could_be_commands(db):
+    async def test():
+        await DiscordGuild.create(discord_id=GUILD_ID, name="Guild", prefix="?")
+        await DiscordGuild.create(discord_id=2 << 22, name="Guild", prefix=None)
+        await DiscordGuild.create(discord_id=3 << 22, name="Guild", prefix="")
+
+        index = PrefixIndex(["dh!", "dh"])
+        # Not loaded yet
+        assert index.could_be_command(message("hello"))
+
+        index.set_mentions(5 << 22)
+        await index.load()
+
+        assert index.could_be_command(message("dh!bang"))
+        assert index.could_be_command(message("?bang"))
+        assert index.could_be_command(message(f"<@{5 << 22}> bang"))
+        assert not index.could_be_command(message("hello"))
+        assert not index.could_be_command(message(""))
+        assert not index.could_be_command(message("!bang"))
+        # In DMs
+        assert index.could_be_command(message("bang", guild_id=None))
+
+        # No guild prefix
+        assert not index.could_be_command(message("?bang", guild_id=2 << 22))
+        # Every message starts with an empty prefix
+        assert index.could_be_command(message("hello", guild_id=3 << 22))
+        # Not in the database yet, so it'll get the default one
+        assert index.could_be_command(message("!bang", guild_id=4 << 22))
+
+        index.set_guild_prefix(GUILD_ID, "!")
+        assert index.could_be_command(message("!bang"))
+        assert not index.could_be_command(message("?bang"))
+
+    db(test)
+
+
+def test_prefixes_changed_outside_of_the_bot_are_reloaded(db):
+    async def test():
+        await DiscordGuild.create(discord_id=GUILD_ID, name="Guild", prefix="?")
+        index = PrefixIndex(["dh!"], ttl=0)
+        await index.load()
+
+        # Edited from the admin website
+        await DiscordGuild.filter(discord_id=GUILD_ID).update(prefix="!")
+        # Still the old prefix until the reload is done
+        assert not index.could_be_command(message("!bang"))
+        assert index.reloads == 1
+        # Set by the bot while reloading: not overwritten by the values loaded
+        await asyncio.sleep(0)
+        index.set_guild_prefix(2 << 22, "$")
+        await index._loading
+
+        assert index.could_be_command(message("!bang"))
+        assert not index.could_be_command(message("?bang"))
+        assert index.could_be_command(message("$bang", guild_id=2 << 22))
+
+    db(test)
@@ -0,0 +1,53 @@
+import asyncio
+
+from tortoise import Tortoise
+
+from utils.models import DiscordGuild
+from utils.query_stats import QueryStats
+
+
+class StubLogger:
+    def __init__(self):
+        self.warnings = []
+
+    def warning(self, message, *args, **kwargs):
+        self.warnings.append(message)
+
+
+def test_queries_are_attributed_to_scopes(db):
+    async def test():
+        stats = QueryStats(budget=3, repeated_threshold=4)
+        stats.logger = StubLogger()
+        stats.instrument(Tortoise.get_connection("default"))
+        try:
+            await DiscordGuild.create(discord_id=1 << 22, name="Guild")
+            assert stats.unattributed.queries == 1
+
+            with stats.scope("command guild"):
+                await DiscordGuild.get(discord_id=1 << 22)
+
+            with stats.scope("command leaderboard"):
+                for i in range(5):
+                    await DiscordGuild.filter(discord_id=i).first()
+
+            async def background():
+                with stats.scope("task background"):
+                    await DiscordGuild.all().count()
+
+            await asyncio.gather(background(), background())
+        finally:
+            stats.uninstrument(Tortoise.get_connection("default"))
+
+        assert stats.scopes["command guild"].queries == 1
+        assert stats.scopes["task background"].invocations == 2
+        assert stats.scopes["task background"].queries == 2
+
+        leaderboard = stats.scopes["command leaderboard"]
+        assert leaderboard.queries == 5
+        assert leaderboard.over_budget == 1
+        assert leaderboard.n_plus_one == 1
+        assert leaderboard.repeated_statement.startswith("SELECT")
+        assert len(stats.logger.warnings) == 2
+        assert stats.top(1)[0][0] == "command leaderboard"
+
+    db(test)
@@ -0,0 +1,74 @@
+import asyncio
+
+from utils.rank_index import ChannelRanking, LeaderboardRow, RankIndex
+
+
+def row(player_id, experience):
+    return LeaderboardRow(player_id, experience, player_id << 22, f"User{player_id}", "0")
+
+
+def test_ranks_and_pages():
+    ranking = ChannelRanking([row(1, 10), row(2, 30), row(3, 10), row(4, -2)])
+
+    assert [r.player_id for r in ranking.page()] == [2, 3, 1, 4]
+    assert [r.player_id for r in ranking.page(after=(10, 3), limit=1)] == [1]
+    assert ranking.rank(2, 30) == 1
+    assert ranking.rank(1, 10) == 3
+    # A player that isn't known yet
+    assert ranking.rank(5, 20) == 2
+
+    ranking.update(4, 50)
+    assert ranking.rank(4, 50) == 1
+    ranking.update(5, 20, (5 << 22, "User5", "0"))
+    assert [r.player_id for r in ranking.page()] == [4, 2, 5, 3, 1]
+    ranking.remove(2)
+    assert [r.experience for r in ranking.page()] == [50, 20, 10, 10]
+
+
+def test_updates_while_loading_are_applied():
+    async def test():
+        index = RankIndex()
+        loaded = asyncio.Event()
+
+        async def loader(channel_id):
+            await loaded.wait()
+            return [row(1, 10), row(2, 20)]
+
+        load = asyncio.create_task(index.load(1, loader))
+        other_load = asyncio.create_task(index.load(1, loader))
+        await asyncio.sleep(0)
+        index.update(1, 1, 30)
+        # The other channels aren't cached, so the updates are ignored
+        index.update(2, 1, 30)
+        loaded.set()
+
+        ranking = await load
+        assert await other_load is ranking
+        assert index.loads == 1
+        assert [r.player_id for r in ranking.page()] == [1, 2]
+        assert index.get(1) is ranking
+        assert index.get(2) is None
+
+        # New players without a name can't be added, the channel will be reloaded
+        index.update(1, 3, 0)
+        assert index.get(1) is None
+
+    asyncio.run(test())
+
+
+def test_least_recently_used_channels_are_evicted():
+    async def test():
+        index = RankIndex(max_channels=2)
+
+        async def loader(channel_id):
+            return [row(channel_id, 0)]
+
+        for channel_id in (1, 2, 1, 3):
+            await index.load(channel_id, loader)
+
+        assert index.get(2) is None
+        assert index.get(1) is not None
+        assert index.evictions == 1
+        assert index.hits == 1
+
+    asyncio.run(test())
@@ -0,0 +1,131 @@
+from utils.rate_limits import FairShares, KeyedTokenBuckets, SpawnDispatcher, TokenBucket
+
+
+def test_token_bucket_refills_up_to_its_capacity():
+    bucket = TokenBucket(rate=0.5, capacity=3, now=0)
+
+    # Full at first, so that bursts go through
+    for _ in range(3):
+        assert bucket.has_token(0)
+        bucket.take()
+    assert not bucket.has_token(0)
+
+    assert not bucket.has_token(1)
+    assert bucket.has_token(2)
+    bucket.take()
+
+    # Never more than the capacity, even after a long time
+    assert bucket.is_full(1000)
+    assert bucket.tokens == 3
+    # The clock going backwards doesn't refill anything
+    bucket.take()
+    assert not bucket.is_full(500)
+    assert bucket.tokens == 2
+
+
+def test_keyed_buckets_prune_full_buckets():
+    buckets = KeyedTokenBuckets(rate=1, capacity=2)
+    buckets.get(1, 0).take()
+    buckets.get(2, 0)
+    assert len(buckets) == 2
+
+    buckets.prune(0)
+    assert len(buckets) == 1
+
+    buckets.prune(1)
+    assert len(buckets) == 0
+
+
+def test_spawns_are_deferred_when_a_bucket_is_empty():
+    dispatcher = SpawnDispatcher(guild_rate=1, guild_burst=2, channel_rate=0.5, channel_burst=1, now=0)
+
+    # Two channels of the same guild, and another guild
+    for i, (guild_id, channel_id) in enumerate([(1, 10), (1, 10), (1, 11), (1, 12), (2, 20)]):
+        dispatcher.push(0, guild_id, channel_id, i)
+
+    # Channel 10 only has one token, guild 1 two: the other guild isn't blocked behind them
+    assert dispatcher.dispatch(0) == [0, 2, 4]
+    assert len(dispatcher) == 2
+    assert dispatcher.total_deferred == 2
+
+    # Guild 1 gets a token back, but channel 10 doesn't yet: the spawn of channel 12 goes through
+    assert dispatcher.dispatch(1) == [3]
+    assert dispatcher.dispatch(2) == [1]
+    assert len(dispatcher) == 0
+    assert dispatcher.total_dispatched == 5
+    assert dispatcher.total_deferred == 2 + 1
+    assert dispatcher.max_depth == 2
+    assert dispatcher.last_depth == 0
+
+
+def test_spawns_are_released_in_order_when_the_global_bucket_is_empty():
+    global_bucket = TokenBucket(rate=2, capacity=2, now=0)
+    dispatcher = SpawnDispatcher(global_bucket=global_bucket, guild_burst=100, channel_burst=100, now=0)
+    for i in range(7):
+        dispatcher.push(0, i, i, i)
+
+    released = []
+    for now in range(4):
+        released.append(dispatcher.dispatch(now))
+    assert released == [[0, 1], [2, 3], [4, 5], [6]]
+
+    # Spawns waiting for the global bucket count in the queue depth too
+    assert dispatcher.max_depth == 5
+    assert global_bucket.tokens == 1
+
+
+def test_wait_time_percentiles():
+    dispatcher = SpawnDispatcher(global_bucket=TokenBucket(1000, 1000, 0), now=0)
+    assert dispatcher.wait_time_percentile(50) == 0
+
+    for due_at in range(100):
+        dispatcher.push(due_at, due_at, due_at, due_at)
+    # Every spawn is released at 100, after waiting between 1 and 100 seconds
+    assert len(dispatcher.dispatch(100)) == 100
+
+    assert dispatcher.wait_time_percentile(50) == 51
+    assert dispatcher.wait_time_percentile(90) == 91
+    assert dispatcher.wait_time_percentile(100) == 100
+
+
+def test_prune_forgets_idle_guilds_and_channels():
+    dispatcher = SpawnDispatcher(now=0)
+    dispatcher.push(0, 1, 10, "duck")
+    dispatcher.dispatch(0)
+    assert len(dispatcher.guild_buckets) == len(dispatcher.channel_buckets) == 1
+
+    dispatcher.prune(60)
+    assert len(dispatcher.guild_buckets) == len(dispatcher.channel_buckets) == 0
+
+
+def test_fair_shares_only_limit_a_short_bucket():
+    assert FairShares.compute(10, {0: 4, 1: 6}, now=0) is None
+    assert FairShares.compute(10, {0: 0, 1: 10}, now=0) is None
+
+    # Dispatchers needing less than an equal share get all they need, the others split the rest
+    assert FairShares.compute(10, {0: 10, 1: 10, 2: 1}, now=0) == {2: 1, 0: 5, 1: 4}
+    # The remainder goes to a different dispatcher every second
+    assert FairShares.compute(10, {0: 10, 1: 10, 2: 1}, now=1) == {2: 1, 1: 5, 0: 4}
+
+
+def test_shards_sharing_the_global_bucket_get_the_same_spawns():
+    global_bucket = TokenBucket(rate=4, capacity=4, now=0)
+    shares = FairShares(global_bucket)
+    dispatchers = {
+        shard_id: SpawnDispatcher(global_bucket=global_bucket, guild_burst=100, channel_burst=100, now=0)
+        for shard_id in range(3)
+    }
+    for shard_id, dispatcher in dispatchers.items():
+        for i in range(100):
+            dispatcher.push(0, shard_id * 1000 + i, shard_id * 1000 + i, (shard_id, i))
+
+    def waiting():
+        return {shard_id: len(dispatcher) for shard_id, dispatcher in dispatchers.items()}
+
+    released = {shard_id: 0 for shard_id in dispatchers}
+    for now in range(30):
+        # The shards always dispatch in the same order
+        for shard_id, dispatcher in dispatchers.items():
+            released[shard_id] += len(dispatcher.dispatch(now, shares.share(shard_id, now, waiting)))
+
+    assert released == {0: 40, 1: 40, 2: 40}
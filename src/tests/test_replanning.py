@@ -0,0 +1,186 @@
+from cogs.ducks_spawning import DucksSpawning
+from conftest import StubBot, StubChannel, StubGuild
+from utils.models import DAY, DiscordChannel, DiscordGuild, get_from_db
+from utils.snapshots import dump_snapshot, write_snapshot
+
+# Midday, so that the rollover and the replanning have ducks left to plan
+NOW = 20_000 * DAY + DAY // 2
+
+
+async def start_spawning(channels_count=5):
+    guild = StubGuild(1 << 22)
+    db_guild = await DiscordGuild.create(discord_id=guild.id, name=guild.name)
+    channels = [StubChannel((i + 2) << 22, guild) for i in range(channels_count)]
+    for channel in channels:
+        await DiscordChannel.create(discord_id=channel.id, name=channel.name, guild=db_guild, enabled=True)
+
+    bot = StubBot(channels, config={"cogs": {"DucksSpawning": {"rollover_window": 10}}})
+    cog = bot.cogs["DucksSpawning"] = DucksSpawning(bot)
+    await cog.cog_load()
+    # The tests drive the loops themselves
+    cog.background_loop.cancel()
+    await cog.planify(NOW)
+    for spawner in cog.shards.values():
+        spawner.task.cancel()
+    return bot, cog, channels
+
+
+def test_channels_are_replanned_after_their_settings_change(db):
+    async def test():
+        bot, cog, channels = await start_spawning()
+        channel = channels[0]
+        db_channel = await get_from_db(channel)
+        planned = bot.enabled_channels[channel]
+        # The spawning engine uses the same instance as the commands
+        assert planned.db_channel is db_channel
+
+        # Spawn weights are read when ducks spawn, so they don't replan the channel
+        db_channel.spawn_weight_ghost_ducks = 100
+        await db_channel.save()
+        # Neither do saves of other fields
+        db_channel.ducks_per_day = planned.ducks_left * 10
+        await db_channel.save(update_fields=["spawn_weight_ghost_ducks"])
+        cog.replan_dirty(NOW + 1)
+        assert bot.enabled_channels[channel] is planned
+
+        await db_channel.save()
+        assert cog.dirty_channels == {channel.id: db_channel}
+        cog.replan_dirty(NOW + 1)
+        replanned = bot.enabled_channels[channel]
+        assert replanned is not planned
+        assert replanned.ducks_left > planned.ducks_left
+        assert not cog.dirty_channels
+
+        # Saved again without changes
+        await db_channel.save()
+        assert not cog.dirty_channels
+
+        # Disabling the channel stops its spawns
+        db_channel.enabled = False
+        await db_channel.save(update_fields=["enabled"])
+        cog.replan_dirty(NOW + 2)
+        assert channel not in bot.enabled_channels
+
+    db(test)
+
+
+def test_channels_spawn_from_midnight_while_the_rollover_refreshes_them(db):
+    async def test():
+        bot, cog, channels = await start_spawning()
+        # Every duck of the day spawned
+        for ducks_left in bot.enabled_channels.values():
+            ducks_left.day_ducks = ducks_left.night_ducks = 0
+
+        midnight = NOW - NOW % DAY + DAY
+        cog.start_rollover(midnight)
+        planned = dict(bot.enabled_channels)
+        assert all(ducks_left.ducks_left > 0 for ducks_left in planned.values())
+        timeline = cog.shards[0].timeline
+        next_spawns = {}
+        while timeline:
+            next_spawn, ducks_left, _ = timeline.pop_due(midnight + DAY)
+            if ducks_left is planned[ducks_left.channel]:
+                next_spawns[ducks_left.channel] = next_spawn
+        assert set(next_spawns) == set(channels)
+        assert all(midnight < next_spawn < midnight + DAY for next_spawn in next_spawns.values())
+
+        # Only the channels whose settings changed in the database are planned again
+        await DiscordChannel.filter(discord_id=channels[0].id).update(ducks_per_day=1000)
+        await cog.continue_rollover(midnight + 10)
+        assert not cog.rollover_queue
+        assert bot.enabled_channels[channels[0]] is not planned[channels[0]]
+        for channel in channels[1:]:
+            assert bot.enabled_channels[channel] is planned[channel]
+
+    db(test)
+
+
+def test_rollover_skips_channels_replanned_or_disabled_since_the_day_changed(db):
+    async def test():
+        bot, cog, channels = await start_spawning()
+        midnight = NOW - NOW % DAY + DAY
+        cog.start_rollover(midnight)
+        assert len(cog.rollover_queue) == len(channels)
+
+        replanned_channel, disabled_channel = channels[0], channels[1]
+        db_channel = await get_from_db(replanned_channel)
+        db_channel.ducks_per_day = 1000
+        await db_channel.save()
+        db_channel = await get_from_db(disabled_channel)
+        db_channel.enabled = False
+        await db_channel.save()
+        cog.replan_dirty(midnight)
+        replanned = bot.enabled_channels[replanned_channel]
+
+        # Changed in the database directly: the rollover still updates the cached instance in use
+        await DiscordChannel.filter(discord_id=channels[2].id).update(ducks_per_day=500)
+
+        await cog.continue_rollover(midnight + 10)
+        assert not cog.rollover_queue
+
+        assert bot.enabled_channels[replanned_channel] is replanned
+        assert disabled_channel not in bot.enabled_channels
+        for channel in channels[2:]:
+            ducks_left = bot.enabled_channels[channel]
+            assert ducks_left.db_channel is await get_from_db(channel)
+        assert bot.enabled_channels[channels[2]].db_channel.ducks_per_day == 500
+
+    db(test)
+
+
+def test_rollover_drops_channels_deleted_from_the_database(db):
+    async def test():
+        bot, cog, channels = await start_spawning()
+        midnight = NOW - NOW % DAY + DAY
+        cog.start_rollover(midnight)
+        await DiscordChannel.filter(discord_id=channels[0].id).delete()
+
+        # Half of the channels are planned half-way through the rollover window
+        await cog.continue_rollover(midnight + 4)
+        assert len(cog.rollover_queue) == 2
+        await cog.continue_rollover(midnight + 9)
+        assert not cog.rollover_queue
+
+        assert channels[0] not in bot.enabled_channels
+        assert len(bot.enabled_channels) == len(channels) - 1
+
+    db(test)
+
+
+def test_restart_during_the_rollover_plans_the_channels_left(db, monkeypatch):
+    async def test():
+        bot, cog, channels = await start_spawning()
+        # Every duck of the day spawned
+        for ducks_left in bot.enabled_channels.values():
+            ducks_left.day_ducks = ducks_left.night_ducks = 0
+
+        midnight = NOW - NOW % DAY + DAY
+        cog.start_rollover(midnight)
+        await cog.continue_rollover(midnight + 4)
+        pending = [channel for channel, _, _ in cog.rollover_queue]
+        planned = {channel: bot.enabled_channels[channel] for channel in channels if channel not in pending}
+        assert pending and planned
+        assert all(ducks_left.ducks_left > 0 for ducks_left in planned.values())
+
+        snapshot = cog.build_snapshot(midnight + 5)
+        assert snapshot.rollover_pending == {channel.id for channel in pending}
+        write_snapshot(DucksSpawning.SNAPSHOT_PATH, dump_snapshot(snapshot))
+
+        # The bot restarts before the end of the rollover window
+        monkeypatch.setattr("cogs.ducks_spawning.time", lambda: midnight + 6)
+        bot = StubBot(channels)
+        cog = DucksSpawning(bot)
+        cog.READY_DELAY = 0
+        await cog.cog_load()
+        cog.background_loop.cancel()
+        await cog.before()
+        for spawner in cog.shards.values():
+            spawner.task.cancel()
+
+        for channel, ducks_left in planned.items():
+            restored = bot.enabled_channels[channel]
+            assert (restored.day_ducks, restored.night_ducks) == (ducks_left.day_ducks, ducks_left.night_ducks)
+        for channel in pending:
+            assert bot.enabled_channels[channel].ducks_left > 0
+
+    db(test)
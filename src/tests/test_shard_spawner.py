@@ -0,0 +1,154 @@
+import asyncio
+import time
+
+from cogs.ducks_spawning import DucksSpawning
+from conftest import QuietDuck, StubBot, StubChannel, StubGuild, restore_duck
+from utils import ducks
+from utils.models import DAY, DiscordChannel, DucksLeft, SunState
+
+MIDNIGHT = (int(time.time()) // DAY) * DAY
+
+
+async def make_cog(shard_ids, config=None):
+    bot = StubBot(shard_ids=shard_ids, config=config)
+    cog = DucksSpawning(bot)
+    await cog.cog_load()
+    # The tests drive the loops themselves
+    cog.background_loop.cancel()
+    for shard_id in shard_ids:
+        cog.get_shard(shard_id).task.cancel()
+    return bot, cog
+
+
+async def setup_channel(bot, cog, channel_id: int, shard_id: int):
+    """
+    Enable a channel with one duck left to spawn today, and one duck about to leave.
+    """
+    channel = StubChannel(channel_id, StubGuild(channel_id, shard_id))
+    db_channel = DiscordChannel(discord_id=channel_id, name="shards", ducks_time_to_live=600)
+    ducks_left = bot.enabled_channels[channel] = DucksLeft(channel, day_ducks=1, night_ducks=0, db_channel=db_channel)
+    cog.get_shard(shard_id).timeline.plan(ducks_left, MIDNIGHT)
+
+    duck = QuietDuck(bot, channel)
+    duck.spawned_at = MIDNIGHT
+    return channel, restore_duck(bot, channel, db_channel, duck)
+
+
+def test_disconnected_shards_are_paused_then_catch_up(monkeypatch):
+    spawned = []
+
+    async def spawn_random_weighted_duck(bot, channel, db_channel, sun=None):
+        spawned.append(channel)
+
+    monkeypatch.setattr(ducks, "spawn_random_weighted_duck", spawn_random_weighted_duck)
+
+    async def test():
+        bot, cog = await make_cog([0, 1])
+        channel_0, duck_0 = await setup_channel(bot, cog, 1, 0)
+        channel_1, duck_1 = await setup_channel(bot, cog, 2, 1)
+
+        # Shard 1 disconnects, every spawn and departure of the day is due
+        bot.shards_ready.discard(1)
+        now = MIDNIGHT + DAY - 1
+        for spawner in cog.shards.values():
+            await cog.shard_tick(spawner, now)
+        await asyncio.sleep(0)
+
+        assert cog.shards[1].paused and not cog.shards[0].paused
+        assert spawned == [channel_0]
+        assert duck_0 not in bot.ducks_spawned[channel_0]
+        # Nothing happened on the disconnected shard
+        assert duck_1 in bot.ducks_spawned[channel_1]
+        assert len(cog.shards[1].timeline) == 1
+        assert cog.shards[1].last_tick_at == 0
+
+        # It catches up once it reconnects
+        bot.shards_ready.add(1)
+        await cog.shard_tick(cog.shards[1], now + 1)
+        await asyncio.sleep(0)
+
+        assert not cog.shards[1].paused
+        assert spawned == [channel_0, channel_1]
+        assert duck_1 not in bot.ducks_spawned[channel_1]
+        assert cog.shards[1].last_tick_at == now + 1
+        assert len(bot.ducks_departures) == 0
+
+        # Paused shards don't get a share of the global bucket
+        bot.shards_ready.discard(1)
+        await cog.shard_tick(cog.shards[1], now + 2)
+        # The spawns it had waiting when it last dispatched
+        assert cog.waiting_spawns() == {0: 1}
+
+    asyncio.run(test())
+
+
+def test_spawns_due_while_spawning_was_disabled_are_planned_again(monkeypatch):
+    spawned = []
+
+    async def spawn_random_weighted_duck(bot, channel, db_channel, sun=None):
+        spawned.append(channel)
+
+    monkeypatch.setattr(ducks, "spawn_random_weighted_duck", spawn_random_weighted_duck)
+
+    async def test():
+        bot, cog = await make_cog([0])
+        spawner = cog.shards[0]
+        channel = StubChannel(1, StubGuild(1))
+        db_channel = DiscordChannel(discord_id=1, name="shards")
+        ducks_left = bot.enabled_channels[channel] = DucksLeft(
+            channel, day_ducks=200, night_ducks=0, db_channel=db_channel
+        )
+        spawner.timeline.plan(ducks_left, MIDNIGHT)
+
+        bot.allow_ducks_spawning = False
+        now = MIDNIGHT + DAY // 2
+        await cog.shard_tick(spawner, now)
+
+        # Half of the ducks of the day were due when spawning is enabled again
+        bot.allow_ducks_spawning = True
+        await cog.shard_tick(spawner, now + 1)
+        await asyncio.sleep(0)
+
+        assert spawned == [] and len(spawner.dispatcher) == 0
+        assert ducks_left.ducks_left == 200
+        next_spawn, _, _ = spawner.timeline.pop_due(MIDNIGHT + DAY)
+        assert next_spawn > now + 1
+
+    asyncio.run(test())
+
+
+def test_shards_share_the_global_bucket_whatever_order_they_tick_in(monkeypatch):
+    async def spawn_random_weighted_duck(bot, channel, db_channel, sun=None):
+        pass
+
+    monkeypatch.setattr(ducks, "spawn_random_weighted_duck", spawn_random_weighted_duck)
+    # Every channel has a duck to spawn every second
+    monkeypatch.setattr(DucksLeft, "next_spawn", lambda ducks_left, now: (now + 1, SunState.DAY))
+
+    async def test():
+        unlimited = {"guild_rate": 100, "guild_burst": 100, "channel_rate": 100, "channel_burst": 100}
+        config = {"cogs": {"DucksSpawning": {"spawn_rate_limits": {"global_rate": 4, "global_burst": 4, **unlimited}}}}
+        bot, cog = await make_cog([0, 1], config)
+        # The global bucket refills from the time the cog was loaded
+        start = int(time.time())
+
+        # Shard 0 ticks first, and wants much more than the global bucket allows. Shard 1 only needs one token.
+        for channel_id, shard_id in [(i + 1, 0) for i in range(10)] + [(11, 1)]:
+            channel = StubChannel(channel_id, StubGuild(channel_id, shard_id))
+            db_channel = DiscordChannel(discord_id=channel_id, name="shards")
+            ducks_left = bot.enabled_channels[channel] = DucksLeft(
+                channel, day_ducks=1000, night_ducks=0, db_channel=db_channel
+            )
+            cog.get_shard(shard_id).timeline.plan(ducks_left, start)
+
+        for now in range(start + 1, start + 11):
+            for spawner in cog.shards.values():
+                await cog.shard_tick(spawner, now)
+
+        heavy, light = cog.shards[0].dispatcher, cog.shards[1].dispatcher
+        # Once the shares caught up with the demand, the spawns of shard 1 don't wait behind the spawns of shard 0
+        assert light.total_dispatched == 10 and len(light) == 0
+        assert list(light.wait_times)[-6:] == [0] * 6
+        assert cog.global_shares._shares == {0: 3, 1: 1}
+
+    asyncio.run(test())
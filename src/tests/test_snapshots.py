@@ -0,0 +1,140 @@
+import time
+
+import pytest
+
+from cogs.ducks_spawning import DucksSpawning
+from conftest import StubBot, StubChannel, StubGuild
+from utils.models import DiscordChannel, DiscordGuild
+from utils.snapshots import SpawnSnapshot, dump_snapshot, load_snapshot, read_snapshot, write_snapshot
+
+
+def serialized_duck(i):
+    duck = {
+        "category": "normal",
+        "spawned_at": 1_700_000_000 + i,
+        "spawned_for": float(i % 600),
+        "lives_left": 1,
+        "lives": 1,
+        "webhook_parameters": {"avatar_url": "https://duckhunt.me/duck.png", "username": "Duck"},
+        "decoy": i % 7 == 0,
+    }
+    if i % 3 == 0:
+        duck.update(category="prof", operation="1 + 1", answer=2, anger=0)
+    if i % 5 == 0:
+        duck.update(lives_left=None, lives=None)
+    return duck
+
+
+def make_snapshot(ducks_count, channels_count):
+    return SpawnSnapshot(
+        taken_at=1_700_000_000.5,
+        planned_day=1_699_920_000,
+        ducks=[(i % channels_count, serialized_duck(i)) for i in range(ducks_count)],
+        ducks_left={i: (i % 50, i % 7) for i in range(channels_count)},
+    )
+
+
+def test_snapshot_round_trip():
+    snapshot = make_snapshot(1000, 100)
+    restored = load_snapshot(dump_snapshot(snapshot))
+
+    assert restored.taken_at == snapshot.taken_at
+    assert restored.planned_day == snapshot.planned_day
+    assert restored.ducks_left == snapshot.ducks_left
+    for (channel_id, duck), (restored_channel_id, restored_duck) in zip(snapshot.ducks, restored.ducks):
+        assert channel_id == restored_channel_id
+        del duck["spawned_at"]  # Recomputed from spawned_for on restore
+        assert duck == restored_duck
+
+
+def test_shared_strings_are_not_shared_by_restored_ducks():
+    unusual = serialized_duck(1)
+    unusual["webhook_parameters"] = {"username": "Duck", "avatar_url": None, "embeds": []}
+    snapshot = SpawnSnapshot(1.5, 0, [(1, serialized_duck(1)), (1, serialized_duck(2)), (2, unusual)], {})
+    restored = load_snapshot(dump_snapshot(snapshot))
+
+    (_, first), (_, second), (_, restored_unusual) = restored.ducks
+    assert first["webhook_parameters"] == second["webhook_parameters"]
+    # Ducks translate their own username
+    assert first["webhook_parameters"] is not second["webhook_parameters"]
+    assert restored_unusual["webhook_parameters"] == unusual["webhook_parameters"]
+
+
+def test_truncated_snapshot_is_rejected():
+    data = dump_snapshot(make_snapshot(10, 10))
+    for length in (0, 10, len(data) - 1):
+        with pytest.raises(ValueError):
+            load_snapshot(data[:length])
+
+
+def test_write_is_atomic(tmp_path):
+    path = str(tmp_path / "spawn_state.snapshot")
+    assert read_snapshot(path) is None
+
+    write_snapshot(path, dump_snapshot(make_snapshot(10, 10)))
+    write_snapshot(path, dump_snapshot(make_snapshot(20, 10)))
+
+    assert len(read_snapshot(path).ducks) == 20
+    assert [p.name for p in tmp_path.iterdir()] == ["spawn_state.snapshot"]
+
+
+def test_load_100k_ducks_is_fast():
+    data = dump_snapshot(make_snapshot(100_000, 10_000))
+
+    start = time.perf_counter()
+    snapshot = load_snapshot(data)
+    duration = time.perf_counter() - start
+
+    assert len(snapshot.ducks) == 100_000
+    assert duration < 1
+
+
+def test_restore_100k_ducks_at_startup_is_fast(db, monkeypatch):
+    channels_count = 1000
+    # discord objects hash on the timestamp part of their IDs, so small IDs would all collide
+    channels_ids = [(i + 1) << 22 for i in range(channels_count)]
+    snapshot = make_snapshot(100_000, channels_count)
+    snapshot = SpawnSnapshot(
+        snapshot.taken_at,
+        snapshot.planned_day,
+        [(channels_ids[channel_index], duck) for channel_index, duck in snapshot.ducks],
+        {},
+    )
+    write_snapshot(DucksSpawning.SNAPSHOT_PATH, dump_snapshot(snapshot))
+
+    async def no_lookup(*args, **kwargs):
+        raise AssertionError("Channels should be loaded in batches")
+
+    monkeypatch.setattr("cogs.ducks_spawning.get_from_db", no_lookup)
+
+    async def test():
+        db_guild = await DiscordGuild.create(discord_id=1, name="Guild")
+        # Some channels aren't enabled anymore, but still have ducks
+        await DiscordChannel.bulk_create(
+            [
+                DiscordChannel(discord_id=channel_id, name="snapshot", guild=db_guild, enabled=i % 10 != 0)
+                for i, channel_id in enumerate(channels_ids)
+            ],
+            batch_size=1000,
+        )
+
+        guild = StubGuild(1)
+        bot = StubBot([StubChannel(channel_id, guild) for channel_id in channels_ids])
+        cog = DucksSpawning(bot)
+        cog.READY_DELAY = 0
+        await cog.cog_load()
+        # Run before() directly, instead of the loop running it
+        cog.background_loop.cancel()
+
+        start = time.perf_counter()
+        await cog.before()
+        duration = time.perf_counter() - start
+
+        for spawner in cog.shards.values():
+            spawner.task.cancel()
+
+        assert len(bot.ducks_departures) == 100_000
+        assert len(bot.enabled_channels) == channels_count * 9 // 10
+        assert duration < 1
+
+    db(test)
@@ -0,0 +1,106 @@
+import asyncio
+import random
+
+import pytest
+
+from utils.models import DAY, DiscordChannel, DucksLeft, SunState
+from utils.spawn_timeline import SpawnTimeline
+
+HOUR = 3600
+MIDNIGHT = 100 * DAY
+
+
+def sun_state_at(db_channel: DiscordChannel, timestamp: int) -> SunState:
+    seconds = timestamp % DAY
+    for begin, end, sun_state in db_channel.sun_intervals():
+        if begin <= seconds < end:
+            return sun_state
+    raise AssertionError(f"{seconds} isn't in any sun interval")
+
+
+def run_day(db_channel: DiscordChannel, seed: int):
+    """
+    Spawn every duck of a day like the spawning loop does, and return the (timestamp, sun state) of each spawn.
+    """
+    rng_state = random.getstate()
+    random.seed(seed)
+    try:
+        ducks_left = DucksLeft(None)
+        asyncio.run(ducks_left.compute_ducks_count(db_channel, now=MIDNIGHT))
+        spawns = []
+        now = MIDNIGHT
+        while True:
+            next_spawn = ducks_left.next_spawn(now)
+            if next_spawn is None:
+                break
+            timestamp, sun_state = next_spawn
+            assert now < timestamp < MIDNIGHT + DAY
+            assert ducks_left.consume(sun_state)
+            spawns.append(next_spawn)
+            now = timestamp
+        return ducks_left, spawns
+    finally:
+        random.setstate(rng_state)
+
+
+@pytest.mark.parametrize(
+    "night_start_at, night_end_at",
+    [(0, 0), (21 * HOUR, 6 * HOUR), (16 * HOUR, 23 * HOUR), (0, DAY - 1)],
+)
+def test_every_duck_of_the_day_spawns_in_its_sun_state(night_start_at, night_end_at):
+    db_channel = DiscordChannel(
+        discord_id=1, name="spawns", ducks_per_day=96, night_start_at=night_start_at, night_end_at=night_end_at
+    )
+    planned = DucksLeft(None)
+    asyncio.run(planned.compute_ducks_count(db_channel, now=MIDNIGHT))
+
+    for seed in range(10):
+        ducks_left, spawns = run_day(db_channel, seed)
+        # Nothing is left once the day is over
+        assert ducks_left.ducks_left == 0
+        assert [sun_state for _, sun_state in spawns].count(SunState.DAY) == planned.day_ducks
+        assert [sun_state for _, sun_state in spawns].count(SunState.NIGHT) == planned.night_ducks
+        for timestamp, sun_state in spawns:
+            assert sun_state_at(db_channel, timestamp) == sun_state
+
+
+def test_spawns_are_spread_over_the_day():
+    # Without a night, the ducks of the night (a tenth of them) don't spawn
+    db_channel = DiscordChannel(discord_id=1, name="spawns", ducks_per_day=96)
+    per_quarter = [0, 0, 0, 0]
+    days = 50
+    for seed in range(days):
+        _, spawns = run_day(db_channel, seed)
+        assert len(spawns) == 86
+        for timestamp, _ in spawns:
+            per_quarter[(timestamp % DAY) * 4 // DAY] += 1
+
+    for count in per_quarter:
+        assert count / days == pytest.approx(86 / 4, rel=0.15)
+
+
+def test_consume_refuses_when_no_duck_is_left():
+    ducks_left = DucksLeft(None, day_ducks=1, night_ducks=0)
+    assert ducks_left.consume(SunState.DAY)
+    assert not ducks_left.consume(SunState.DAY)
+    assert not ducks_left.consume(SunState.NIGHT)
+    assert ducks_left.ducks_left == 0
+
+
+def test_timeline_pops_due_spawns_in_order():
+    db_channel = DiscordChannel(discord_id=1, name="spawns", ducks_per_day=96)
+    ducks_lefts = [DucksLeft(None, day_ducks=96, night_ducks=0, db_channel=db_channel) for _ in range(20)]
+
+    random.seed(1)
+    timeline = SpawnTimeline()
+    timeline.rebuild(ducks_lefts, MIDNIGHT)
+    assert len(timeline) == 20
+
+    popped = []
+    while (due := timeline.pop_due(MIDNIGHT + DAY)) is not None:
+        popped.append(due[0])
+    assert popped == sorted(popped)
+    assert len(popped) == 20
+    # Nothing is due before it's planned
+    timeline.plan(ducks_lefts[0], MIDNIGHT)
+    assert timeline.pop_due(MIDNIGHT) is None
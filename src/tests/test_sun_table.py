@@ -0,0 +1,106 @@
+import random
+
+import pytest
+
+from utils.models import DAY, DiscordChannel, SunState, SunTable
+
+NIGHT_WINDOWS = [
+    (0, 0),
+    (DAY - 1, DAY - 1),
+    (16 * 3600, 23 * 3600),
+    (21 * 3600, 6 * 3600),
+    (0, DAY - 1),
+    (DAY - 1, 0),
+    (0, 1),
+    (1, 0),
+    (3600, 3601),
+    (3601, 3600),
+    (random.randrange(DAY), random.randrange(DAY)),
+]
+
+
+# Reference implementations, as they were before the sun tables.
+
+def reference_night_seconds_left(night_start_at, night_end_at, now):
+    now = now % DAY
+
+    if night_start_at == night_end_at:
+        return 0
+    elif night_start_at < night_end_at:
+        if night_start_at < now <= night_end_at:
+            return night_end_at - now
+        elif night_end_at < now:
+            return 0
+        else:
+            return night_end_at - night_start_at
+    else:
+        if now <= night_end_at:
+            return (night_end_at - now) + (DAY - night_start_at)
+        elif night_end_at < now <= night_start_at:
+            return DAY - night_start_at
+        else:
+            return DAY - now
+
+
+def reference_day_status(night_start_at, night_end_at, now):
+    now = now % DAY
+
+    if night_start_at == night_end_at:
+        return SunState.DAY
+    elif night_start_at < night_end_at:
+        if night_start_at < now <= night_end_at:
+            return SunState.NIGHT
+        else:
+            return SunState.DAY
+    else:
+        if night_end_at < now <= night_start_at:
+            return SunState.DAY
+        else:
+            return SunState.NIGHT
+
+
+def reference_sun_state(night_start_at, night_end_at, seconds_spent_today):
+    if night_start_at == night_end_at:
+        return SunState.DAY, 0, DAY
+    elif night_start_at <= seconds_spent_today <= night_end_at:
+        return SunState.NIGHT, night_end_at - night_start_at, night_end_at - seconds_spent_today
+    elif night_end_at <= night_start_at <= seconds_spent_today:
+        return SunState.NIGHT, DAY - night_start_at + night_end_at, DAY - seconds_spent_today + night_end_at
+    elif night_start_at >= night_end_at >= seconds_spent_today:
+        return SunState.NIGHT, DAY - night_start_at + night_end_at, night_end_at - seconds_spent_today
+    else:
+        if night_start_at <= night_end_at:
+            duration_of_night = night_end_at - night_start_at
+            if seconds_spent_today <= night_start_at:
+                time_left_sun = night_start_at - seconds_spent_today
+            else:
+                time_left_sun = DAY - seconds_spent_today + night_start_at
+        else:
+            duration_of_night = DAY - night_start_at + night_end_at
+            time_left_sun = night_start_at - seconds_spent_today
+        return SunState.DAY, duration_of_night, time_left_sun
+
+
+@pytest.mark.parametrize("night_start_at, night_end_at", NIGHT_WINDOWS)
+def test_sun_table_matches_every_second(night_start_at, night_end_at):
+    table = SunTable(night_start_at, night_end_at)
+
+    for now in range(DAY):
+        night_seconds_left = reference_night_seconds_left(night_start_at, night_end_at, now)
+        assert table.night_seconds_left(now) == night_seconds_left
+        assert table.day_seconds_left(now) == DAY - now - night_seconds_left
+        assert table.day_status(now) == reference_day_status(night_start_at, night_end_at, now)
+        assert table.sun_state(now) == reference_sun_state(night_start_at, night_end_at, now)
+
+
+@pytest.mark.parametrize("night_start_at, night_end_at", NIGHT_WINDOWS)
+def test_sun_intervals_cover_the_day(night_start_at, night_end_at):
+    channel = DiscordChannel(discord_id=1, name="sun", night_start_at=night_start_at, night_end_at=night_end_at)
+    intervals = channel.sun_intervals()
+
+    assert intervals[0][0] == 0 and intervals[-1][1] == DAY
+    for (_, end, _), (begin, _, _) in zip(intervals, intervals[1:]):
+        assert end == begin
+    for begin, end, state in intervals:
+        for now in range(begin, end):
+            assert reference_day_status(night_start_at, night_end_at, now) == state
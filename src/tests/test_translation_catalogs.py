@@ -0,0 +1,94 @@
+import gettext
+import pathlib
+
+import polib
+
+from utils.translations import CatalogRegistry, get_ntranslate_function, get_translate_function
+
+SRC_DIRECTORY = pathlib.Path(__file__).parent.parent
+LOCALES_DIRECTORY = SRC_DIRECTORY / "locales"
+
+
+def compile_locales(localedir: pathlib.Path, language_codes):
+    for language_code in language_codes:
+        po_file = polib.pofile(str(LOCALES_DIRECTORY / language_code / "LC_MESSAGES" / "messages.po"))
+        (localedir / language_code / "LC_MESSAGES").mkdir(parents=True)
+        po_file.save_as_mofile(str(localedir / language_code / "LC_MESSAGES" / "messages.mo"))
+
+
+def test_catalogs_translate_like_gettext(tmp_path):
+    compile_locales(tmp_path, ["en_US", "fr", "pt_BR", "zh", "zh-Hans"])
+    registry = CatalogRegistry(str(tmp_path))
+    registry.load()
+    assert len(registry) == 5
+
+    po_file = polib.pofile(str(LOCALES_DIRECTORY / "fr" / "LC_MESSAGES" / "messages.po"))
+    for language_code, expected_language_code in [
+        ("fr", "fr"),
+        ("fr-CA", "fr_CA"),
+        ("pt-BR", "pt_BR"),
+        ("zh-Hans", "zh"),
+        ("en", "en"),
+        ("xx", "xx"),
+    ]:
+        expected = gettext.translation(
+            "messages", localedir=str(tmp_path), languages=[expected_language_code], fallback=True
+        )
+        catalog = registry.get(language_code)
+        assert registry.get(language_code) is catalog
+
+        for entry in po_file:
+            if entry.msgid_plural:
+                for n in (0, 1, 2):
+                    assert catalog.ngettext(entry.msgid, entry.msgid_plural, n) == expected.ngettext(
+                        entry.msgid, entry.msgid_plural, n
+                    )
+            assert catalog.gettext(entry.msgid) == expected.gettext(entry.msgid)
+
+    # Variants of a language share its catalog
+    assert registry.get("fr-CA") is registry.get("fr")
+    assert registry.get("zh-Hans") is registry.catalogs["zh"]
+    assert len(registry.get("xx")) == 0
+
+
+def test_plural_forms(tmp_path):
+    po_file = polib.POFile()
+    po_file.metadata = {
+        "Content-Type": "text/plain; charset=UTF-8",
+        "Plural-Forms": "nplurals=3; plural=(n==1 ? 0 : n%10>=2 && n%10<=4 && (n%100<10 || n%100>=20) ? 1 : 2);",
+    }
+    po_file.append(
+        polib.POEntry(
+            msgid="{n} duck",
+            msgid_plural="{n} ducks",
+            msgstr_plural={0: "{n} kaczka", 1: "{n} kaczki", 2: "{n} kaczek"},
+        )
+    )
+    po_file.append(polib.POEntry(msgid="Duck", msgstr="Kaczka"))
+    (tmp_path / "pl" / "LC_MESSAGES").mkdir(parents=True)
+    po_file.save_as_mofile(str(tmp_path / "pl" / "LC_MESSAGES" / "messages.mo"))
+
+    registry = CatalogRegistry(str(tmp_path))
+    catalog = registry.get("pl")
+    assert [catalog.ngettext("{n} duck", "{n} ducks", n) for n in (1, 3, 5, 22)] == [
+        "{n} kaczka",
+        "{n} kaczki",
+        "{n} kaczek",
+        "{n} kaczki",
+    ]
+    assert catalog.gettext("{n} duck") == "{n} kaczka"
+    assert catalog.gettext("Not translated") == "Not translated"
+    assert catalog.ngettext("{n} goose", "{n} geese", 2) == "{n} geese"
+
+
+def test_translate_functions(tmp_path, monkeypatch):
+    compile_locales(tmp_path, ["fr"])
+    registry = CatalogRegistry(str(tmp_path))
+    monkeypatch.setattr("utils.translations.CATALOGS", registry)
+
+    _ = get_translate_function(None, "fr", {"prefix": "dh!"})
+    assert _("Experience") == "Expérience"
+    assert _("Unknown {prefix}") == "Unknown dh!"
+
+    ngettext = get_ntranslate_function(None, "xx")
+    assert ngettext("{n} duck", "{n} ducks", 2) == "2 ducks"
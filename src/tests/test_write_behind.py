@@ -0,0 +1,60 @@
+import pytest
+
+from conftest import StubChannel, StubGuild, StubMember
+from utils.models import PLAYERS_WRITE_BUFFER, Player, get_player
+
+
+@pytest.fixture(autouse=True)
+def write_behind():
+    PLAYERS_WRITE_BUFFER.configure(interval=3600)
+    yield
+    PLAYERS_WRITE_BUFFER.configure(interval=0)
+
+
+def test_saves_are_coalesced(db):
+    async def test():
+        guild = StubGuild(1 << 22)
+        channel = StubChannel(2 << 22, guild)
+        members = [StubMember((10 + i) << 22, guild) for i in range(3)]
+
+        for _ in range(10):
+            for member in members:
+                db_player = await get_player(member, channel)
+                db_player.experience += 1
+                db_player.killed["normal"] += 1
+                await db_player.save()
+
+        # Nothing written yet, but get_player sees the changes
+        assert len(PLAYERS_WRITE_BUFFER) == 3
+        assert {p.experience for p in await Player.all()} == {0}
+        assert (await get_player(members[0], channel)).experience == 10
+
+        statements = PLAYERS_WRITE_BUFFER.statements
+        await PLAYERS_WRITE_BUFFER.close()
+        assert PLAYERS_WRITE_BUFFER.statements == statements + 1
+        assert len(PLAYERS_WRITE_BUFFER) == 0
+        assert {(p.experience, p.killed["normal"]) for p in await Player.all()} == {(10, 10)}
+
+    db(test)
+
+
+def test_flush_specific_objects(db):
+    async def test():
+        guild = StubGuild(1 << 22)
+        channel = StubChannel(2 << 22, guild)
+        first, second = StubMember(10 << 22, guild), StubMember(11 << 22, guild)
+
+        db_first = await get_player(first, channel)
+        db_second = await get_player(second, channel)
+        db_first.experience = db_second.experience = 50
+        await db_first.save()
+        await db_second.save()
+
+        await PLAYERS_WRITE_BUFFER.flush([db_first])
+        assert len(PLAYERS_WRITE_BUFFER) == 1
+        assert await Player.filter(experience=50).count() == 1
+
+        await PLAYERS_WRITE_BUFFER.close()
+        assert await Player.filter(experience=50).count() == 2
+
+    db(test)
@@ -0,0 +1,118 @@
+"""
+In-memory access levels, for the checks run before every command.
+
+Only the users and members whose access level isn't the default one are kept: the bans and permissions overrides of
+users, and the access levels members were given on their guild. They're loaded once at startup, and kept up-to-date as
+DiscordUser and DiscordMember objects are saved. Changes made to the database some other way (like the admin website)
+are picked up by reloading everything in the background every `ttl` seconds.
+"""
+import asyncio
+import time
+import typing
+
+if typing.TYPE_CHECKING:
+    from utils.models import AccessLevel
+
+# (guild ID, user ID)
+MemberKey = typing.Tuple[int, int]
+
+
+class AccessIndex:
+    def __init__(self, default: "AccessLevel", banned: "AccessLevel", ttl: float = 300):
+        self.default = default
+        self.banned = banned
+        self.ttl = ttl
+
+        self._users: typing.Dict[int, "AccessLevel"] = {}
+        self._members: typing.Dict[MemberKey, "AccessLevel"] = {}
+        self.loaded_at: typing.Optional[float] = None
+        self._loading: typing.Optional[asyncio.Task] = None
+        # Changes made while the index is loading, applied once it's loaded
+        self._updates_while_loading: typing.Optional[typing.List[tuple]] = None
+
+        # Statistics
+        self.reloads = 0
+
+    def configure(self, ttl: float):
+        self.ttl = ttl
+
+    @property
+    def loaded(self) -> bool:
+        return self.loaded_at is not None
+
+    async def load(self):
+        """
+        Load every access level that isn't the default one, with one query per table.
+        """
+        # Imported here, since the models keep this index up-to-date
+        from utils.models import DiscordMember, DiscordUser
+
+        self._updates_while_loading = updates = []
+        try:
+            users = await DiscordUser.exclude(access_level_override=self.default).values_list(
+                "discord_id", "access_level_override"
+            )
+            members = await DiscordMember.exclude(access_level=self.default).values_list(
+                "guild_id", "user_id", "access_level"
+            )
+        finally:
+            self._updates_while_loading = None
+
+        self._users = dict(users)
+        self._members = {(guild_id, user_id): access_level for guild_id, user_id, access_level in members}
+        self.loaded_at = time.monotonic()
+        for update in updates:
+            self._apply(*update)
+
+    def _maybe_reload(self):
+        if self._loading is None and time.monotonic() - self.loaded_at > self.ttl:
+            self.reloads += 1
+            self._loading = asyncio.get_running_loop().create_task(self._reload())
+
+    async def _reload(self):
+        try:
+            await self.load()
+        finally:
+            self._loading = None
+
+    def get_access_level(self, user_id: int, guild_id: typing.Optional[int] = None) -> "AccessLevel":
+        """
+        Same as get_from_db(member).get_access_level(), or get_from_db(user).get_access_level() without a guild.
+        """
+        if self.loaded_at is not None:
+            self._maybe_reload()
+
+        override = self._users.get(user_id)
+        if override is not None:
+            return override
+        elif guild_id is None:
+            return self.default
+        return self._members.get((guild_id, user_id), self.default)
+
+    def is_banned(self, user_id: int, guild_id: typing.Optional[int] = None) -> bool:
+        return self.get_access_level(user_id, guild_id) == self.banned
+
+    def banned_users(self) -> typing.Set[int]:
+        return {user_id for user_id, override in self._users.items() if override == self.banned}
+
+    def _apply(self, key: typing.Union[int, MemberKey], access_level: "AccessLevel"):
+        # Users are keyed by their ID, members by (guild ID, user ID)
+        table = self._members if isinstance(key, tuple) else self._users
+        if access_level == self.default:
+            table.pop(key, None)
+        else:
+            table[key] = access_level
+
+    def _update(self, key: typing.Union[int, MemberKey], access_level: "AccessLevel"):
+        if self._updates_while_loading is not None:
+            self._updates_while_loading.append((key, access_level))
+        self._apply(key, access_level)
+
+    def set_user_override(self, user_id: int, access_level: "AccessLevel"):
+        self._update(user_id, access_level)
+
+    def set_member_access_level(self, guild_id: int, user_id: int, access_level: "AccessLevel"):
+        self._update((guild_id, user_id), access_level)
+
+    def __len__(self):
+        return len(self._users) + len(self._members)
@@ -10,15 +10,19 @@ import aiohttp
 import discord
 from discord import Guild
 from discord.ext import commands
-from discord.ext.commands import BucketType, MaxConcurrency
 from discord.ext.commands.bot import AutoShardedBot
 from tortoise import timezone
 
 from utils import config
+from utils.channel_serializer import ChannelBusy, ChannelSerializer
 from utils.ctx_class import MyContext
+from utils.departures import DucksDepartures
 from utils.events import Events
 from utils.logger import FakeLogger
-from utils.models import AccessLevel, DucksLeft, get_from_db, init_db_connection, DiscordUser
+from utils.message_dispatch import MessageDispatch, MessageDispatchCache
+from utils.models import ACCESS_LEVELS, DucksLeft, PLAYERS_WRITE_BUFFER, QUERY_STATS, get_from_db, init_db_connection
+from utils.prefix_index import PrefixIndex
+from utils.translations import CATALOGS
 
 if typing.TYPE_CHECKING:
     # Prevent circular imports
@@ -52,8 +56,14 @@ class MyBot(AutoShardedBot):
         self.ducks_spawned: collections.defaultdict[
             discord.TextChannel, collections.deque["Duck"]
         ] = collections.defaultdict(collections.deque)
+        self.ducks_departures = DucksDepartures()
         self.enabled_channels: typing.Dict[discord.TextChannel, DucksLeft] = {}
-        self.concurrency = MaxConcurrency(number=1, per=BucketType.channel, wait=True)
+        self.commands_serializer = ChannelSerializer(self.config["bot"].get("commands_queue_length", 10))
+        self.prefix_index = PrefixIndex(
+            self.config["bot"]["prefixes"],
+            ttl=self.config["database"].get("prefixes_reload_interval", 300),
+        )
+        self.message_dispatches = MessageDispatchCache()
         self.allow_ducks_spawning = True
 
         self._duckhunt_public_log = None
@@ -86,8 +96,17 @@ class MyBot(AutoShardedBot):
             aiohttp.ClientSession()
         )  # There is no need to call __aenter__, since that does nothing in that case
 
+        CATALOGS.load()
+        self.logger.debug(f"Loaded {len(CATALOGS)} translation catalogs")
+
         if self.config["database"]["enable"]:
             await init_db_connection(self.config["database"])
+            PLAYERS_WRITE_BUFFER.logger = self.logger
+            QUERY_STATS.logger = self.logger
+
+            self.prefix_index.set_mentions(self.user.id)
+            await self.prefix_index.load()
+            await ACCESS_LEVELS.load()
 
         for cog_name in self.config["cogs"]["cogs_to_load"]:
             try:
@@ -115,6 +134,9 @@ class MyBot(AutoShardedBot):
     async def close(self) -> None:
         self.logger.warning("Bot closing request received...")
         await super().close()
+        if PLAYERS_WRITE_BUFFER:
+            self.logger.warning(f"Writing {len(PLAYERS_WRITE_BUFFER)} players with pending changes...")
+        await PLAYERS_WRITE_BUFFER.close()
         await self._client_session.close()
         self.logger.warning("Bot closed. Bye.")
 
@@ -148,6 +170,12 @@ class MyBot(AutoShardedBot):
     async def on_socket_event_type(self, event_type):
         self.socket_stats[event_type] += 1
 
+    def get_message_dispatch(self, message: discord.Message) -> MessageDispatch:
+        """
+        The context, database objects and access level of that message, shared by all the on_message listeners.
+        """
+        return self.message_dispatches.get(self, message)
+
     async def on_message(self, message):
         if not self.is_ready():
             return  # Ignoring messages when not ready
@@ -155,31 +183,40 @@ class MyBot(AutoShardedBot):
         if message.author.bot:
             return  # ignore messages from other bots
 
-        ctx = await self.get_context(message, cls=MyContext)
-        if ctx.prefix is not None:
-            db_user = await get_from_db(ctx.author)
-
-            access = db_user.get_access_level()
-
-            if access != AccessLevel.BANNED:
-                if ctx.command:
-                    callback = ctx.command.callback
-                else:
-                    callback = None
-                if callback:
-                    should_block = getattr(
-                        ctx.command.callback, "block_concurrency", True
-                    )
-                else:
-                    should_block = True
+        dispatch = self.get_message_dispatch(message)
+        if not dispatch.could_be_command():
+            return  # most messages are just chatting
 
-                if should_block:
-                    await self.concurrency.acquire(message)
+        ctx = await dispatch.context()
+        if ctx.prefix is not None:
+            scope_name = f"command {ctx.command.qualified_name}" if ctx.command else "unknown command"
+            with QUERY_STATS.scope(scope_name):
+                await self.process_context(ctx, message)
+
+    async def process_context(self, ctx: MyContext, message: discord.Message):
+        if not self.get_message_dispatch(message).is_banned():
+            if ctx.command:
+                should_block = getattr(
+                    ctx.command.callback, "block_concurrency", True
+                )
+            else:
+                # Nothing to run, invoke will only report the command wasn't found
+                should_block = False
 
+            if not should_block:
                 await self.invoke(ctx)
+                return
 
-                if should_block:
-                    await self.concurrency.release(message)
+            try:
+                async with self.commands_serializer.serialize(message.channel.id):
+                    await self.invoke(ctx)
+            except ChannelBusy as e:
+                _ = await ctx.get_translate_function()
+                ctx.logger.info(f"Refused {ctx.command.qualified_name}, {e.queue_length} commands already waiting")
+                await ctx.reply(
+                    _("⏳ There are too many commands waiting to run in this channel, please try again in a few seconds."),
+                    delete_after=15,
+                )
 
     async def on_command(self, ctx: MyContext):
         db_user = await get_from_db(ctx.author, as_user=True)
@@ -229,8 +266,12 @@ class MyBot(AutoShardedBot):
     async def on_shard_ready(self, shard_id):
         self.shards_ready.add(shard_id)
 
-    async def on_disconnect(self):
-        self.shards_ready = set()
+    async def on_shard_resumed(self, shard_id):
+        self.shards_ready.add(shard_id)
+
+    async def on_shard_disconnect(self, shard_id):
+        # Only the shard that disconnected stops spawning ducks, the others keep going.
+        self.shards_ready.discard(shard_id)
 
     async def on_ready(self):
         messages = [
@@ -249,7 +290,7 @@ class MyBot(AutoShardedBot):
         messages.append(f"{cogs_count} cogs are loaded")
         messages.append("-----------")
 
-        banned_ids = [int(bid) for bid in await DiscordUser.filter(access_level_override=0).values_list('discord_id', flat=True)]
+        banned_ids = ACCESS_LEVELS.banned_users()
         for guild in self.guilds:
             if guild.owner_id in banned_ids:
                 await guild.leave()
@@ -260,7 +301,7 @@ class MyBot(AutoShardedBot):
 
     async def on_guild_join(self, guild):
         self.logger.info(f"Joined guild {guild.name} ({guild.id}), checking for bans...")
-        is_banned = await DiscordUser.filter(access_level_override=0).filter(discord_id=guild.owner_id).exists()
+        is_banned = ACCESS_LEVELS.is_banned(guild.owner_id)
         if is_banned:
             await guild.leave()
             self.logger.info(f"[🍑🕳] Automatically left guild I was invited in {guild.name} ({guild.id}) because the owner is banned.")
@@ -277,8 +318,11 @@ async def get_prefix(bot: MyBot, message: discord.Message):
 
     else:
         if bot.config["database"]["enable"]:
-            db_guild = await get_from_db(message.guild)
+            db_guild = await bot.get_message_dispatch(message).db_guild()
             guild_prefix = db_guild.prefix
+            if guild_prefix != bot.prefix_index.get_guild_prefix(message.guild.id):
+                # Edited from somewhere else
+                bot.prefix_index.set_guild_prefix(message.guild.id, guild_prefix)
             if guild_prefix is not None:
                 forced_prefixes = [guild_prefix] + forced_prefixes
 
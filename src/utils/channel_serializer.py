@@ -0,0 +1,165 @@
+"""
+Commands run one at a time in each channel, in the order they were received.
+
+Every channel running a command has a queue of the commands waiting for their turn. Queues are dropped as soon as they
+are empty, so only the channels that are busy right now use memory. A channel can't have more than `max_queue_length`
+commands waiting: more would only answer long after the ducks they shot at are gone, so they are refused with
+ChannelBusy instead.
+
+    async with bot.commands_serializer.serialize(message.channel.id):
+        await bot.invoke(ctx)
+"""
+import asyncio
+import collections
+import time
+import typing
+
+
+class ChannelBusy(Exception):
+    """Raised when too many commands are already waiting in a channel."""
+
+    def __init__(self, channel_id: int, queue_length: int):
+        self.channel_id = channel_id
+        self.queue_length = queue_length
+
+
+class _ChannelQueue:
+    __slots__ = ("running", "waiters", "running_since")
+
+    def __init__(self):
+        self.running = False
+        self.running_since = 0.0
+        # Futures of the commands waiting for their turn, in order
+        self.waiters: typing.Deque[asyncio.Future] = collections.deque()
+
+
+class ChannelStats:
+    __slots__ = ("commands", "waited", "wait_time", "max_wait_time", "refused")
+
+    def __init__(self):
+        self.commands = 0
+        self.waited = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+        self.refused = 0
+
+    @property
+    def average_wait_time(self) -> float:
+        return self.wait_time / self.waited if self.waited else 0
+
+
+class _SerializerGuard:
+    __slots__ = ("serializer", "channel_id", "queue")
+
+    def __init__(self, serializer: "ChannelSerializer", channel_id: int):
+        self.serializer = serializer
+        self.channel_id = channel_id
+        self.queue: typing.Optional[_ChannelQueue] = None
+
+    async def __aenter__(self):
+        self.queue = await self.serializer._acquire(self.channel_id)
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.serializer._release(self.channel_id, self.queue)
+
+
+class ChannelSerializer:
+    def __init__(self, max_queue_length: int = 10, max_tracked_channels: int = 1000):
+        self.max_queue_length = max_queue_length
+        self._queues: typing.Dict[int, _ChannelQueue] = {}
+
+        # Statistics of the most recently used channels
+        self.max_tracked_channels = max_tracked_channels
+        self._stats: "collections.OrderedDict[int, ChannelStats]" = collections.OrderedDict()
+        self.total = ChannelStats()
+        self.peak = 0
+
+    def __len__(self):
+        return len(self._queues)
+
+    def configure(self, max_queue_length: int):
+        self.max_queue_length = max_queue_length
+
+    def serialize(self, channel_id: int) -> _SerializerGuard:
+        return _SerializerGuard(self, channel_id)
+
+    def _channel_stats(self, channel_id: int) -> ChannelStats:
+        stats = self._stats.get(channel_id)
+        if stats is None:
+            stats = self._stats[channel_id] = ChannelStats()
+            if len(self._stats) > self.max_tracked_channels:
+                self._stats.popitem(last=False)
+        else:
+            self._stats.move_to_end(channel_id)
+        return stats
+
+    async def _acquire(self, channel_id: int) -> _ChannelQueue:
+        stats = self._channel_stats(channel_id)
+        queue = self._queues.get(channel_id)
+        if queue is None:
+            queue = self._queues[channel_id] = _ChannelQueue()
+            self.peak = max(self.peak, len(self._queues))
+
+        if not queue.running:
+            # Fast path: nothing to wait for
+            queue.running = True
+            queue.running_since = time.monotonic()
+            stats.commands += 1
+            self.total.commands += 1
+            return queue
+
+        if len(queue.waiters) >= self.max_queue_length:
+            stats.refused += 1
+            self.total.refused += 1
+            raise ChannelBusy(channel_id, len(queue.waiters))
+
+        waiter = asyncio.get_running_loop().create_future()
+        queue.waiters.append(waiter)
+        started_at = time.monotonic()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Our turn came, but we were cancelled before we could use it: let the next one in
+                self._release(channel_id, queue)
+            else:
+                queue.waiters.remove(waiter)
+            raise
+
+        waited = time.monotonic() - started_at
+        for channel_stats in (stats, self.total):
+            channel_stats.commands += 1
+            channel_stats.waited += 1
+            channel_stats.wait_time += waited
+            channel_stats.max_wait_time = max(channel_stats.max_wait_time, waited)
+        return queue
+
+    def _release(self, channel_id: int, queue: _ChannelQueue):
+        while queue.waiters:
+            waiter = queue.waiters.popleft()
+            if not waiter.done():
+                # Handed over directly, so that nobody can jump the queue
+                waiter.set_result(None)
+                queue.running_since = time.monotonic()
+                return
+
+        queue.running = False
+        if self._queues.get(channel_id) is queue:
+            del self._queues[channel_id]
+
+    def busiest(self, count: int = 5) -> typing.List[typing.Tuple[int, int, float]]:
+        """
+        Return the channels with the most commands waiting right now, as (channel ID, waiting, seconds running).
+        """
+        now = time.monotonic()
+        busy = [
+            (channel_id, len(queue.waiters), now - queue.running_since) for channel_id, queue in self._queues.items()
+        ]
+        busy.sort(key=lambda item: item[1], reverse=True)
+        return busy[:count]
+
+    def slowest(self, count: int = 5) -> typing.List[typing.Tuple[int, ChannelStats]]:
+        """
+        Return the recently used channels where commands waited the longest in total.
+        """
+        return sorted(self._stats.items(), key=lambda item: item[1].wait_time, reverse=True)[:count]
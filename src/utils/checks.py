@@ -1,7 +1,7 @@
 from discord.ext import commands
 
 from utils.ctx_class import MyContext
-from utils.models import AccessLevel, get_from_db
+from utils.models import ACCESS_LEVELS, AccessLevel, get_from_db
 
 
 class NotInServer(commands.CheckFailure):
@@ -51,13 +51,11 @@ def is_in_server(must_be_in_guild_id):
 
 
 def needs_access_level(required_access):
-    async def predicate(ctx: MyContext):
+    def predicate(ctx: MyContext):
         if not ctx.guild:
             raise commands.NoPrivateMessage()
         else:
-            db_user = await get_from_db(ctx.author)
-
-            access = db_user.get_access_level()
+            access = ACCESS_LEVELS.get_access_level(ctx.author.id, ctx.guild.id)
             if access >= required_access:
                 return True
             elif access >= AccessLevel.BANNED and required_access <= AccessLevel.ADMIN:
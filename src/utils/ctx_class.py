@@ -13,6 +13,7 @@ from utils.models import get_from_db
 from utils.translations import (
     get_ntranslate_function,
     get_translate_function,
+    normalize_language_code,
     ntranslate,
     translate,
 )
@@ -215,12 +216,7 @@ class MyContext(commands.Context):
             db_user = await get_from_db(self.author, as_user=True)
             language = db_user.language
 
-        if language == "zh-Hans":
-            return "zh"  # Babel don't know about Simplified Chinese
-        else:
-            language = language.replace("-", "_")
-
-        return language
+        return normalize_language_code(language)
 
     async def translate(self, message):
         language_code = await self.get_language_code()
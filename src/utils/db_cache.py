@@ -0,0 +1,179 @@
+import collections
+import sys
+import time
+import typing
+import weakref
+
+from tortoise.models import Model
+
+CacheKey = typing.Tuple[typing.Any, ...]
+
+
+class ModelCache:
+    """
+    An in-process cache of database objects, keyed by object type and Discord IDs.
+
+    Two layers are used:
+
+    - An identity map, holding weak references to every cached object that is still in use somewhere. It guarantees
+      that a row is only ever represented by a single instance (for example, DucksLeft.db_channel is the same object
+      the settings commands edit), even after that object was evicted from the LRU.
+    - A bounded LRU, holding strong references to the recently used objects for `ttl` seconds, so they stay in memory
+      between uses. Its size is bounded by an estimation of the memory used by the objects.
+
+    Objects past their TTL are refreshed from the database (in place, to keep sharing them) instead of being returned.
+    """
+
+    def __init__(self, ttl: float = 300, max_memory: int = 64 * 1024 * 1024):
+        self.ttl = ttl
+        self.max_memory = max_memory
+
+        self._identity: "weakref.WeakValueDictionary[CacheKey, Model]" = weakref.WeakValueDictionary()
+        # key -> (expires at, estimated size)
+        self._lru: "collections.OrderedDict[CacheKey, typing.Tuple[float, int]]" = collections.OrderedDict()
+        self._lru_objects: typing.Dict[CacheKey, Model] = {}
+        self._sizes: typing.Dict[type, int] = {}
+        self.memory = 0
+
+        # Statistics
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def configure(self, ttl: float, max_memory: int):
+        self.ttl = ttl
+        self.max_memory = max_memory
+        self._evict()
+
+    def __len__(self):
+        return len(self._lru)
+
+    def _estimate_size(self, obj: Model) -> int:
+        # Measured once per model: the fields are the same, so the size doesn't change much from row to row.
+        size = self._sizes.get(type(obj))
+        if size is None:
+            size = sys.getsizeof(obj) + sys.getsizeof(obj.__dict__)
+            size += sum(sys.getsizeof(value) for value in obj.__dict__.values())
+            self._sizes[type(obj)] = size
+        return size
+
+    def _evict(self):
+        while self.memory > self.max_memory and self._lru:
+            key, (_, size) = self._lru.popitem(last=False)
+            del self._lru_objects[key]
+            self.memory -= size
+            self.evictions += 1
+
+    def _touch(self, key: CacheKey, obj: Model):
+        old = self._lru.pop(key, None)
+        if old:
+            self.memory -= old[1]
+
+        size = self._estimate_size(obj)
+        self._lru[key] = (time.monotonic() + self.ttl, size)
+        self._lru_objects[key] = obj
+        self.memory += size
+        self._evict()
+
+    def get(self, key: CacheKey) -> typing.Tuple[typing.Optional[Model], bool]:
+        """
+        Return the object cached for that key (or None), and whether it is still fresh.
+        Stale objects should be refreshed from the database then passed to put().
+        """
+        obj = self._identity.get(key)
+        if obj is None:
+            self.misses += 1
+            return None, False
+
+        entry = self._lru.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            self.refreshes += 1
+            return obj, False
+
+        self.hits += 1
+        self._lru.move_to_end(key)
+        return obj, True
+
+    def peek(self, key: CacheKey) -> typing.Optional[Model]:
+        """
+        Return the object cached for that key if it is still fresh, without counting it in the statistics.
+        """
+        entry = self._lru.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return self._lru_objects[key]
+
+    def in_use(self, key: CacheKey) -> typing.Optional[Model]:
+        """
+        Return the instance used for that key, even if it isn't fresh, without counting it in the statistics.
+        """
+        return self._identity.get(key)
+
+    def put(self, key: CacheKey, obj: Model):
+        self._identity[key] = obj
+        self._touch(key, obj)
+
+    def share(self, key: CacheKey, obj: Model) -> Model:
+        """
+        Cache an object freshly loaded from the database, and return the instance that should be used for it: the
+        existing one (updated with the loaded values) if that row is already in use somewhere.
+        """
+        cached = self._identity.get(key)
+        if cached is None or cached is obj:
+            self.put(key, obj)
+            return obj
+
+        self.merge(cached, obj)
+        self._touch(key, cached)
+        return cached
+
+    def saved(self, key: CacheKey, obj: Model, update_fields: typing.Optional[typing.Iterable[str]] = None):
+        """
+        Write-through: called after an object was saved.
+        """
+        cached = self._identity.get(key)
+        if cached is None:
+            # Only objects loaded by get_from_db are cached, with their relations set.
+            return
+        elif cached is obj:
+            self.put(key, obj)
+        else:
+            # Another instance of the same row was saved (for example, loaded with .only()). Copy what was written.
+            self.merge(cached, obj, update_fields)
+            self._touch(key, cached)
+
+    @staticmethod
+    def merge(cached: Model, obj: Model, update_fields: typing.Optional[typing.Iterable[str]] = None):
+        if update_fields is None:
+            if obj._partial:
+                update_fields = obj._meta.db_fields & set(obj.__dict__.keys())
+            else:
+                update_fields = obj._meta.db_fields
+
+        for field_name in update_fields:
+            field_name = obj._meta.fields_db_projection_reverse.get(field_name, field_name)
+            setattr(cached, field_name, getattr(obj, field_name))
+
+    def invalidate(self, key: CacheKey):
+        """
+        Forget an object, for instance after its row was updated without going through the instance.
+        """
+        self.invalidations += 1
+        self._identity.pop(key, None)
+        entry = self._lru.pop(key, None)
+        if entry:
+            del self._lru_objects[key]
+            self.memory -= entry[1]
+
+    def clear(self):
+        self._identity = weakref.WeakValueDictionary()
+        self._lru.clear()
+        self._lru_objects.clear()
+        self.memory = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses + self.refreshes
+        return self.hits / total if total else 0
@@ -0,0 +1,56 @@
+import heapq
+import itertools
+import typing
+
+if typing.TYPE_CHECKING:
+    # Prevent circular imports
+    from utils.ducks import Duck
+
+
+class DucksDepartures:
+    """
+    A min-heap of the ducks currently spawned, keyed by the time they should leave at (spawned_at + time to live).
+
+    Each shard loop iteration only pops the ducks of that shard that are due, oldest first, instead of checking every
+    channel queue. A duck is only in the index once: rescheduling or despawning it makes its previous heap entries
+    stale, and those are skipped when popped.
+    """
+
+    def __init__(self):
+        self._heaps: typing.Dict[int, typing.List[typing.Tuple[float, int, "Duck"]]] = {}
+        self._counter = itertools.count()
+        self._leave_at: typing.Dict["Duck", float] = {}
+
+    def __len__(self):
+        return len(self._leave_at)
+
+    def schedule(self, duck: "Duck", leave_at: float, shard_id: int):
+        self._leave_at[duck] = leave_at
+        heapq.heappush(self._heaps.setdefault(shard_id, []), (leave_at, next(self._counter), duck))
+
+    def schedule_many(self, departures: typing.Iterable[typing.Tuple["Duck", float]], shard_id: int):
+        """
+        Schedule a lot of ducks at once, for instance when they are restored: the heap is built again once, instead of
+        pushing every duck.
+        """
+        heap = self._heaps.setdefault(shard_id, [])
+        for duck, leave_at in departures:
+            self._leave_at[duck] = leave_at
+            heap.append((leave_at, next(self._counter), duck))
+        heapq.heapify(heap)
+
+    def discard(self, duck: "Duck"):
+        self._leave_at.pop(duck, None)
+
+    def clear(self):
+        self._heaps = {}
+        self._leave_at = {}
+
+    def pop_due(self, now: float, shard_id: int) -> typing.Optional["Duck"]:
+        heap = self._heaps.get(shard_id)
+        while heap and heap[0][0] <= now:
+            leave_at, _, duck = heapq.heappop(heap)
+            if self._leave_at.get(duck) == leave_at:
+                del self._leave_at[duck]
+                return duck
+        return None
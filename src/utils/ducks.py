@@ -19,7 +19,7 @@ from utils.coats import Coats
 from utils.events import Events
 from utils.interaction import anti_bot_zero_width, get_webhook_if_possible
 from utils.models import DiscordChannel, Player, SunState, get_from_db, get_player
-from utils.translations import ntranslate, translate
+from utils.translations import CATALOGS
 
 SECOND = 1
 MINUTE = 60 * SECOND
@@ -55,17 +55,20 @@ class Duck:
 
     prestige_experience_chance = None
 
-    def __init__(self, bot: MyBot, channel: discord.TextChannel, decoy=False):
+    def __init__(self, bot: MyBot, channel: discord.TextChannel, decoy=False, webhook_parameters: dict = None):
         self.bot = bot
         self.channel = channel
         self.decoy = decoy
 
         self._db_channel: Optional[DiscordChannel] = None
 
-        self._webhook_parameters = {
-            "avatar_url": random.choice(self.get_cosmetics()["avatar_urls"]),
-            "username": random.choice(self.get_cosmetics()["usernames"]),
-        }
+        if webhook_parameters is None:
+            cosmetics = self.get_cosmetics()
+            webhook_parameters = {
+                "avatar_url": random.choice(cosmetics["avatar_urls"]),
+                "username": random.choice(cosmetics["usernames"]),
+            }
+        self._webhook_parameters = webhook_parameters
 
         self.spawned_at: Optional[int] = None
         self.target_lock = asyncio.Lock()
@@ -89,13 +92,11 @@ class Duck:
         }
 
     @classmethod
-    def deserialize(cls, bot: MyBot, channel: discord.TextChannel, data: dict):
-        d = cls(bot, channel)
+    def deserialize(cls, bot: MyBot, channel: discord.TextChannel, data: dict, **kwargs):
+        d = cls(bot, channel, decoy=data["decoy"], webhook_parameters=data["webhook_parameters"], **kwargs)
         d.spawned_at = time.time() - data["spawned_for"]
         d.lives_left = data["lives_left"]
         d._lives = data["lives"]
-        d._webhook_parameters = data["webhook_parameters"]
-        d.decoy = data["decoy"]
 
         return d
 
@@ -117,10 +118,10 @@ class Duck:
     async def get_translate_function(self):
         if not self._translate_function:
             db_guild = await get_from_db(self.channel.guild)
-            language = db_guild.language
+            gettext = CATALOGS.get(db_guild.language).gettext
 
             def _(message, **kwargs):
-                return translate(message, language).format(**kwargs)
+                return gettext(message).format(**kwargs)
 
             self._translate_function = _
 
@@ -129,10 +130,10 @@ class Duck:
     async def get_ntranslate_function(self):
         if not self._ntranslate_function:
             db_guild = await get_from_db(self.channel.guild)
-            language = db_guild.language
+            catalog = CATALOGS.get(db_guild.language)
 
             def ngettext(singular, plurial, n, **kwargs):
-                return ntranslate(singular, plurial, n, language).format(**kwargs)
+                return catalog.ngettext(singular, plurial, n).format(**kwargs)
 
             self._ntranslate_function = ngettext
 
@@ -577,6 +578,7 @@ class Duck:
             await self.send(message)
 
         bot.ducks_spawned[self.channel].append(self)
+        await self.schedule_departure()
 
     async def shoot(self, args) -> Optional[bool]:
         if await self.will_frighten():
@@ -619,13 +621,17 @@ class Duck:
         await self.send(await self.get_left_message())
         self.despawn()
 
-    async def maybe_leave(self):
+    async def schedule_departure(self, db_channel: Optional[DiscordChannel] = None):
+        """
+        (Re)schedule the time the duck will leave at, for instance when the channel time to live changed.
+        """
+        if db_channel:
+            self._db_channel = db_channel
+
         db_channel = await self.get_db_channel()
-        if db_channel.ducks_time_to_live < self.spawned_for:
-            await self.leave()
-            return True
-        else:
-            return False
+        self.bot.ducks_departures.schedule(
+            self, self.spawned_at + db_channel.ducks_time_to_live, self.channel.guild.shard_id
+        )
 
     async def maybe_bushes_message(
             self, hunter, db_hunter
@@ -750,6 +756,7 @@ class Duck:
     # Utilities #
 
     def despawn(self):
+        self.bot.ducks_departures.discard(self)
         try:
             self.bot.ducks_spawned[self.channel].remove(self)
         except ValueError:
@@ -812,6 +819,7 @@ class GhostDuck(Duck):
         bot.ducks_spawned[self.channel].append(self)
 
         self.spawned_at = time.time()
+        await self.schedule_departure()
 
 
 class PrDuck(Duck):
@@ -821,23 +829,32 @@ class PrDuck(Duck):
 
     category = _("prof")
 
-    def __init__(self, bot: MyBot, channel: discord.TextChannel, *args, **kwargs):
+    def __init__(
+        self, bot: MyBot, channel: discord.TextChannel, *args, operation: str = None, answer: int = None, **kwargs
+    ):
         super().__init__(bot, channel, *args, **kwargs)
         self.anger_level = 0
+        if operation is None:
+            operation, answer = self.roll_question()
+        self.operation = operation
+        self.answer = answer
+
+    @staticmethod
+    def roll_question() -> typing.Tuple[str, int]:
         op = random.choices(["+", "*", "/", "-"], weights=[100, 15, 25, 20])[0]
 
         if op == "+":
             r1 = random.randint(PRADD_MIN, PRADD_MAX)
             r2 = random.randint(PRADD_MIN, PRADD_MAX)
-            self.answer = r1 + r2
+            answer = r1 + r2
         elif op == "*":
             r1 = random.randint(PRMUL_MIN, PRMUL_MAX)
             r2 = random.randint(PRMUL_MIN, PRMUL_MAX)
-            self.answer = r1 * r2
+            answer = r1 * r2
         elif op == "/":
             r2 = random.randint(PRDIV_MIN, PRDIV_MAX)
             r1 = random.randint(PRDIV_MIN, PRDIV_MAX) * r2  # Trick it so that you can always divide properly and makes it very easy too
-            self.answer = int(r1 / r2)
+            answer = int(r1 / r2)
         else:
             r1 = random.randint(PRSUB_MIN, PRSUB_MAX)
             r2 = random.randint(PRSUB_MIN, PRSUB_MAX)
@@ -846,9 +863,9 @@ class PrDuck(Duck):
                 # Lower the chance of negative results
                 r1 = random.randint(PRSUB_MIN + r1, PRSUB_MAX + (PRSUB_MAX // 3))
 
-            self.answer = r1 - r2
+            answer = r1 - r2
 
-        self.operation = f"{r1} {op} {r2}"
+        return f"{r1} {op} {r2}", answer
 
     def serialize(self):
         return {
@@ -860,9 +877,7 @@ class PrDuck(Duck):
 
     @classmethod
     def deserialize(cls, bot: MyBot, channel: discord.TextChannel, data: dict):
-        d = super().deserialize(bot, channel, data)
-        d.operation = data["operation"]
-        d.answer = data["answer"]
+        d = super().deserialize(bot, channel, data, operation=data["operation"], answer=data["answer"])
         d.anger_level = data.get("anger", 0)
         return d
 
@@ -1866,11 +1881,11 @@ async def get_random_weighted_duck(
         sun: SunState = None,
         decoy: bool = False,
 ):
-    if sun is None:
-        sun, duration_of_night, time_left_sun = await compute_sun_state(channel)
-
     db_channel = db_channel or await get_from_db(channel)
 
+    if sun is None:
+        sun, duration_of_night, time_left_sun = await compute_sun_state(channel, db_channel=db_channel)
+
     if sun == SunState.DAY:
         weights = [
             getattr(db_channel, f"spawn_weight_{category}_ducks", 0)
@@ -1899,54 +1914,35 @@ def deserialize_duck(bot: MyBot, channel: discord.TextChannel, data: dict):
     return DUCKS_CATEGORIES_TO_CLASSES[data["category"]].deserialize(bot, channel, data)
 
 
-async def compute_sun_state(channel, seconds_spent_today=None):
+def restore_channel_ducks(
+    bot: MyBot, channel: discord.TextChannel, db_channel: DiscordChannel, serialized: typing.List[dict]
+) -> typing.List[typing.Tuple[Duck, float]]:
+    """
+    Put back the ducks of a channel restored from a snapshot, without sending anything. Their departures aren't
+    scheduled: they are returned with the time they leave at, to be scheduled all at once with
+    DucksDepartures.schedule_many.
+    """
+    ducks = [deserialize_duck(bot, channel, data) for data in serialized]
+    bot.ducks_spawned[channel].extend(ducks)
+
+    time_to_live = db_channel.ducks_time_to_live
+    departures = []
+    for duck in ducks:
+        duck._db_channel = db_channel
+        departures.append((duck, duck.spawned_at + time_to_live))
+    return departures
+
+
+async def compute_sun_state(channel, seconds_spent_today=None, db_channel: Optional[DiscordChannel] = None):
     if seconds_spent_today is None:
         now = int(time.time())
         first_second = now - now % DAY
         seconds_spent_today = now - first_second
 
-    db_channel = await get_from_db(channel)
-    night_start_at = db_channel.night_start_at
-    night_end_at = db_channel.night_end_at
-
-    if night_start_at == night_end_at:
-        # Fastpath: No night defined
-        sun = SunState.DAY
-        duration_of_night = 0
-        time_left_sun = DAY
-    elif night_start_at <= seconds_spent_today <= night_end_at:
-        # Case where night is from small to big
-        # Ex : 0          <= 30                  <= 60
-        sun = SunState.NIGHT
-        duration_of_night = night_end_at - night_start_at
-        time_left_sun = night_end_at - seconds_spent_today
-    elif night_end_at <= night_start_at <= seconds_spent_today:
-        # Case where the nights rolls over the next day
-        # Ex : 25         <= 30                  <= 2
-        sun = SunState.NIGHT
-        duration_of_night = DAY - night_start_at + night_end_at
-        time_left_sun = DAY - seconds_spent_today + night_end_at
-    elif night_start_at >= night_end_at >= seconds_spent_today:
-        # Case where the night rolls over the previous day
-        # Ex : 25         <= 1                   <= 2
-        sun = SunState.NIGHT
-        duration_of_night = DAY - night_start_at + night_end_at
-        time_left_sun = night_end_at - seconds_spent_today
-    else:
-        sun = SunState.DAY
-        if night_start_at <= night_end_at:
-            duration_of_night = night_end_at - night_start_at
-            if seconds_spent_today <= night_start_at:
-                time_left_sun = night_start_at - seconds_spent_today
-            else:
-                time_left_sun = DAY - seconds_spent_today + night_start_at
-
-        else:  # night_end_at <= night_start_at:
-            duration_of_night = DAY - night_start_at + night_end_at
-
-            time_left_sun = night_start_at - seconds_spent_today
+    if db_channel is None:
+        db_channel = await get_from_db(channel)
 
-    return sun, duration_of_night, time_left_sun
+    return db_channel.sun_table.sun_state(seconds_spent_today)
 
 
 del _
@@ -0,0 +1,124 @@
+"""
+Channel leaderboards, read a page at a time.
+
+The order of the players comes from LEADERBOARDS, the in-memory rankings of the recently used channels. A channel is
+loaded with a single query, reading the players_channel_experience index, the first time its leaderboard is needed.
+Pages are then slices of the ranking, starting after the (experience, player ID) of the last row of the previous page.
+
+Loading a large channel takes a while, so it's done in the background: until the ranking is loaded, pages are fetched
+with keyset queries and ranks counted on the same index, both only reading the rows they need.
+"""
+import typing
+
+from tortoise.expressions import Q
+
+from utils.models import LEADERBOARDS, DiscordMember, Player
+from utils.rank_index import ChannelRanking, LeaderboardCursor, LeaderboardRow
+
+__all__ = [
+    "LeaderboardCursor",
+    "LeaderboardRow",
+    "get_channel_ranking",
+    "get_leaderboard_page",
+    "get_leaderboard_players",
+    "get_player_rank",
+]
+
+
+async def _load_rows(channel_id: int) -> typing.List[LeaderboardRow]:
+    rows = await (
+        Player.filter(channel_id=channel_id)
+        .order_by("-experience", "-id")
+        .values_list(
+            "id",
+            "experience",
+            "member__user__discord_id",
+            "member__user__name",
+            "member__user__discriminator",
+        )
+    )
+    return [LeaderboardRow(*row) for row in rows]
+
+
+async def get_channel_ranking(channel_id: int) -> ChannelRanking:
+    return await LEADERBOARDS.load(channel_id, _load_rows)
+
+
+async def _query_page(
+    channel_id: int, after: typing.Optional[LeaderboardCursor], limit: int
+) -> typing.List[LeaderboardRow]:
+    queryset = Player.filter(channel_id=channel_id)
+    if after is not None:
+        experience, player_id = after
+        queryset = queryset.filter(Q(experience__lt=experience) | Q(experience=experience, id__lt=player_id))
+
+    rows = await (
+        queryset.order_by("-experience", "-id")
+        .limit(limit)
+        .values_list(
+            "id",
+            "experience",
+            "member__user__discord_id",
+            "member__user__name",
+            "member__user__discriminator",
+        )
+    )
+    return [LeaderboardRow(*row) for row in rows]
+
+
+async def get_leaderboard_page(
+    channel_id: int, after: typing.Optional[LeaderboardCursor] = None, limit: typing.Optional[int] = 10
+) -> typing.List[LeaderboardRow]:
+    if limit is None:
+        # The whole leaderboard: as much as loading the ranking
+        ranking = await get_channel_ranking(channel_id)
+    else:
+        ranking = LEADERBOARDS.get_or_start_loading(channel_id, _load_rows)
+        if ranking is None:
+            return await _query_page(channel_id, after, limit)
+
+    return ranking.page(after, limit)
+
+
+async def get_player_rank(player: Player) -> int:
+    ranking = LEADERBOARDS.get_or_start_loading(player.channel_id, _load_rows)
+    if ranking is None:
+        ahead = await Player.filter(
+            Q(experience__gt=player.experience) | Q(experience=player.experience, id__gt=player.id),
+            channel_id=player.channel_id,
+        ).count()
+        return ahead + 1
+
+    return ranking.rank(player.id, player.experience)
+
+
+async def get_leaderboard_players(
+    channel_id: int,
+    fields: typing.Iterable[str],
+    after: typing.Optional[LeaderboardCursor] = None,
+    limit: int = 10,
+) -> typing.List[Player]:
+    """
+    A page of the players of a channel in the leaderboard order, with only `fields` loaded, and their member and user.
+    """
+    page = await get_leaderboard_page(channel_id, after, limit)
+    players = {
+        player.id: player
+        for player in await Player.filter(id__in=[row.player_id for row in page]).only(
+            "id", "experience", "channel_id", "member_id", *fields
+        )
+    }
+    members = {
+        db_member.id: db_member
+        for db_member in await DiscordMember.filter(
+            id__in={player.member_id for player in players.values()}
+        ).select_related("user")
+    }
+
+    ret = []
+    for row in page:
+        player = players.get(row.player_id)
+        if player is not None:
+            player.member = members[player.member_id]
+            ret.append(player)
+    return ret
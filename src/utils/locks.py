@@ -0,0 +1,108 @@
+import asyncio
+import time
+import typing
+
+LockKey = typing.Tuple[typing.Hashable, ...]
+
+
+class _LockEntry:
+    __slots__ = ("lock", "users")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        # Tasks holding or waiting on the lock. The entry is dropped from the table when it reaches zero.
+        self.users = 0
+
+
+class _LockGuard:
+    __slots__ = ("table", "key", "entry")
+
+    def __init__(self, table: "LockTable", key: LockKey):
+        self.table = table
+        self.key = key
+        self.entry: typing.Optional[_LockEntry] = None
+
+    async def __aenter__(self):
+        self.entry = await self.table._acquire(self.key)
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.table._release(self.key, self.entry)
+
+
+class LockTable:
+    """
+    A table of asyncio locks, created on demand for a key, and dropped as soon as nobody holds or waits on them.
+
+    Keys should be made of stable values such as Discord IDs, never of discord.py objects or model instances: those
+    would be kept alive for as long as the lock exists.
+
+        async with DB_LOCKS.lock("player", member.id, channel.id):
+            ...
+    """
+
+    def __init__(self):
+        self._locks: typing.Dict[LockKey, _LockEntry] = {}
+
+        # Statistics
+        self.peak = 0
+        self.acquisitions = 0
+        self.contended = 0
+        self.wait_time = 0.0
+        self.max_waiters = 0
+
+    def __len__(self):
+        return len(self._locks)
+
+    def lock(self, *key: typing.Hashable) -> _LockGuard:
+        return _LockGuard(self, key)
+
+    async def _acquire(self, key: LockKey) -> _LockEntry:
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = _LockEntry()
+            self.peak = max(self.peak, len(self._locks))
+
+        entry.users += 1
+        self.acquisitions += 1
+
+        if entry.lock.locked():
+            self.contended += 1
+            self.max_waiters = max(self.max_waiters, entry.users - 1)
+            started_at = time.perf_counter()
+        else:
+            # asyncio.Lock.acquire doesn't yield when the lock is free, unless it was just handed off to a waiter that
+            # didn't run yet. It can be cancelled then too.
+            started_at = None
+
+        try:
+            await entry.lock.acquire()
+        except BaseException:
+            # Cancelled while waiting
+            self._forget(key, entry)
+            raise
+        finally:
+            if started_at is not None:
+                self.wait_time += time.perf_counter() - started_at
+
+        return entry
+
+    def _release(self, key: LockKey, entry: _LockEntry):
+        entry.lock.release()
+        self._forget(key, entry)
+
+    def _forget(self, key: LockKey, entry: _LockEntry):
+        entry.users -= 1
+        if entry.users == 0 and self._locks.get(key) is entry:
+            del self._locks[key]
+
+    def most_contended(self, count: int = 5) -> typing.List[typing.Tuple[LockKey, int]]:
+        """
+        Return the keys with the most tasks waiting on them right now, with the number of waiters.
+        """
+        contended = [(key, entry.users - 1) for key, entry in self._locks.items() if entry.users > 1]
+        contended.sort(key=lambda item: item[1], reverse=True)
+        return contended[:count]
+
+    @property
+    def contention_rate(self) -> float:
+        return self.contended / self.acquisitions if self.acquisitions else 0
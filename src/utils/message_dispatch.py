@@ -0,0 +1,133 @@
+"""
+What the on_message listeners need to know about a message, computed once for all of them.
+
+A single message is dispatched to MyBot.on_message and to the on_message listener of every cog, that all run at the
+same time. Each of them used to parse the message again with bot.get_context, and look up the guild, channel and author
+in the database. They now share the MessageDispatch of that message: every value is computed by the first listener
+asking for it, while the others wait for the same result.
+"""
+import asyncio
+import collections
+import typing
+
+import discord
+
+from utils.ctx_class import MyContext
+from utils.models import ACCESS_LEVELS, AccessLevel, DiscordChannel, DiscordGuild, get_from_db
+
+if typing.TYPE_CHECKING:
+    # Prevent circular imports
+    from utils.bot_class import MyBot
+
+
+class MessageDispatch:
+    __slots__ = ("bot", "message", "_could_be_command", "_results")
+
+    def __init__(self, bot: "MyBot", message: discord.Message):
+        self.bot = bot
+        self.message = message
+        self._could_be_command: typing.Optional[bool] = None
+        self._results: typing.Dict[str, asyncio.Future] = {}
+
+    async def _once(self, name: str, factory: typing.Callable[[], typing.Awaitable]):
+        while True:
+            future = self._results.get(name)
+            if future is None:
+                break
+            elif future.done() and not future.cancelled():
+                return future.result()
+
+            try:
+                # Shielded, so that the other listeners waiting on it don't see our cancellation
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # The listener computing it was cancelled, try again
+
+        # Computed by the first listener asking for it, without the cost of a task: the others wait on that future
+        future = self._results[name] = asyncio.get_running_loop().create_future()
+        try:
+            result = await factory()
+        except BaseException as e:
+            del self._results[name]
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                # Retrieved, even if no other listener is waiting
+                future.exception()
+            raise
+
+        future.set_result(result)
+        return result
+
+    def could_be_command(self) -> bool:
+        """
+        False if that message doesn't start with any of the prefixes, and is just chatting.
+        """
+        if self._could_be_command is None:
+            self._could_be_command = self.bot.prefix_index.could_be_command(self.message)
+        return self._could_be_command
+
+    async def context(self) -> MyContext:
+        return await self._once("context", lambda: self.bot.get_context(self.message, cls=MyContext))
+
+    async def is_command(self) -> bool:
+        """
+        True if that message invokes a command, so that the listeners can leave it to MyBot.on_message.
+        """
+        return self.could_be_command() and (await self.context()).valid
+
+    async def db_guild(self) -> typing.Optional[DiscordGuild]:
+        if self.message.guild is None:
+            return None
+        return await self._once("db_guild", lambda: get_from_db(self.message.guild))
+
+    async def db_channel(self) -> typing.Optional[DiscordChannel]:
+        """
+        The channel of that message, or the parent channel of its thread. None in DMs.
+        """
+        if self.message.guild is None:
+            return None
+        return await self._once("db_channel", lambda: get_from_db(self.message.channel))
+
+    def access_level(self) -> AccessLevel:
+        """
+        The access level of the author, on the guild of that message if there is one.
+        """
+        guild = self.message.guild
+        return ACCESS_LEVELS.get_access_level(self.message.author.id, guild.id if guild else None)
+
+    def is_banned(self) -> bool:
+        return self.access_level() == AccessLevel.BANNED
+
+
+class MessageDispatchCache:
+    """
+    The MessageDispatch of the most recent messages. The listeners of a message all run right after it's received, so
+    there is no need to keep many.
+    """
+
+    def __init__(self, max_messages: int = 1000):
+        self.max_messages = max_messages
+        self._dispatches: "collections.OrderedDict[int, MessageDispatch]" = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._dispatches)
+
+    def get(self, bot: "MyBot", message: discord.Message) -> MessageDispatch:
+        dispatch = self._dispatches.get(message.id)
+        # Messages have slots, so that's the closest we can get to storing it on the message itself
+        if dispatch is not None and dispatch.message is message:
+            return dispatch
+
+        if dispatch is not None:
+            self._dispatches.move_to_end(message.id)
+        dispatch = self._dispatches[message.id] = MessageDispatch(bot, message)
+        if len(self._dispatches) > self.max_messages:
+            self._dispatches.popitem(last=False)
+        return dispatch
+
+    def clear(self):
+        self._dispatches.clear()
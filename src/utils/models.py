@@ -1,6 +1,8 @@
 import asyncio
+import bisect
 import collections
 import datetime
+import functools
 import random
 import string
 import time
@@ -11,20 +13,59 @@ import babel.lists
 import discord
 from discord.ext import commands
 from tortoise import Tortoise, fields, timezone
+from tortoise.exceptions import FieldError
+from tortoise.expressions import Case, Expression, F, RawSQL, ResolveContext, ResolveResult, When
+from tortoise.indexes import Index, PartialIndex
 from tortoise.models import Model
+from tortoise.transactions import in_transaction
 
+from utils.access_index import AccessIndex
 from utils.coats import Coats
-from utils.levels import get_level_info
+from utils.db_cache import CacheKey, ModelCache
+from utils.levels import LEVELS, get_level_info
+from utils.locks import LockTable
+from utils.query_stats import QueryStats
+from utils.rank_index import RankIndex
 from utils.translations import translate
-
-DB_LOCKS = collections.defaultdict(asyncio.Lock)
+from utils.upserts import insert_row_if_missing, upsert_row
+from utils.write_behind import WriteBehindBuffer
+
+DB_LOCKS = LockTable()
+DB_CACHE = ModelCache()
+# Saves of the players are coalesced there when [database] player_write_behind_interval is set
+PLAYERS_WRITE_BUFFER = WriteBehindBuffer(key=lambda player: (player.member_id, player.channel_id))
+QUERY_STATS = QueryStats()
+# Experience rankings of the channels, see Player.update_leaderboard
+LEADERBOARDS = RankIndex()
+# Channels whose spawns must be replanned by DucksSpawning, see DiscordChannel.after_save
+DIRTY_CHANNELS: typing.Dict[int, "DiscordChannel"] = {}
 SECOND = 1
 MINUTE = 60 * SECOND
 HOUR = 60 * MINUTE
 DAY = 24 * HOUR
 
 
-class DefaultDictJSONField(fields.JSONField):
+class JSONField(fields.JSONField):
+    """
+    tortoise tries to import pydantic for every JSON value it reads, to build pydantic models. We don't use them, and
+    without pydantic installed, every failed import searches the whole sys.path again, for every row loaded.
+    """
+
+    def to_python_value(
+        self, value: typing.Optional[typing.Union[str, bytes, dict, list]]
+    ) -> typing.Optional[typing.Union[dict, list]]:
+        if isinstance(value, (str, bytes)):
+            try:
+                return self.decoder(value)
+            except Exception:
+                raise FieldError(
+                    f"Value {value if isinstance(value, str) else value.decode()} is invalid json value."
+                )
+
+        return value
+
+
+class DefaultDictJSONField(JSONField):
     def __init__(self, default_factory: typing.Callable = int, **kwargs: typing.Any):
         def make_default():
             return collections.defaultdict(default_factory)
@@ -95,7 +136,106 @@ class SupportTicket(Model):
         self.close_reason = reason
 
 
-class DiscordGuild(Model):
+class SaveHooksModel:
+    """
+    Mixin overriding save() once for the models and mixins that need to run something around it. They override the
+    hooks instead, calling super():
+
+    - before_save returns the fields to UPDATE (None for all of them), or an empty list to skip writing.
+    - after_save is called with those fields once the object was saved, or if writing it was skipped.
+    """
+
+    async def save(self, using_db=None, update_fields=None, force_create=False, force_update=False):
+        update_fields = self.before_save(update_fields, using_db, force_create, force_update)
+        if update_fields != []:
+            await super().save(using_db=using_db, update_fields=update_fields, force_create=force_create,
+                               force_update=force_update)
+        self.after_save(update_fields)
+
+    def before_save(self, update_fields, using_db, force_create, force_update) -> typing.Optional[typing.List[str]]:
+        return update_fields
+
+    def after_save(self, update_fields: typing.Optional[typing.List[str]]):
+        pass
+
+
+class CachedModel(SaveHooksModel):
+    """
+    Mixin for the models cached by get_from_db, keeping DB_CACHE up-to-date when they are saved or deleted.
+    """
+
+    def cache_key(self) -> CacheKey:
+        raise NotImplementedError()
+
+    def after_save(self, update_fields):
+        super().after_save(update_fields)
+        if update_fields != []:
+            DB_CACHE.saved(self.cache_key(), self, update_fields)
+
+    async def delete(self, using_db=None):
+        DB_CACHE.invalidate(self.cache_key())
+        await super().delete(using_db=using_db)
+
+
+class DirtyFieldsModel(SaveHooksModel):
+    """
+    Mixin remembering the values of the fields when an object is loaded or saved, so that save() only UPDATEs the
+    columns that changed since. The JSON fields are copied shallowly, which is enough as long as they hold flat dicts.
+    """
+
+    _saved_values: typing.Optional[typing.Dict[str, typing.Any]] = None
+
+    @classmethod
+    def _init_from_db(cls, **kwargs):
+        self = super()._init_from_db(**kwargs)
+        self.snapshot_fields()
+        return self
+
+    def snapshot_fields(self, field_names: typing.Optional[typing.Iterable[str]] = None):
+        if self._partial:
+            return
+
+        if field_names is None:
+            self._saved_values = {}
+            field_names = self._meta.fields_db_projection.keys()
+        elif self._saved_values is None:
+            return
+
+        for field_name in field_names:
+            field_name = self._meta.fields_db_projection_reverse.get(field_name, field_name)
+            value = getattr(self, field_name)
+            if isinstance(value, (dict, list)):
+                value = value.copy()
+            self._saved_values[field_name] = value
+
+    def changed_fields(self) -> typing.Optional[typing.List[str]]:
+        """
+        Return the name of the fields that changed since the object was loaded or saved, or None if unknown.
+        """
+        if self._saved_values is None:
+            return None
+        return [
+            field_name
+            for field_name, value in self._saved_values.items()
+            if getattr(self, field_name) != value
+        ]
+
+    def before_save(self, update_fields, using_db, force_create, force_update):
+        update_fields = super().before_save(update_fields, using_db, force_create, force_update)
+        if update_fields is None and not force_create and self._saved_in_db:
+            return self.changed_fields()
+        return update_fields
+
+    def after_save(self, update_fields):
+        super().after_save(update_fields)
+        self.snapshot_fields(update_fields)
+
+    async def refresh_from_db(self, fields=None, using_db=None):
+        await super().refresh_from_db(fields=fields, using_db=using_db)
+        self.snapshot_fields(fields)
+
+
+class DiscordGuild(CachedModel, Model):
     discord_id = fields.BigIntField(pk=True)
     first_seen = fields.DatetimeField(auto_now_add=True)
 
@@ -113,6 +253,9 @@ class DiscordGuild(Model):
     class Meta:
         table = "guilds"
 
+    def cache_key(self) -> CacheKey:
+        return DiscordGuild, self.discord_id
+
     def __str__(self):
         return self.name
 
@@ -125,14 +268,124 @@ class SunState(IntEnum):
     NIGHT = 1
 
 
+class SunTable:
+    """
+    The day and night boundaries of a night window, as [begin, end) intervals of seconds from midnight UTC.
+
+    Every interval stores its sun state and the seconds left as `constant - seconds spent today`, so that
+    lookups are a bisect in (at most) 3 intervals, instead of going through the night window cases again.
+
+    Two sets of intervals are kept, since the spawns and the sun state shown to players don't agree on the
+    boundaries: spawns consider the night starts the second after night_start_at, while players are shown
+    night from night_start_at itself.
+    """
+
+    __slots__ = (
+        "night_start_at",
+        "night_end_at",
+        "duration_of_night",
+        "_spawn_begins",
+        "_spawn_intervals",
+        "_shown_begins",
+        "_shown_intervals",
+    )
+
+    def __init__(self, night_start_at: int, night_end_at: int):
+        self.night_start_at = start = night_start_at
+        self.night_end_at = end = night_end_at
+
+        # (begin, end, sun state, night seconds left at midnight, slope)
+        spawn_intervals: typing.List[typing.Tuple[int, int, SunState, int, int]]
+        # (begin, end, sun state, seconds before the sun state changes at midnight, slope)
+        shown_intervals: typing.List[typing.Tuple[int, int, SunState, int, int]]
+
+        if start == end:
+            # Nothing set
+            self.duration_of_night = 0
+            spawn_intervals = [(0, DAY, SunState.DAY, 0, 0)]
+            shown_intervals = [(0, DAY, SunState.DAY, DAY, 0)]
+        elif start < end:
+            # Simple case: everything is the same day
+            # 16:00            < 23:00
+            self.duration_of_night = end - start
+            spawn_intervals = [
+                (0, start + 1, SunState.DAY, end - start, 0),
+                (start + 1, end + 1, SunState.NIGHT, end, -1),
+                (end + 1, DAY, SunState.DAY, 0, 0),
+            ]
+            shown_intervals = [
+                (0, start, SunState.DAY, start, -1),
+                (start, end + 1, SunState.NIGHT, end, -1),
+                (end + 1, DAY, SunState.DAY, DAY + start, -1),
+            ]
+        else:
+            # Harder case: night starts in a day and end the next day
+            # 21:00            > 06:00
+            self.duration_of_night = DAY - start + end
+            spawn_intervals = [
+                (0, end + 1, SunState.NIGHT, end + DAY - start, -1),
+                (end + 1, start + 1, SunState.DAY, DAY - start, 0),
+                (start + 1, DAY, SunState.NIGHT, DAY, -1),
+            ]
+            shown_intervals = [
+                (0, end + 1, SunState.NIGHT, end, -1),
+                (end + 1, start, SunState.DAY, start, -1),
+                (start, DAY, SunState.NIGHT, DAY + end, -1),
+            ]
+
+        self._spawn_intervals = spawn_intervals
+        self._spawn_begins = [interval[0] for interval in spawn_intervals]
+        self._shown_intervals = shown_intervals
+        self._shown_begins = [interval[0] for interval in shown_intervals]
+
+    def _spawn_interval(self, now: int):
+        # Empty intervals have the same begin as the next one, so bisect_right skips them.
+        return self._spawn_intervals[bisect.bisect_right(self._spawn_begins, now) - 1]
+
+    def intervals(self) -> typing.List[typing.Tuple[int, int, SunState]]:
+        return [(begin, end, state) for begin, end, state, _, _ in self._spawn_intervals]
+
+    def day_status(self, now: int) -> SunState:
+        return self._spawn_interval(now % DAY)[2]
+
+    def night_seconds_left(self, now: int) -> int:
+        now = now % DAY
+        _, _, _, constant, slope = self._spawn_interval(now)
+        return constant + slope * now
+
+    def day_seconds_left(self, now: int) -> int:
+        now = now % DAY
+        return DAY - now - self.night_seconds_left(now)
+
+    def sun_state(self, now: int) -> typing.Tuple[SunState, int, int]:
+        """
+        Return the sun state shown to players, how long the night lasts, and the seconds left before the sun state
+        changes.
+        """
+        now = now % DAY
+        _, _, state, constant, slope = self._shown_intervals[
+            bisect.bisect_right(self._shown_begins, now) - 1
+        ]
+        return state, self.duration_of_night, constant + slope * now
+
+
+@functools.lru_cache(maxsize=4096)
+def get_sun_table(night_start_at: int, night_end_at: int) -> SunTable:
+    """
+    Sun tables only depend on the night window, so they are shared by every channel with the same settings,
+    and only computed again when a channel changes them.
+    """
+    return SunTable(night_start_at, night_end_at)
+
+
 class DucksLeft:
     """
     This class stores the state of a channel, counting the ducks left.
     """
 
-    def __init__(self, channel, day_ducks=None, night_ducks=None):
+    def __init__(self, channel, day_ducks=None, night_ducks=None, db_channel=None):
         self.channel: discord.TextChannel = channel
-        self.db_channel: typing.Optional[DiscordChannel] = None
+        self.db_channel: typing.Optional[DiscordChannel] = db_channel
         self.day_ducks: int = day_ducks
         self.night_ducks: int = night_ducks
 
@@ -186,35 +439,73 @@ class DucksLeft:
 
         return self
 
-    async def maybe_spawn_type(self, now=None) -> typing.Optional[SunState]:
-        if not self.db_channel:
-            self.db_channel: DiscordChannel = await get_from_db(self.channel)
-
-        db_channel = self.db_channel
+    def next_spawn(self, now=None) -> typing.Optional[typing.Tuple[int, SunState]]:
+        """
+        Draw the timestamp of the next duck to spawn on this channel, strictly after now.
 
+        Given there was no spawn until now, the ducks left are spread uniformly over the day (resp. night) seconds
+        left, so the next one is the first of those. This gives the same distribution as rolling the dice every
+        second, without having to plan the whole day in advance.
+        """
         if not now:
             now = int(time.time())
 
-        now = now % DAY
+        day_start = now - now % DAY
+        seconds_spent_today = now % DAY + 1
 
-        sun_state = db_channel.day_status(now)
+        next_spawns = []
+        for sun_state, count in (
+            (SunState.DAY, self.day_ducks),
+            (SunState.NIGHT, self.night_ducks),
+        ):
+            if count <= 0:
+                continue
+
+            sun_intervals = [
+                (max(begin, seconds_spent_today), end)
+                for begin, end, interval_state in self.db_channel.sun_intervals()
+                if interval_state == sun_state and max(begin, seconds_spent_today) < end
+            ]
+            total_seconds = sum(end - begin for begin, end in sun_intervals)
+
+            if not total_seconds:
+                continue
+
+            # Minimum of `count` uniform draws over the seconds left
+            count = min(count, total_seconds)
+            offset = min(
+                int(total_seconds * (1 - random.random() ** (1 / count))),
+                total_seconds - 1,
+            )
 
-        if sun_state == SunState.DAY:
-            if random.randint(0, db_channel.day_seconds_left(now)) < self.day_ducks:
-                self.day_ducks -= 1
-                return SunState.DAY
-        elif sun_state == SunState.NIGHT:
-            if random.randint(0, db_channel.night_seconds_left(now)) < self.night_ducks:
-                self.night_ducks -= 1
-                return SunState.NIGHT
+            for begin, end in sun_intervals:
+                if offset < end - begin:
+                    next_spawns.append((day_start + begin + offset, sun_state))
+                    break
+                offset -= end - begin
+
+        if next_spawns:
+            return min(next_spawns)
         return None
 
+    def consume(self, sun_state: SunState) -> bool:
+        """
+        Remove a duck from the ducks left to spawn. Returns False if there was none left.
+        """
+        if sun_state == SunState.DAY and self.day_ducks > 0:
+            self.day_ducks -= 1
+            return True
+        elif sun_state == SunState.NIGHT and self.night_ducks > 0:
+            self.night_ducks -= 1
+            return True
+        return False
+
     @property
     def ducks_left(self):
         return self.night_ducks + self.day_ducks
 
 
-class DiscordChannel(Model):
+class DiscordChannel(CachedModel, Model):
     discord_id = fields.BigIntField(pk=True)
     first_seen = fields.DatetimeField(auto_now_add=True)
 
@@ -226,7 +517,7 @@ class DiscordChannel(Model):
 
     name = fields.TextField()
 
-    webhook_urls = fields.JSONField(default=list)
+    webhook_urls = JSONField(default=list)
     api_key = fields.UUIDField(null=True)
 
     # Generic settings
@@ -287,8 +578,8 @@ class DiscordChannel(Model):
     super_ducks_min_life = fields.SmallIntField(default=2)
     super_ducks_max_life = fields.SmallIntField(default=7)
 
-    levels_to_roles_ids_mapping = fields.JSONField(default=dict)
-    prestige_to_roles_ids_mapping = fields.JSONField(default=dict)
+    levels_to_roles_ids_mapping = JSONField(default=dict)
+    prestige_to_roles_ids_mapping = JSONField(default=dict)
 
     def serialize(self, serialize_fields=None):
         DONT_SERIALIZE = {"guild", "members", "playerss", "webhook_urls", "api_key"}
@@ -324,91 +615,74 @@ class DiscordChannel(Model):
             #       v Time until next day      + v Time left at the start of the day
             return (DAY - self.night_start_at) + self.night_end_at
 
+    @property
+    def sun_table(self) -> SunTable:
+        return get_sun_table(self.night_start_at, self.night_end_at)
+
+    def spawn_planning_settings(self) -> tuple:
+        """
+        The settings the daily ducks spawns are planned from. The others (like spawn weights) are read as ducks spawn.
+        """
+        return self.enabled, self.ducks_per_day, self.night_start_at, self.night_end_at
+
+    SPAWN_PLANNING_FIELDS = {"enabled", "ducks_per_day", "night_start_at", "night_end_at"}
+    # spawn_planning_settings() when the channel was loaded or last saved
+    _saved_planning_settings: typing.Optional[tuple] = None
+
+    def sun_intervals(self) -> typing.List[typing.Tuple[int, int, SunState]]:
+        """
+        Split the day in [begin, end) intervals of seconds from midnight UTC, in the same way day_status does.
+        """
+        return self.sun_table.intervals()
+
     def night_seconds_left(self, now=None):
         if now is None:
             now = int(time.time())
 
-        now = now % DAY
-
-        if self.night_start_at == self.night_end_at:
-            # Nothing set
-            return 0
-        elif self.night_start_at < self.night_end_at:
-            # Simple case: everything is the same day
-            # 16:00            < 23:00
-            if self.night_start_at < now <= self.night_end_at:
-                # During the night
-                return self.night_end_at - now
-            elif self.night_end_at < now:
-                # After the night
-                return 0
-            elif now <= self.night_start_at:
-                # Before the night
-                return self.night_end_at - self.night_start_at
-            else:
-                # This shouldn't be happening
-                raise ArithmeticError(
-                    f"Error calculating simpler case in night_seconds_left, debugging follow\n"
-                    f"{now=}, {self.night_start_at=}, {self.night_end_at=}, {self=}"
-                )
-        else:
-            # Harder case: night starts in a day and end the next day
-            # 21:00            > 06:00
-            #       v Time until next day      + v Time left at the start of the day
-            if now <= self.night_end_at:
-                # During the first night of the day
-                # Seconds left during the first night + seconds in the second night
-                return (self.night_end_at - now) + (DAY - self.night_start_at)
-            elif self.night_end_at < now <= self.night_start_at:
-                # During the day
-                return DAY - self.night_start_at
-            elif self.night_start_at < now:
-                # During the second night, until midnight
-                return DAY - now
-            else:
-                # This shouldn't be happening
-                raise ArithmeticError(
-                    f"Error calculating harder case in night_seconds_left, debugging follow\n"
-                    f"{now=}, {self.night_start_at=}, {self.night_end_at=}, {self=}"
-                )
+        return self.sun_table.night_seconds_left(now)
 
     def day_status(self, now=None):
         if now is None:
             now = int(time.time())
 
-        now = now % DAY
-
-        if self.night_start_at == self.night_end_at:
-            # Nothing set
-            return SunState.DAY
-        elif self.night_start_at < self.night_end_at:
-            # Simple case: everything is the same day
-            # 16:00            < 23:00
-            if self.night_start_at < now <= self.night_end_at:
-                # During the night
-                return SunState.NIGHT
-            else:
-                return SunState.DAY
-        else:
-            # Harder case: night starts in a day and end the next day
-            # 21:00            > 06:00
-            if self.night_end_at < now <= self.night_start_at:
-                return SunState.DAY
-            else:
-                return SunState.NIGHT
+        return self.sun_table.day_status(now)
 
     def day_seconds_left(self, now=None):
         if now is None:
             now = int(time.time())
 
-        now = now % DAY
-
-        total_seconds_left = DAY - now
-
-        return total_seconds_left - self.night_seconds_left(now)
+        return self.sun_table.day_seconds_left(now)
 
     class Meta:
         table = "channels"
+        # get_enabled_channels, when planning the spawns
+        indexes = (PartialIndex(fields=("discord_id",), condition={"enabled": True}, name="channels_enabled"),)
+
+    def cache_key(self) -> CacheKey:
+        return DiscordChannel, self.discord_id
+
+    @classmethod
+    def _init_from_db(cls, **kwargs):
+        self = super()._init_from_db(**kwargs)
+        if not self._partial:
+            self._saved_planning_settings = self.spawn_planning_settings()
+        return self
+
+    def after_save(self, update_fields):
+        super().after_save(update_fields)
+        if update_fields is not None and self.SPAWN_PLANNING_FIELDS.isdisjoint(update_fields):
+            return
+
+        # Partial objects were merged into the instance in use by CachedModel.after_save
+        db_channel = DB_CACHE.in_use(self.cache_key()) if self._partial else self
+        if db_channel is None:
+            return
+
+        planning_settings = db_channel.spawn_planning_settings()
+        if db_channel._saved_planning_settings not in (None, planning_settings):
+            # Replanning resets the ducks left to spawn today, so it's not done when other settings change
+            DIRTY_CHANNELS[db_channel.discord_id] = db_channel
+        db_channel._saved_planning_settings = planning_settings
 
     def __str__(self):
         return self.name
@@ -462,6 +736,10 @@ class AccessLevel(IntEnum):
                 raise commands.BadArgument(_("Can't set such a high level"))
 
 
+# Access levels of the users and members, see DiscordUser.update_access_level and DiscordMember.update_access_level
+ACCESS_LEVELS = AccessIndex(default=AccessLevel.DEFAULT, banned=AccessLevel.BANNED)
+
+
 def get_valid_words(message_content) -> typing.List[str]:
     allowed_chars = string.ascii_letters + string.digits + string.whitespace
 
@@ -584,6 +862,12 @@ class LandminesPlaced(Model):
 
     class Meta:
         table = "landmines_placed"
+        # get_landmine, on every message sent in a guild with landmines
+        indexes = (
+            PartialIndex(
+                fields=("word", "placed"), condition={"tripped": False, "disarmed": False}, name="landmines_placed_active"
+            ),
+        )
 
 
 class LandminesProtects(Model):
@@ -660,7 +944,7 @@ class UserInventory(Model):
         table = "inventories"
 
 
-class DiscordUser(Model):
+class DiscordUser(CachedModel, Model):
     discord_id = fields.BigIntField(pk=True)
     first_seen = fields.DatetimeField(auto_now_add=True)
 
@@ -677,7 +961,7 @@ class DiscordUser(Model):
     name = fields.TextField()
     discriminator = fields.CharField(4)
 
-    trophys = fields.JSONField(default=dict)
+    trophys = JSONField(default=dict)
 
     ping_friendly = fields.BooleanField(default=True)
 
@@ -705,6 +989,22 @@ class DiscordUser(Model):
 
     class Meta:
         table = "users"
+        # Banned users, loaded at startup and checked when joining a guild
+        indexes = (PartialIndex(fields=("discord_id",), condition={"access_level_override": 0}, name="users_banned"),)
+
+    def cache_key(self) -> CacheKey:
+        return DiscordUser, self.discord_id
+
+    def after_save(self, update_fields):
+        super().after_save(update_fields)
+        if update_fields is None or "access_level_override" in update_fields:
+            self.update_access_level()
+
+    def update_access_level(self):
+        """
+        Report the access level override of that user to ACCESS_LEVELS. Every save does it.
+        """
+        ACCESS_LEVELS.set_user_override(self.discord_id, self.access_level_override)
 
     def get_access_level(self):
         return self.access_level_override
@@ -719,7 +1019,7 @@ class DiscordUser(Model):
         return f"<User name={self.name}#{self.discriminator}>"
 
 
-class Player(Model):
+class Player(DirtyFieldsModel, Model):
     id = fields.IntField(pk=True)
     first_seen = fields.DatetimeField(auto_now_add=True)
 
@@ -795,10 +1095,44 @@ class Player(Model):
         "best_times",
     }
 
+    def before_save(self, update_fields, using_db, force_create, force_update):
+        if (
+            PLAYERS_WRITE_BUFFER.enabled
+            and self._saved_in_db
+            and not (using_db or update_fields or force_create or force_update)
+            and PLAYERS_WRITE_BUFFER.add(self)
+        ):
+            # Written later by PLAYERS_WRITE_BUFFER
+            return []
+        return super().before_save(update_fields, using_db, force_create, force_update)
+
+    def after_save(self, update_fields):
+        super().after_save(update_fields)
+        self.update_leaderboard()
+
+    async def delete(self, using_db=None):
+        await super().delete(using_db=using_db)
+        LEADERBOARDS.remove(self.channel_id, self.id)
+
+    def update_leaderboard(self):
+        """
+        Report the experience of that player to the leaderboard of their channel, if it's cached.
+        Every save does it, so this is only needed when the player is written some other way.
+        """
+        db_member = getattr(self, "_member", None)
+        db_user = getattr(db_member, "_user", None)
+        if db_user is not None:
+            user = (db_user.discord_id, db_user.name, db_user.discriminator)
+        else:
+            user = None
+        LEADERBOARDS.update(self.channel_id, self.id, self.experience, user)
+
     async def do_prestige(self, bot, kept_exp):
         """
         Reset a player data, persisting his/her ID. What's left to do is.
         """
+        await PLAYERS_WRITE_BUFFER.flush([self])
+
         self.prestige += 1
         self.experience = kept_exp
 
@@ -933,14 +1267,18 @@ class Player(Model):
 
         return li
 
+    def giveback(self):
+        level_info = self.level_info()
+        self.last_giveback = timezone.now()
+        self.givebacks += 1
+        self.magazines = level_info["magazines"]
+        self.active_powerups["confiscated"] = 0
+
     async def maybe_giveback(self):
-        now = datetime.datetime.now()
-        if self.last_giveback.date() != now.date():
-            level_info = self.level_info()
-            self.last_giveback = now
-            self.givebacks += 1
-            self.magazines = level_info["magazines"]
-            self.active_powerups["confiscated"] = 0
+        # Every player normally gets it at freetime, from give_back_to_all_players.
+        # This only catches up for the players that were missed, for instance if the bot was down then.
+        if self.last_giveback < last_freetime():
+            self.giveback()
             await self.save()
 
     async def edit_experience_with_levelups(self, ctx, delta, bot=None):
@@ -1132,12 +1470,18 @@ class Player(Model):
 
     class Meta:
         table = "players"
+        # Read backwards by the leaderboards (utils/leaderboards.py), for ORDER BY experience DESC, id DESC
+        indexes = (
+            Index(fields=("channel_id", "experience", "id"), name="players_channel_experience"),
+            # get_player
+            Index(fields=("member_id", "channel_id"), name="players_member_channel"),
+        )
 
     def __repr__(self):
         return f"<Player member={self.member} channel={self.channel}>"
 
 
-class DiscordMember(Model):
+class DiscordMember(CachedModel, Model):
     landmines: fields.ReverseRelation["LandminesUserData"]
 
     id = fields.IntField(pk=True)
@@ -1163,6 +1507,26 @@ class DiscordMember(Model):
 
     class Meta:
         table = "members"
+        # get_from_db, and the players looked up by user
+        indexes = (Index(fields=("user_id", "guild_id"), name="members_user_guild"),)
+
+    def cache_key(self) -> CacheKey:
+        return DiscordMember, self.guild_id, self.user_id
+
+    def after_save(self, update_fields):
+        super().after_save(update_fields)
+        if update_fields is None or "access_level" in update_fields:
+            self.update_access_level()
+
+    async def delete(self, using_db=None):
+        await super().delete(using_db=using_db)
+        ACCESS_LEVELS.set_member_access_level(self.guild_id, self.user_id, AccessLevel.DEFAULT)
+
+    def update_access_level(self):
+        """
+        Report the access level of that member on their guild to ACCESS_LEVELS. Every save does it.
+        """
+        ACCESS_LEVELS.set_member_access_level(self.guild_id, self.user_id, self.access_level)
 
     def __repr__(self):
         return f"<Member user={self.user} guild={self.guild}>"
@@ -1386,83 +1750,196 @@ async def get_tag(name, increment_uses=True) -> typing.Optional[Tag]:
             return None
 
 
-async def get_from_db(discord_object, as_user=False):
-    async with DB_LOCKS[(discord_object, as_user)]:
-        if isinstance(discord_object, discord.Guild):
-            db_obj = await DiscordGuild.filter(discord_id=discord_object.id).first()
-            if not db_obj:
-                db_obj = DiscordGuild(
-                    discord_id=discord_object.id, name=discord_object.name
-                )
-                await db_obj.save()
-            if discord_object.name != db_obj.name:
-                db_obj.name = discord_object.name
-                await db_obj.save()
+def _cache_key(discord_object, as_user=False) -> typing.Optional[CacheKey]:
+    if isinstance(discord_object, discord.Guild):
+        return DiscordGuild, discord_object.id
+    elif isinstance(discord_object, discord.TextChannel) or isinstance(
+        discord_object, discord.VoiceChannel
+    ):
+        return DiscordChannel, discord_object.id
+    elif isinstance(discord_object, discord.Member) and not as_user:
+        return DiscordMember, discord_object.guild.id, discord_object.id
+    elif (
+        isinstance(discord_object, discord.User)
+        or isinstance(discord_object, discord.ClientUser)
+        or isinstance(discord_object, discord.Member)
+    ):
+        return DiscordUser, discord_object.id
+    else:
+        return None
 
-            return db_obj
-        elif isinstance(discord_object, discord.TextChannel) or isinstance(
-            discord_object, discord.VoiceChannel
-        ):
-            db_obj = await DiscordChannel.filter(discord_id=discord_object.id).first()
-            if not db_obj:
-                db_obj = DiscordChannel(
-                    discord_id=discord_object.id,
-                    name=discord_object.name,
-                    guild=await get_from_db(discord_object.guild),
-                )
-                await db_obj.save()
 
-            if discord_object.name != db_obj.name:
-                db_obj.name = discord_object.name
-                await db_obj.save()
+def _parents(discord_object, key: CacheKey) -> typing.List[typing.Tuple[typing.Any, bool]]:
+    """
+    The objects whose rows must exist before that object's row can be created, as (discord_object, as_user).
+    """
+    if key[0] is DiscordChannel:
+        return [(discord_object.guild, False)]
+    elif key[0] is DiscordMember:
+        return [(discord_object.guild, False), (discord_object, True)]
+    else:
+        return []
+
 
+async def get_from_db(discord_object, as_user=False):
+    if isinstance(discord_object, discord.Thread):
+        discord_object = discord_object.parent
+
+    key = _cache_key(discord_object, as_user)
+    if key is None:
+        obj_type_name = type(discord_object).__name__
+        print(
+            f"Unknown object type passed to get_from_db <type:{obj_type_name}>, <obj:{discord_object}>"
+        )
+        return None
+
+    async with DB_LOCKS.lock("get_from_db", *key):
+        db_obj, fresh = DB_CACHE.get(key)
+        if fresh:
+            await _refresh_names(discord_object, db_obj)
             return db_obj
-        elif isinstance(discord_object, discord.Member) and not as_user:
-            db_obj = (
-                await DiscordMember.filter(
-                    user__discord_id=discord_object.id,
-                    guild__discord_id=discord_object.guild.id,
-                )
-                .first()
-                .prefetch_related("user", "guild")
-            )
-            if not db_obj:
-                db_obj = DiscordMember(
-                    guild=await get_from_db(discord_object.guild),
-                    user=await get_from_db(discord_object, as_user=True),
-                )
-                await db_obj.save()
+
+        # Most rows already exist: reading them doesn't need to write anything
+        db_obj = await _select_from_db(discord_object, key)
+        if db_obj is not None:
             return db_obj
-        elif (
-            isinstance(discord_object, discord.User)
-            or isinstance(discord_object, discord.ClientUser)
-            or (isinstance(discord_object, discord.Member) and as_user)
+
+        created = []
+        parents = _parents(discord_object, key)
+        if all(DB_CACHE.peek(_cache_key(*parent)) for parent in parents):
+            # Only one statement to run
+            await _upsert_from_discord(key[0]._meta.db, discord_object, key, created)
+        else:
+            async with in_transaction() as connection:
+                await _upsert_from_discord(connection, discord_object, key, created)
+
+        # Only cached once committed, so that rolled back rows are never returned
+        return _share_created(created)
+
+
+async def _select_from_db(discord_object, key: CacheKey):
+    """
+    Load the existing row for that object with its parents, and cache it. None if there is no row yet.
+    """
+    model = key[0]
+    if model is DiscordMember:
+        db_obj = await DiscordMember.filter(guild_id=key[1], user_id=key[2]).first()
+    else:
+        db_obj = await model.filter(discord_id=key[1]).first()
+
+    if db_obj is None:
+        return None
+
+    # Share the guild and user with the ones returned by get_from_db, so they never diverge
+    if model is DiscordChannel:
+        db_guild = await get_from_db(discord_object.guild)
+        db_obj = DB_CACHE.share(key, db_obj)
+        db_obj.guild = db_guild
+    elif model is DiscordMember:
+        db_guild = await get_from_db(discord_object.guild)
+        db_user = await get_from_db(discord_object, as_user=True)
+        db_obj = DB_CACHE.share(key, db_obj)
+        db_obj.guild = db_guild
+        db_obj.user = db_user
+    else:
+        db_obj = DB_CACHE.share(key, db_obj)
+
+    await _refresh_names(discord_object, db_obj)
+    return db_obj
+
+
+async def _refresh_names(discord_object, db_obj):
+    if isinstance(db_obj, DiscordUser):
+        if (
+            discord_object.name != db_obj.name
+            or discord_object.discriminator != db_obj.discriminator
         ):
-            db_obj = await DiscordUser.filter(discord_id=discord_object.id).first()
-            if not db_obj:
-                db_obj = DiscordUser(
-                    discord_id=discord_object.id,
-                    name=discord_object.name,
-                    discriminator=discord_object.discriminator,
-                )
-                await db_obj.save()
+            db_obj.name = discord_object.name
+            db_obj.discriminator = discord_object.discriminator
+            await db_obj.save(update_fields=["name", "discriminator"])
+    elif not isinstance(db_obj, DiscordMember) and discord_object.name != db_obj.name:
+        db_obj.name = discord_object.name
+        await db_obj.save(update_fields=["name"])
 
-            if (
-                discord_object.name != db_obj.name
-                or discord_object.discriminator != db_obj.discriminator
-            ):
-                db_obj.name = discord_object.name
-                db_obj.discriminator = discord_object.discriminator
-                await db_obj.save()
 
-            return db_obj
-        elif isinstance(discord_object, discord.Thread):
-            return await get_from_db(discord_object.parent)
-        else:
-            obj_type_name = type(discord_object).__name__
-            print(
-                f"Unknown object type passed to get_from_db <type:{obj_type_name}>, <obj:{discord_object}>"
-            )
+async def _upsert_parent(connection, discord_object, as_user: bool, created: list):
+    key = _cache_key(discord_object, as_user)
+    db_obj = DB_CACHE.peek(key)
+    if db_obj is None:
+        db_obj = await _upsert_from_discord(connection, discord_object, key, created)
+    return db_obj
+
+
+async def _upsert_from_discord(connection, discord_object, key: CacheKey, created: list):
+    """
+    Create or refresh (in a single statement) the row for that object, after its parents rows. The rows written are
+    appended to `created`, parents first, to be cached once they are committed.
+    """
+    model = key[0]
+    if model is DiscordGuild:
+        db_obj = await upsert_row(
+            connection,
+            DiscordGuild(discord_id=discord_object.id, name=discord_object.name),
+            refresh_fields=["name"],
+        )
+    elif model is DiscordChannel:
+        db_guild = await _upsert_parent(connection, discord_object.guild, False, created)
+        db_obj = await upsert_row(
+            connection,
+            DiscordChannel(
+                discord_id=discord_object.id,
+                name=discord_object.name,
+                guild=db_guild,
+            ),
+            refresh_fields=["name"],
+        )
+        db_obj.guild = db_guild
+    elif model is DiscordMember:
+        db_guild = await _upsert_parent(connection, discord_object.guild, False, created)
+        db_user = await _upsert_parent(connection, discord_object, True, created)
+        db_obj, _ = await insert_row_if_missing(
+            connection,
+            DiscordMember(guild=db_guild, user=db_user),
+            match_fields=["guild_id", "user_id"],
+        )
+        db_obj.guild = db_guild
+        db_obj.user = db_user
+    else:
+        db_obj = await upsert_row(
+            connection,
+            DiscordUser(
+                discord_id=discord_object.id,
+                name=discord_object.name,
+                discriminator=discord_object.discriminator,
+            ),
+            refresh_fields=["name", "discriminator"],
+        )
+
+    created.append((key, db_obj))
+    return db_obj
+
+
+def _share_created(created: typing.List[typing.Tuple[CacheKey, "CachedModel"]]):
+    """
+    Cache the rows written by _upsert_from_discord, and return the instance to use for the last one.
+    """
+    shared = {}
+    for key, db_obj in created:
+        db_obj = shared[key] = DB_CACHE.share(key, db_obj)
+        # Point to the guild and user instances shared by get_from_db, so they never diverge
+        if key[0] is DiscordChannel or key[0] is DiscordMember:
+            db_obj.guild = shared.get((DiscordGuild, key[1]), db_obj.guild)
+        if key[0] is DiscordMember:
+            db_obj.user = shared.get((DiscordUser, key[2]), db_obj.user)
+    return db_obj
+
+
+def invalidate_cache(model: typing.Type[CachedModel], *discord_ids: int):
+    """
+    Forget cached objects whose rows were updated without going through get_from_db instances,
+    for instance with a queryset .update().
+    """
+    DB_CACHE.invalidate((model, *discord_ids))
 
 
 async def get_random_player(channel: typing.Union[DiscordChannel, discord.TextChannel]):
@@ -1479,26 +1956,104 @@ async def get_random_player(channel: typing.Union[DiscordChannel, discord.TextCh
 async def get_player(
     member: discord.Member, channel: discord.TextChannel, giveback=False
 ):
-    async with DB_LOCKS[(member, channel)]:
-        db_obj = (
-            await Player.filter(
-                member__user__discord_id=member.id, channel__discord_id=channel.id
-            )
-            .prefetch_related("member__user")
-            .first()
-        )
+    async with DB_LOCKS.lock("player", member.id, channel.id):
+        db_channel = await get_from_db(channel)
+        db_member = await get_from_db(member)
+
+        created = False
+        db_obj = PLAYERS_WRITE_BUFFER.get((db_member.id, db_channel.discord_id))
         if not db_obj:
-            db_obj = Player(
-                channel=await get_from_db(channel),
-                member=await get_from_db(member, as_user=False),
+            db_obj = await Player.filter(member_id=db_member.id, channel_id=db_channel.discord_id).first()
+        if not db_obj:
+            db_obj, created = await insert_row_if_missing(
+                Player._meta.db,
+                Player(channel=db_channel, member=db_member),
+                match_fields=["channel_id", "member_id"],
             )
-            await db_obj.save()
-        elif giveback:
+
+        db_obj.channel = db_channel
+        db_obj.member = db_member
+
+        if created:
+            db_obj.update_leaderboard()
+
+        if giveback and not created:
             await db_obj.maybe_giveback()
 
         return db_obj
 
 
+def last_freetime() -> datetime.datetime:
+    """
+    When the magazines were last refilled, and the confiscated weapons given back: at the start of every (UTC) day.
+    """
+    now = time.time()
+    return datetime.datetime.fromtimestamp(now - now % DAY, tz=datetime.timezone.utc)
+
+
+def _magazines_by_experience() -> Case:
+    """
+    Player.level_info()["magazines"], as an SQL expression.
+    """
+    # Levels with the same number of magazines are merged in a single bracket
+    brackets = []
+    for level in LEVELS[1:]:
+        if level["magazines"] != (brackets[-1][1] if brackets else LEVELS[0]["magazines"]):
+            brackets.append((level["expMin"], level["magazines"]))
+
+    return Case(
+        *(When(experience__gte=exp_min, then=magazines) for exp_min, magazines in reversed(brackets)),
+        default=LEVELS[0]["magazines"],
+    )
+
+
+MAGAZINES_BY_EXPERIENCE = _magazines_by_experience()
+
+
+class _RawSQLExpression(Expression):
+    # QuerySet.update() only takes expressions, not terms like RawSQL
+    def __init__(self, sql: str):
+        self.sql = sql
+
+    def resolve(self, resolve_context: ResolveContext) -> ResolveResult:
+        return ResolveResult(term=RawSQL(self.sql))
+
+
+async def give_back_to_all_players(batch_size: int = 10000) -> int:
+    """
+    Run Player.giveback on every player that didn't get it since the last freetime, with a few set-based UPDATEs.
+    Return the number of players updated.
+    """
+    freetime = last_freetime()
+    now = timezone.now()
+
+    # Pending changes would overwrite the giveback otherwise
+    await PLAYERS_WRITE_BUFFER.flush()
+
+    if Player._meta.db.capabilities.dialect == "postgres":
+        clear_confiscated = _RawSQLExpression("""jsonb_set("active_powerups", '{confiscated}', '0')""")
+    else:
+        clear_confiscated = _RawSQLExpression("""json_set("active_powerups", '$.confiscated', 0)""")
+
+    max_id = await Player.all().order_by("-id").first().values_list("id", flat=True)
+    updated = 0
+    # In batches of IDs, so that the table isn't locked for the whole update
+    for start in range(0, max_id or 0, batch_size):
+        updated += await Player.filter(id__gt=start, id__lte=start + batch_size, last_giveback__lt=freetime).update(
+            magazines=MAGAZINES_BY_EXPERIENCE,
+            active_powerups=clear_confiscated,
+            givebacks=F("givebacks") + 1,
+            last_giveback=now,
+        )
+
+    # Players saved to the buffer during the update still have the old values, and will write them back
+    for db_player in PLAYERS_WRITE_BUFFER.pending():
+        if db_player.last_giveback < freetime:
+            db_player.giveback()
+
+    return updated
+
+
 async def get_user_inventory(
     user: typing.Union[DiscordUser, discord.User, discord.Member]
 ) -> UserInventory:
@@ -1507,7 +2062,7 @@ async def get_user_inventory(
     else:
         db_user = user
 
-    async with DB_LOCKS[(db_user,)]:
+    async with DB_LOCKS.lock("inventory", db_user.discord_id):
         inventory, created = await UserInventory.get_or_create(
             user_id=db_user.discord_id
         )
@@ -1523,7 +2078,7 @@ async def get_member_landminesdata(
     else:
         db_member = member
 
-    async with DB_LOCKS[(db_member,)]:
+    async with DB_LOCKS.lock("landmines", db_member.pk):
         eventdata, created = await LandminesUserData.get_or_create(
             member_id=db_member.pk
         )
@@ -1562,7 +2117,25 @@ async def get_landmine(
 
 
 async def get_enabled_channels():
-    return await DiscordChannel.filter(enabled=True).all()
+    return [
+        DB_CACHE.share(db_channel.cache_key(), db_channel)
+        for db_channel in await DiscordChannel.filter(enabled=True).all()
+    ]
+
+
+async def get_channels(channels_ids: typing.Iterable[int], batch_size: int = 500) -> typing.List[DiscordChannel]:
+    """
+    Load many channels at once, with a query per batch of IDs, sharing the instances already in use.
+    Channels missing from the database are left out.
+    """
+    channels_ids = list(channels_ids)
+    db_channels = []
+    for i in range(0, len(channels_ids), batch_size):
+        db_channels.extend(
+            DB_CACHE.share(db_channel.cache_key(), db_channel)
+            for db_channel in await DiscordChannel.filter(discord_id__in=channels_ids[i:i + batch_size])
+        )
+    return db_channels
 
 
 async def init_db_connection(config, create_dbs=False):
@@ -1589,6 +2162,22 @@ async def init_db_connection(config, create_dbs=False):
     }
 
     await Tortoise.init(tortoise_config)
+    QUERY_STATS.instrument(Tortoise.get_connection("default"))
+    QUERY_STATS.configure(
+        budget=config.get("query_budget", 25),
+        repeated_threshold=config.get("repeated_queries_threshold", 5),
+    )
+
+    DB_CACHE.configure(
+        ttl=config.get("cache_ttl", 300),
+        max_memory=config.get("cache_max_memory_mb", 64) * 1024 * 1024,
+    )
+    PLAYERS_WRITE_BUFFER.configure(interval=config.get("player_write_behind_interval", 0))
+    LEADERBOARDS.configure(
+        max_channels=config.get("leaderboards_cache_channels", 1000),
+        ttl=config.get("leaderboards_cache_ttl", 3600),
+    )
+    ACCESS_LEVELS.configure(ttl=config.get("access_levels_reload_interval", 300))
 
     if create_dbs:
         # This would create the databases, something that should be handled by Django.
@@ -0,0 +1,107 @@
+import typing
+
+import numpy as np
+
+from utils.models import DAY, DiscordChannel
+
+
+def night_seconds_left(
+    night_start_at: np.ndarray, night_end_at: np.ndarray, now: typing.Union[int, np.ndarray]
+) -> np.ndarray:
+    """
+    Vectorized version of DiscordChannel.night_seconds_left, branch for branch.
+    """
+    now = np.broadcast_to(np.asarray(now, dtype=np.int64) % DAY, night_start_at.shape)
+
+    start, end = night_start_at, night_end_at
+
+    return np.select(
+        [
+            # Nothing set
+            start == end,
+            # Simple case: everything is the same day
+            (start < end) & (start < now) & (now <= end),
+            (start < end) & (end < now),
+            (start < end),
+            # Harder case: night starts in a day and end the next day
+            now <= end,
+            (end < now) & (now <= start),
+        ],
+        [
+            0,
+            end - now,
+            0,
+            end - start,
+            (end - now) + (DAY - start),
+            DAY - start,
+        ],
+        # During the second night, until midnight
+        default=DAY - now,
+    )
+
+
+def compute_ducks_counts(
+    ducks_per_day: np.ndarray,
+    night_start_at: np.ndarray,
+    night_end_at: np.ndarray,
+    now: int,
+) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """
+    Compute the day and night ducks left to spawn for many channels at once.
+
+    This gives exactly the same results as DucksLeft.compute_ducks_count.
+    """
+    now = now % DAY
+
+    total_seconds_left = DAY - now
+    total_night_seconds = night_seconds_left(night_start_at, night_end_at, 0)
+    night_seconds_left_now = night_seconds_left(night_start_at, night_end_at, now)
+    total_day_seconds = DAY - total_night_seconds
+    day_seconds_left = total_seconds_left - night_seconds_left_now
+
+    day_ducks_count = np.trunc(ducks_per_day * 9 / 10).astype(np.int64)
+    night_ducks_count = np.trunc(ducks_per_day * 1 / 10).astype(np.int64)
+
+    # Add missing ducks due to int() conversion to night.
+    night_ducks_count += ducks_per_day - day_ducks_count - night_ducks_count
+
+    # The minimum here is protecting against having more than a duck every 5 seconds.
+    # np.divide with where= prevents the ZeroDivisionError, leaving 0 ducks.
+    day_ducks = np.divide(
+        day_seconds_left * day_ducks_count,
+        total_day_seconds,
+        out=np.zeros(ducks_per_day.shape),
+        where=total_day_seconds != 0,
+    )
+    day_ducks = np.minimum(day_ducks, total_day_seconds / 5)
+
+    night_ducks = np.divide(
+        night_seconds_left_now * night_ducks_count,
+        total_night_seconds,
+        out=np.zeros(ducks_per_day.shape),
+        where=total_night_seconds != 0,
+    )
+    night_ducks = np.minimum(night_ducks, total_night_seconds / 5)
+
+    return np.trunc(day_ducks).astype(np.int64), np.trunc(night_ducks).astype(np.int64)
+
+
+def plan_channels(
+    db_channels: typing.Sequence[DiscordChannel], now: int
+) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """
+    Load the spawn settings of all the channels in arrays, and compute their ducks left to spawn in a single batch.
+    """
+    count = len(db_channels)
+
+    ducks_per_day = np.fromiter(
+        (c.ducks_per_day for c in db_channels), dtype=np.int64, count=count
+    )
+    night_start_at = np.fromiter(
+        (c.night_start_at for c in db_channels), dtype=np.int64, count=count
+    )
+    night_end_at = np.fromiter(
+        (c.night_end_at for c in db_channels), dtype=np.int64, count=count
+    )
+
+    return compute_ducks_counts(ducks_per_day, night_start_at, night_end_at, now)
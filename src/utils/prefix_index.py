@@ -0,0 +1,99 @@
+import asyncio
+import time
+import typing
+
+import discord
+
+from utils.models import DiscordGuild
+
+
+class PrefixIndex:
+    """
+    Every prefix a command can start with: the global ones, the mentions of the bot, and the prefix of every guild.
+
+    It's used to ignore the messages that can't be commands before doing anything else with them, without a lookup of
+    the guild in the database. Guild prefixes are loaded once, and must be kept up-to-date with set_guild_prefix when
+    they are edited. Changes made to the database some other way (like the admin website) are picked up by reloading
+    every prefix in the background every `ttl` seconds.
+    """
+
+    def __init__(self, global_prefixes: typing.Iterable[str], ttl: float = 300):
+        self.global_prefixes = tuple(global_prefixes)
+        self._first_characters = {prefix[0] for prefix in self.global_prefixes if prefix}
+        self.default_guild_prefix: typing.Optional[str] = DiscordGuild._meta.fields_map["prefix"].default
+        self._guild_prefixes: typing.Dict[int, typing.Optional[str]] = {}
+        self.ttl = ttl
+        self.loaded = False
+        self.loaded_at: typing.Optional[float] = None
+        self._loading: typing.Optional[asyncio.Task] = None
+        # Prefixes set while the index is loading, applied once it's loaded
+        self._updates_while_loading: typing.Optional[typing.List[tuple]] = None
+
+        # Statistics
+        self.rejected = 0
+        self.accepted = 0
+        self.reloads = 0
+
+    def set_mentions(self, user_id: int):
+        """
+        Add the mentions of the bot, once it's logged in.
+        """
+        mentions = (f"<@{user_id}>", f"<@!{user_id}>")
+        if mentions[0] not in self.global_prefixes:
+            self.global_prefixes += mentions
+            self._first_characters.add("<")
+
+    def get_guild_prefix(self, guild_id: int) -> typing.Optional[str]:
+        # Guilds that aren't in the database yet will be created with the default prefix
+        return self._guild_prefixes.get(guild_id, self.default_guild_prefix)
+
+    def set_guild_prefix(self, guild_id: int, prefix: typing.Optional[str]):
+        if self._updates_while_loading is not None:
+            self._updates_while_loading.append((guild_id, prefix))
+        self._guild_prefixes[guild_id] = prefix
+
+    async def load(self):
+        self._updates_while_loading = updates = []
+        try:
+            guild_prefixes = dict(await DiscordGuild.all().values_list("discord_id", "prefix"))
+        finally:
+            self._updates_while_loading = None
+
+        guild_prefixes.update(updates)
+        self._guild_prefixes = guild_prefixes
+        self.loaded = True
+        self.loaded_at = time.monotonic()
+
+    def _maybe_reload(self):
+        if self._loading is None and time.monotonic() - self.loaded_at > self.ttl:
+            self.reloads += 1
+            self._loading = asyncio.get_running_loop().create_task(self._reload())
+
+    async def _reload(self):
+        try:
+            await self.load()
+        finally:
+            self._loading = None
+
+    def could_be_command(self, message: discord.Message) -> bool:
+        """
+        False if that message doesn't start with any of the prefixes, so it can't be a command.
+        """
+        if not self.loaded or message.guild is None:
+            # Commands don't need a prefix in DMs
+            return True
+        elif self.loaded_at is not None:
+            self._maybe_reload()
+
+        content = message.content
+        guild_prefix = self.get_guild_prefix(message.guild.id)
+        if (guild_prefix is not None and content.startswith(guild_prefix)) or (
+            # Most messages are rejected on their first character
+            content[:1] in self._first_characters
+            and content.startswith(self.global_prefixes)
+        ):
+            self.accepted += 1
+            return True
+
+        self.rejected += 1
+        return False
@@ -0,0 +1,156 @@
+"""
+Per-command accounting of the database queries.
+
+The Tortoise client classes are instrumented to time every query, and attribute it to the scope (a command or a
+background task) active in the current context. When a scope ends, commands over the queries budget are logged, as well
+as statements repeated many times in the same scope, that usually come from a loop awaiting relations one at a time
+(N+1 queries).
+"""
+import collections
+import contextlib
+import contextvars
+import functools
+import time
+import typing
+
+from tortoise.backends.base.client import BaseDBAsyncClient
+
+INSTRUMENTED_METHODS = ("execute_insert", "execute_many", "execute_query", "execute_query_dict", "execute_script")
+
+
+class QueryScope:
+    __slots__ = ("name", "queries", "duration", "statements", "finished")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.queries = 0
+        self.duration = 0.0
+        self.statements: typing.Counter[str] = collections.Counter()
+        self.finished = False
+
+    def record(self, sql: str, duration: float):
+        self.queries += 1
+        self.duration += duration
+        self.statements[sql] += 1
+
+
+class ScopeStats:
+    __slots__ = ("invocations", "queries", "duration", "max_queries", "over_budget", "n_plus_one", "repeated_statement")
+
+    def __init__(self):
+        self.invocations = 0
+        self.queries = 0
+        self.duration = 0.0
+        self.max_queries = 0
+        self.over_budget = 0
+        self.n_plus_one = 0
+        self.repeated_statement: typing.Optional[str] = None
+
+    @property
+    def average_queries(self) -> float:
+        return self.queries / self.invocations if self.invocations else 0
+
+
+CURRENT_SCOPE: contextvars.ContextVar[typing.Optional[QueryScope]] = contextvars.ContextVar(
+    "query_scope", default=None
+)
+
+
+class QueryStats:
+    def __init__(self, budget: int = 25, repeated_threshold: int = 5):
+        self.budget = budget
+        self.repeated_threshold = repeated_threshold
+        self.logger = None
+
+        self.scopes: typing.DefaultDict[str, ScopeStats] = collections.defaultdict(ScopeStats)
+        # Queries made outside of any scope, or by tasks outliving the scope they were started in
+        self.unattributed = ScopeStats()
+
+    def configure(self, budget: int, repeated_threshold: int):
+        self.budget = budget
+        self.repeated_threshold = repeated_threshold
+
+    def record(self, sql: str, duration: float):
+        scope = CURRENT_SCOPE.get()
+        if scope is None or scope.finished:
+            self.unattributed.queries += 1
+            self.unattributed.duration += duration
+        else:
+            scope.record(sql, duration)
+
+    @contextlib.contextmanager
+    def scope(self, name: str):
+        scope = QueryScope(name)
+        token = CURRENT_SCOPE.set(scope)
+        try:
+            yield scope
+        finally:
+            CURRENT_SCOPE.reset(token)
+            self.finish(scope)
+
+    def finish(self, scope: QueryScope):
+        scope.finished = True
+        stats = self.scopes[scope.name]
+        stats.invocations += 1
+        stats.queries += scope.queries
+        stats.duration += scope.duration
+        stats.max_queries = max(stats.max_queries, scope.queries)
+
+        if scope.queries > self.budget:
+            stats.over_budget += 1
+            if self.logger:
+                self.logger.warning(
+                    f"{scope.name} ran {scope.queries} queries ({scope.duration * 1000:.1f}ms), "
+                    f"over the budget of {self.budget}"
+                )
+
+        if scope.statements:
+            sql, count = scope.statements.most_common(1)[0]
+            if count >= self.repeated_threshold:
+                stats.n_plus_one += 1
+                stats.repeated_statement = sql
+                if self.logger:
+                    self.logger.warning(f"Possible N+1 queries in {scope.name}: {count} times {sql}")
+
+    def top(self, count: int = 10, key: str = "queries") -> typing.List[typing.Tuple[str, ScopeStats]]:
+        return sorted(self.scopes.items(), key=lambda item: getattr(item[1], key), reverse=True)[:count]
+
+    def reset(self):
+        self.scopes.clear()
+        self.unattributed = ScopeStats()
+
+    @staticmethod
+    def _client_classes(connection: BaseDBAsyncClient) -> typing.List[type]:
+        # The transactions are subclasses of the connection class
+        classes = [type(connection)]
+        for cls in classes:
+            classes.extend(cls.__subclasses__())
+        return classes
+
+    def instrument(self, connection: BaseDBAsyncClient):
+        """
+        Time the queries of that connection, and of its transactions.
+        """
+        for cls in self._client_classes(connection):
+            for method_name in INSTRUMENTED_METHODS:
+                method = getattr(cls, method_name)
+                if not getattr(method, "instrumented", False):
+                    setattr(cls, method_name, self._instrumented(method))
+
+    def uninstrument(self, connection: BaseDBAsyncClient):
+        for cls in self._client_classes(connection):
+            for method_name, method in list(vars(cls).items()):
+                if getattr(method, "instrumented", False):
+                    setattr(cls, method_name, method.__wrapped__)
+
+    def _instrumented(self, method):
+        @functools.wraps(method)
+        async def wrapper(client, query, *args, **kwargs):
+            started_at = time.perf_counter()
+            try:
+                return await method(client, query, *args, **kwargs)
+            finally:
+                self.record(query, time.perf_counter() - started_at)
+
+        wrapper.instrumented = True
+        return wrapper
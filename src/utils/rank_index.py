@@ -0,0 +1,242 @@
+"""
+In-memory leaderboards, kept up-to-date as the players are saved.
+
+Each cached channel holds the (-experience, -player ID) keys of its players in a sorted list: the rank of a player is a
+binary search away, and a page is a slice of the list. Channels are loaded from the database on first use, and dropped
+when they weren't used for a while, or after `ttl` seconds to pick up changes not made through Player.save() (like
+names, or queries editing players in bulk).
+"""
+import asyncio
+import bisect
+import collections
+import time
+import typing
+
+# The (experience, player ID) of the last row of the previous page
+LeaderboardCursor = typing.Tuple[int, int]
+# (user ID, name, discriminator)
+LeaderboardUser = typing.Tuple[int, str, str]
+
+
+class LeaderboardRow(typing.NamedTuple):
+    player_id: int
+    experience: int
+    user_id: int
+    user_name: str
+    user_discriminator: str
+
+    @property
+    def cursor(self) -> LeaderboardCursor:
+        return self.experience, self.player_id
+
+    @property
+    def user(self) -> str:
+        # Same as str(DiscordUser)
+        if self.user_discriminator not in [None, "0", 0, "0000"]:
+            return f"{self.user_name}#{self.user_discriminator}"
+        else:
+            return self.user_name
+
+
+def _sort_key(experience: int, player_id: int) -> typing.Tuple[int, int]:
+    # Sorted ascending, so that the list is in the leaderboard order
+    return -experience, -player_id
+
+
+class ChannelRanking:
+    def __init__(self, rows: typing.Iterable[LeaderboardRow]):
+        self._rows: typing.Dict[int, LeaderboardRow] = {row.player_id: row for row in rows}
+        self._keys = sorted(_sort_key(row.experience, row.player_id) for row in self._rows.values())
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, player_id: int):
+        return player_id in self._rows
+
+    def rank(self, player_id: int, experience: int) -> int:
+        """
+        1-based rank a player with that experience has, or would have, on the channel.
+        """
+        return bisect.bisect_left(self._keys, _sort_key(experience, player_id)) + 1
+
+    def page(self, after: typing.Optional[LeaderboardCursor] = None, limit: typing.Optional[int] = None):
+        start = 0 if after is None else bisect.bisect_right(self._keys, _sort_key(*after))
+        end = None if limit is None else start + limit
+        return [self._rows[-player_id] for _, player_id in self._keys[start:end]]
+
+    def update(self, player_id: int, experience: int, user: typing.Optional[LeaderboardUser] = None):
+        row = self._rows.get(player_id)
+        if row is not None:
+            if row.experience == experience and (user is None or row[2:] == user):
+                return
+            del self._keys[bisect.bisect_left(self._keys, _sort_key(row.experience, player_id))]
+            user = user or row[2:]
+        elif user is None:
+            raise KeyError(player_id)
+
+        self._rows[player_id] = LeaderboardRow(player_id, experience, *user)
+        bisect.insort(self._keys, _sort_key(experience, player_id))
+
+    def remove(self, player_id: int):
+        row = self._rows.pop(player_id, None)
+        if row is not None:
+            del self._keys[bisect.bisect_left(self._keys, _sort_key(row.experience, player_id))]
+
+
+class RankIndex:
+    """
+    The ChannelRanking of the most recently used channels.
+    """
+
+    def __init__(self, max_channels: int = 1000, ttl: float = 3600):
+        self.max_channels = max_channels
+        self.ttl = ttl
+
+        # channel ID -> (loaded at, ranking), in least recently used order
+        self._channels: "collections.OrderedDict[int, typing.Tuple[float, ChannelRanking]]" = collections.OrderedDict()
+        self._loading: typing.Dict[int, asyncio.Task] = {}
+        # Updates made while the channel is loading, applied once it's loaded
+        self._updates_while_loading: typing.Dict[int, typing.List[tuple]] = {}
+
+        # Statistics
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._channels)
+
+    def configure(self, max_channels: int, ttl: float):
+        self.max_channels = max_channels
+        self.ttl = ttl
+
+    def get(self, channel_id: int) -> typing.Optional[ChannelRanking]:
+        entry = self._channels.get(channel_id)
+        if entry is None:
+            return None
+
+        loaded_at, ranking = entry
+        if time.monotonic() - loaded_at > self.ttl:
+            del self._channels[channel_id]
+            return None
+
+        self._channels.move_to_end(channel_id)
+        return ranking
+
+    async def load(
+        self,
+        channel_id: int,
+        loader: typing.Callable[[int], typing.Awaitable[typing.Iterable[LeaderboardRow]]],
+    ) -> ChannelRanking:
+        """
+        Return the ranking of that channel, built from the rows returned by `loader` if it isn't cached.
+        """
+        ranking = self.get(channel_id)
+        if ranking is not None:
+            self.hits += 1
+            return ranking
+
+        # Shielded, so that the other tasks waiting on that channel don't see our cancellation
+        return await asyncio.shield(self._start_loading(channel_id, loader))
+
+    def get_or_start_loading(
+        self,
+        channel_id: int,
+        loader: typing.Callable[[int], typing.Awaitable[typing.Iterable[LeaderboardRow]]],
+    ) -> typing.Optional[ChannelRanking]:
+        """
+        Return the ranking of that channel if it's cached. Otherwise, start loading it in the background and return
+        None, for the caller to query the database instead.
+        """
+        ranking = self.get(channel_id)
+        if ranking is not None:
+            self.hits += 1
+            return ranking
+
+        self._start_loading(channel_id, loader)
+        return None
+
+    def _start_loading(self, channel_id: int, loader) -> asyncio.Task:
+        loading = self._loading.get(channel_id)
+        if loading is None:
+            self.loads += 1
+            self._updates_while_loading[channel_id] = []
+            loading = self._loading[channel_id] = asyncio.create_task(self._load(channel_id, loader))
+            # Nobody might be waiting on it: a failed load is retried by the next request
+            loading.add_done_callback(lambda task: task.cancelled() or task.exception())
+        return loading
+
+    async def _load(self, channel_id: int, loader) -> ChannelRanking:
+        updates = self._updates_while_loading[channel_id]
+        try:
+            ranking = ChannelRanking(await loader(channel_id))
+        finally:
+            del self._loading[channel_id]
+            del self._updates_while_loading[channel_id]
+
+        for update in updates:
+            if not self._apply(ranking, *update):
+                # Still good enough for the commands waiting on it, but not to be kept
+                return ranking
+
+        self._store(channel_id, ranking)
+        return ranking
+
+    def _store(self, channel_id: int, ranking: ChannelRanking):
+        self._channels[channel_id] = (time.monotonic(), ranking)
+        while len(self._channels) > self.max_channels:
+            self._channels.popitem(last=False)
+            self.evictions += 1
+
+    def _apply(self, ranking: ChannelRanking, player_id: typing.Optional[int], experience: typing.Optional[int], user):
+        """
+        Apply an update to a ranking. Return False if the ranking can't be kept up-to-date anymore.
+        """
+        if player_id is None:
+            # Invalidated
+            return False
+        elif experience is None:
+            ranking.remove(player_id)
+            return True
+
+        try:
+            ranking.update(player_id, experience, user)
+        except KeyError:
+            # A new player, but we don't know their name
+            return False
+        return True
+
+    def _dispatch(self, channel_id: int, *update):
+        updates = self._updates_while_loading.get(channel_id)
+        if updates is not None:
+            updates.append(update)
+            return
+
+        entry = self._channels.get(channel_id)
+        if entry is not None and not self._apply(entry[1], *update):
+            self.invalidate(channel_id)
+
+    def update(self, channel_id: int, player_id: int, experience: int, user: typing.Optional[LeaderboardUser] = None):
+        """
+        Record the new experience of a player, if their channel is cached. The user is only needed for new players.
+        """
+        self._dispatch(channel_id, player_id, experience, user)
+
+    def remove(self, channel_id: int, player_id: int):
+        self._dispatch(channel_id, player_id, None, None)
+
+    def invalidate(self, channel_id: int):
+        self._channels.pop(channel_id, None)
+        updates = self._updates_while_loading.get(channel_id)
+        if updates is not None:
+            # Whatever is being loaded might be outdated already
+            updates.append((None, None, None))
+
+    def clear(self):
+        self._channels.clear()
+
+    @property
+    def hit_rate(self) -> float:
+        requests = self.hits + self.loads
+        return self.hits / requests if requests else 0
@@ -0,0 +1,225 @@
+import collections
+import typing
+
+
+class TokenBucket:
+    """
+    A classic token bucket: `rate` tokens are added every second, up to `capacity` tokens.
+    """
+
+    __slots__ = ("rate", "capacity", "tokens", "updated_at")
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = now
+
+    def refill(self, now: float):
+        if now > self.updated_at:
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated_at) * self.rate
+            )
+            self.updated_at = now
+
+    def has_token(self, now: float) -> bool:
+        self.refill(now)
+        return self.tokens >= 1
+
+    def take(self):
+        self.tokens -= 1
+
+    def is_full(self, now: float) -> bool:
+        self.refill(now)
+        return self.tokens >= self.capacity
+
+
+class KeyedTokenBuckets:
+    """
+    One token bucket per key (guild ID, channel ID, ...), created on demand.
+
+    A full bucket behaves exactly like a new one, so they are dropped by prune() to keep the mapping small.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._buckets: typing.Dict[int, TokenBucket] = {}
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def get(self, key: int, now: float) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.capacity, now)
+        return bucket
+
+    def prune(self, now: float):
+        self._buckets = {
+            key: bucket
+            for key, bucket in self._buckets.items()
+            if not bucket.is_full(now)
+        }
+
+
+class PendingSpawn(typing.NamedTuple):
+    due_at: int
+    guild_id: int
+    channel_id: int
+    item: typing.Any
+
+
+class SpawnDispatcher:
+    """
+    A FIFO queue of the spawns that are due, released according to Discord rate limits.
+
+    Spawns have to get a token from the global bucket, from their guild bucket and from their channel bucket
+    (a channel sends through its webhooks or directly, so that's where the message route limits apply).
+    Spawns that can't get one stay in the queue and roll over to the next iteration, without blocking the
+    spawns of other guilds behind them.
+
+    The global bucket can be shared between several dispatchers (one per shard), since all the shards use the same
+    bot token.
+    """
+
+    def __init__(
+        self,
+        global_bucket: typing.Optional[TokenBucket] = None,
+        guild_rate: float = 1,
+        guild_burst: float = 5,
+        channel_rate: float = 0.5,
+        channel_burst: float = 3,
+        now: float = 0,
+    ):
+        self.queue: typing.Deque[PendingSpawn] = collections.deque()
+        self.global_bucket = global_bucket or TokenBucket(20, 20, now)
+        self.guild_buckets = KeyedTokenBuckets(guild_rate, guild_burst)
+        self.channel_buckets = KeyedTokenBuckets(channel_rate, channel_burst)
+
+        # Statistics
+        self.total_dispatched = 0
+        self.total_deferred = 0
+        self.max_depth = 0
+        self.last_depth = 0
+        self.wait_times: typing.Deque[float] = collections.deque(maxlen=1000)
+
+    def __len__(self):
+        return len(self.queue)
+
+    def push(self, due_at: int, guild_id: int, channel_id: int, item: typing.Any):
+        self.queue.append(PendingSpawn(due_at, guild_id, channel_id, item))
+
+    def dispatch(self, now: int, global_share: typing.Optional[int] = None) -> typing.List[typing.Any]:
+        """
+        Release the pending spawns allowed by the rate limits, oldest first.
+
+        global_share is the most tokens this dispatcher may take from the global bucket, when it's shared with others.
+        """
+        released = []
+        deferred = collections.deque()
+
+        while self.queue:
+            if not self.global_bucket.has_token(now):
+                break
+            if global_share is not None and len(released) >= global_share:
+                break
+
+            pending = self.queue.popleft()
+            guild_bucket = self.guild_buckets.get(pending.guild_id, now)
+            channel_bucket = self.channel_buckets.get(pending.channel_id, now)
+
+            if guild_bucket.has_token(now) and channel_bucket.has_token(now):
+                self.global_bucket.take()
+                guild_bucket.take()
+                channel_bucket.take()
+
+                self.wait_times.append(now - pending.due_at)
+                released.append(pending.item)
+            else:
+                deferred.append(pending)
+
+        deferred.extend(self.queue)
+        self.queue = deferred
+
+        self.total_dispatched += len(released)
+        self.total_deferred += len(deferred)
+        self.last_depth = len(deferred)
+        self.max_depth = max(self.max_depth, self.last_depth)
+
+        return released
+
+    def prune(self, now: int):
+        self.guild_buckets.prune(now)
+        self.channel_buckets.prune(now)
+
+    def wait_time_percentile(self, percentile: float) -> float:
+        if not self.wait_times:
+            return 0
+        wait_times = sorted(self.wait_times)
+        return wait_times[min(len(wait_times) - 1, int(len(wait_times) * percentile / 100))]
+
+
+class FairShares:
+    """
+    Split a token bucket shared by several dispatchers (one per shard) fairly, when it runs short.
+
+    The shards dispatch one after the other every second, always in the same order. Without shares, the first ones
+    would take every token and the last ones would never spawn anything. Shares are computed once per second, from the
+    spawns each dispatcher has waiting: when the bucket has enough tokens for all of them, there is no limit. Otherwise,
+    every dispatcher gets the same share (or all it needs, if that's less), and the tokens left from the division go to
+    a different dispatcher every second. Dispatchers that had nothing waiting when the shares were computed wait for the
+    next second.
+    """
+
+    def __init__(self, bucket: TokenBucket):
+        self.bucket = bucket
+        self._computed_at: typing.Optional[int] = None
+        self._shares: typing.Optional[typing.Dict[typing.Hashable, int]] = None
+
+    def share(
+        self, key: typing.Hashable, now: int, waiting: typing.Callable[[], typing.Dict[typing.Hashable, int]]
+    ) -> typing.Optional[int]:
+        """
+        Return how many tokens the dispatcher `key` may take this second, or None if it can take as many as it needs.
+
+        waiting returns the number of spawns waiting in each dispatcher, and is only called once per second.
+        """
+        if now != self._computed_at:
+            self._computed_at = now
+            self.bucket.refill(now)
+            self._shares = self.compute(int(self.bucket.tokens), waiting(), now)
+
+        if self._shares is None:
+            return None
+        return self._shares.get(key, 0)
+
+    @staticmethod
+    def compute(
+        tokens: int, waiting: typing.Dict[typing.Hashable, int], now: int
+    ) -> typing.Optional[typing.Dict[typing.Hashable, int]]:
+        waiting = {key: count for key, count in waiting.items() if count > 0}
+        if sum(waiting.values()) <= tokens:
+            return None
+
+        keys = sorted(waiting)
+        # Rotate, so that the remainder goes to a different dispatcher every second
+        offset = now % len(keys)
+        keys = keys[offset:] + keys[:offset]
+
+        shares = {}
+        while keys:
+            equal_share = tokens // len(keys)
+            satisfied = [key for key in keys if waiting[key] <= equal_share]
+            if not satisfied:
+                remainder = tokens - equal_share * len(keys)
+                for i, key in enumerate(keys):
+                    shares[key] = equal_share + (1 if i < remainder else 0)
+                break
+
+            for key in satisfied:
+                shares[key] = waiting[key]
+                tokens -= waiting[key]
+            keys = [key for key in keys if key not in shares]
+
+        return shares
@@ -0,0 +1,234 @@
+"""
+Binary snapshots of the live spawning state: the ducks currently spawned and the ducks left to spawn on every channel.
+
+They are written periodically so that a crash doesn't lose every duck, and so that the bot can restart where it
+stopped instead of planning the day again. The format is a header followed by struct-packed records, all little
+endian:
+
+- header: magic, format version, time the snapshot was taken at, planned day, number of strings, number of ducks,
+  number of channels
+- string: length, followed by the UTF-8 string. Categories, webhook avatars and usernames, and the extra data of the
+  ducks are stored once here, and referenced by their index in the duck records
+- duck: channel ID, spawned for, lives left, lives, decoy, index of the category, of the webhook avatar, of the webhook
+  username, and of the extra data (the rest of Duck.serialize(), as JSON)
+- channel: channel ID, day ducks left, night ducks left, whether the settings of the channel are still waiting to
+  be refreshed from the database for the new day (see DucksSpawning.start_rollover)
+
+Duck records have a fixed size, so that they are read in one go, and the JSON of the extra data is only decoded once
+per distinct value, instead of once per duck.
+"""
+import contextlib
+import gc
+import json
+import os
+import struct
+import typing
+
+SNAPSHOT_MAGIC = b"DHSS"
+SNAPSHOT_VERSION = 2
+
+HEADER = struct.Struct("<4sHdqIII")
+STRING_LENGTH = struct.Struct("<I")
+DUCK = struct.Struct("<QdiiBIIII")
+DUCKS_LEFT = struct.Struct("<QIIB")
+
+# Index of the strings that aren't set, such as the extra data of most ducks
+NO_STRING = 0xFFFFFFFF
+
+# Fields stored in the fixed part of the duck records
+DUCK_FIELDS = {"category", "spawned_at", "spawned_for", "lives_left", "lives", "decoy", "webhook_parameters"}
+WEBHOOK_FIELDS = {"avatar_url", "username"}
+
+
+class SpawnSnapshot(typing.NamedTuple):
+    taken_at: float
+    planned_day: int
+    # (channel ID, serialized duck)
+    ducks: typing.List[typing.Tuple[int, dict]]
+    # channel ID -> (day ducks, night ducks)
+    ducks_left: typing.Dict[int, typing.Tuple[int, int]]
+    # IDs of the channels whose settings the rollover didn't refresh from the database yet
+    rollover_pending: typing.FrozenSet[int] = frozenset()
+
+
+def _none_to_minus_one(value: typing.Optional[int]) -> int:
+    return -1 if value is None else value
+
+
+@contextlib.contextmanager
+def paused_gc():
+    """
+    Pause the garbage collector while a snapshot is loaded or restored. Everything created then is kept alive, so the
+    collections triggered every few hundred allocations wouldn't free anything, and would take most of the time.
+    """
+    was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if was_enabled:
+            gc.enable()
+
+
+def dump_snapshot(snapshot: SpawnSnapshot) -> bytes:
+    strings: typing.Dict[str, int] = {}
+
+    def intern(string: typing.Optional[str]) -> int:
+        if string is None:
+            return NO_STRING
+        index = strings.get(string)
+        if index is None:
+            index = strings[string] = len(strings)
+        return index
+
+    records = []
+    for channel_id, data in snapshot.ducks:
+        extra = {k: v for k, v in data.items() if k not in DUCK_FIELDS}
+        webhook_parameters = data["webhook_parameters"]
+        if webhook_parameters.keys() == WEBHOOK_FIELDS:
+            avatar_url = intern(webhook_parameters["avatar_url"])
+            username = intern(webhook_parameters["username"])
+        else:
+            avatar_url = username = NO_STRING
+            extra["webhook_parameters"] = webhook_parameters
+
+        records.append(
+            DUCK.pack(
+                channel_id,
+                data["spawned_for"] or 0,
+                _none_to_minus_one(data["lives_left"]),
+                _none_to_minus_one(data["lives"]),
+                bool(data["decoy"]),
+                intern(data["category"]),
+                avatar_url,
+                username,
+                intern(json.dumps(extra, separators=(",", ":"), sort_keys=True) if extra else None),
+            )
+        )
+
+    parts = [
+        HEADER.pack(
+            SNAPSHOT_MAGIC,
+            SNAPSHOT_VERSION,
+            snapshot.taken_at,
+            snapshot.planned_day,
+            len(strings),
+            len(snapshot.ducks),
+            len(snapshot.ducks_left),
+        )
+    ]
+
+    for string in strings:
+        encoded = string.encode()
+        parts.append(STRING_LENGTH.pack(len(encoded)))
+        parts.append(encoded)
+
+    parts.extend(records)
+
+    for channel_id, (day_ducks, night_ducks) in snapshot.ducks_left.items():
+        parts.append(
+            DUCKS_LEFT.pack(channel_id, day_ducks, night_ducks, channel_id in snapshot.rollover_pending)
+        )
+
+    return b"".join(parts)
+
+
+def load_snapshot(data: bytes) -> SpawnSnapshot:
+    """
+    Parse a snapshot made by dump_snapshot. Raises ValueError if it is truncated or from an unknown version.
+    """
+    try:
+        magic, version, taken_at, planned_day, strings_count, ducks_count, ducks_left_count = HEADER.unpack_from(
+            data, 0
+        )
+    except struct.error as e:
+        raise ValueError(f"Truncated snapshot header: {e}")
+
+    if magic != SNAPSHOT_MAGIC:
+        raise ValueError("Not a spawn snapshot")
+    if version != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version {version}")
+
+    offset = HEADER.size
+    strings = []
+    # Extra data decoded from the strings, by index
+    extras: typing.Dict[int, dict] = {}
+    ducks = []
+    ducks_left = {}
+    rollover_pending = set()
+
+    with paused_gc():
+        try:
+            for _ in range(strings_count):
+                (length,) = STRING_LENGTH.unpack_from(data, offset)
+                offset += STRING_LENGTH.size
+                if offset + length > len(data):
+                    raise ValueError("Truncated snapshot: missing strings")
+                strings.append(data[offset:offset + length].decode())
+                offset += length
+
+            ducks_end = offset + DUCK.size * ducks_count
+            if ducks_end > len(data):
+                raise ValueError("Truncated snapshot: missing ducks")
+
+            for (
+                channel_id, spawned_for, lives_left, lives, decoy, category, avatar_url, username, extra
+            ) in DUCK.iter_unpack(data[offset:ducks_end]):
+                duck = {
+                    "category": strings[category],
+                    "spawned_for": spawned_for,
+                    "lives_left": None if lives_left == -1 else lives_left,
+                    "lives": None if lives == -1 else lives,
+                    "decoy": decoy == 1,
+                }
+
+                if avatar_url != NO_STRING:
+                    duck["webhook_parameters"] = {"avatar_url": strings[avatar_url], "username": strings[username]}
+
+                if extra != NO_STRING:
+                    parsed_extra = extras.get(extra)
+                    if parsed_extra is None:
+                        parsed_extra = extras[extra] = json.loads(strings[extra])
+                    if "webhook_parameters" in parsed_extra:
+                        # Each duck gets its own copy, as ducks change their webhook parameters
+                        parsed_extra = json.loads(strings[extra])
+                    duck.update(parsed_extra)
+
+                ducks.append((channel_id, duck))
+            offset = ducks_end
+
+            for channel_id, day_ducks, night_ducks, pending in DUCKS_LEFT.iter_unpack(
+                data[offset:offset + DUCKS_LEFT.size * ducks_left_count]
+            ):
+                ducks_left[channel_id] = (day_ducks, night_ducks)
+                if pending:
+                    rollover_pending.add(channel_id)
+        except (struct.error, IndexError) as e:
+            raise ValueError(f"Truncated snapshot: {e}")
+
+    if len(ducks_left) != ducks_left_count:
+        raise ValueError("Truncated snapshot: missing channels")
+
+    return SpawnSnapshot(taken_at, planned_day, ducks, ducks_left, frozenset(rollover_pending))
+
+
+def write_snapshot(path: str, data: bytes):
+    """
+    Atomically replace the snapshot at path: a crash while writing leaves the previous snapshot untouched.
+    """
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+def read_snapshot(path: str) -> typing.Optional[SpawnSnapshot]:
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+
+    return load_snapshot(data)
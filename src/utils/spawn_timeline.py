@@ -0,0 +1,50 @@
+import heapq
+import itertools
+import typing
+
+from utils.models import DucksLeft, SunState
+
+
+class SpawnTimeline:
+    """
+    A min-heap of the next duck spawn planned on every channel, so that each loop iteration only looks at the
+    channels that have a duck due, instead of rolling the dice on every enabled channel.
+
+    Only the next spawn of each channel is kept in the heap: once it is popped, the following one is drawn with
+    plan(). Entries are never removed from the heap when a channel gets replanned or disabled. Instead, they are
+    skipped when popped if their DucksLeft isn't the one currently in bot.enabled_channels.
+    """
+
+    def __init__(self):
+        self._heap: typing.List[typing.Tuple[int, int, DucksLeft, SunState]] = []
+        self._counter = itertools.count()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def rebuild(self, ducks_lefts: typing.Iterable[DucksLeft], now: int):
+        heap = []
+        for ducks_left in ducks_lefts:
+            next_spawn = ducks_left.next_spawn(now)
+            if next_spawn:
+                timestamp, sun_state = next_spawn
+                heap.append((timestamp, next(self._counter), ducks_left, sun_state))
+
+        heapq.heapify(heap)
+        self._heap = heap
+
+    def plan(self, ducks_left: DucksLeft, now: int):
+        next_spawn = ducks_left.next_spawn(now)
+        if next_spawn:
+            timestamp, sun_state = next_spawn
+            heapq.heappush(
+                self._heap, (timestamp, next(self._counter), ducks_left, sun_state)
+            )
+
+    def pop_due(
+        self, now: int
+    ) -> typing.Optional[typing.Tuple[int, DucksLeft, SunState]]:
+        if self._heap and self._heap[0][0] <= now:
+            timestamp, _, ducks_left, sun_state = heapq.heappop(self._heap)
+            return timestamp, ducks_left, sun_state
+        return None
@@ -1,5 +1,6 @@
 import gettext
-from typing import Optional
+import pathlib
+from typing import Dict, Optional, Tuple
 
 import polib
 
@@ -74,27 +75,145 @@ TRANSLATORS = {
 }
 
 
-def get_translation(language_code):
-    return gettext.translation(
-        "messages", localedir="locales/", languages=[language_code], fallback=True
-    )
+LOCALES_DIRECTORY = "locales/"
+
+
+def normalize_language_code(language_code: str) -> str:
+    """
+    Turn a language code from the database (like pt-BR) into the name of its locales/ directory (like pt_BR).
+    """
+    if language_code == "zh-Hans":
+        return "zh"  # Babel don't know about Simplified Chinese
+    return language_code.replace("-", "_")
+
+
+def _germanic_plural(n):
+    return int(n != 1)
+
+
+class Catalog:
+    """
+    The translations of one language, as plain dicts.
+    """
+
+    __slots__ = ("language_code", "messages", "plurals", "plural")
+
+    def __init__(self, language_code: str, messages: Dict[str, str], plurals: Dict[str, Tuple[str, ...]], plural=None):
+        self.language_code = language_code
+        self.messages = messages
+        # Every form of the plural messages, by singular message
+        self.plurals = plurals
+        self.plural = plural or _germanic_plural
+
+    @classmethod
+    def from_mo(cls, language_code: str, path: str) -> "Catalog":
+        with open(path, "rb") as f:
+            translations = gettext.GNUTranslations(f)
+
+        messages, plurals = {}, {}
+        for key, message in translations._catalog.items():
+            if isinstance(key, tuple):
+                singular, index = key
+                plurals.setdefault(singular, {})[index] = message
+            else:
+                messages[key] = message
+
+        plurals = {singular: tuple(forms[i] for i in sorted(forms)) for singular, forms in plurals.items()}
+        singular_index = translations.plural(1)
+        for singular, forms in plurals.items():
+            # Like GNUTranslations, gettext() on a plural message returns its singular form
+            if singular_index < len(forms):
+                messages.setdefault(singular, forms[singular_index])
+
+        return cls(language_code, messages, plurals, translations.plural)
+
+    def gettext(self, message: str) -> str:
+        return self.messages.get(message, message)
+
+    def ngettext(self, singular: str, plural: str, n) -> str:
+        forms = self.plurals.get(singular)
+        if forms is None:
+            return singular if n == 1 else plural
+        index = self.plural(n)
+        if index < len(forms):
+            return forms[index]
+        return singular if n == 1 else plural
+
+    def __len__(self):
+        return len(self.messages)
+
+
+class CatalogRegistry:
+    """
+    Every compiled catalog under locales/, loaded once instead of looking for the .mo file of each translated message.
+
+    Language codes are resolved to a catalog the first time they are seen, the same way gettext.translation() would:
+    pt_BR uses the pt_BR catalog, fr_CA the fr one, and unknown languages get an empty catalog that leaves messages in
+    english.
+    """
+
+    def __init__(self, localedir: str = LOCALES_DIRECTORY, domain: str = "messages"):
+        self.localedir = localedir
+        self.domain = domain
+        self.loaded = False
+        self.catalogs: Dict[str, Catalog] = {}
+        self._resolved: Dict[str, Catalog] = {}
+
+    def load(self):
+        catalogs = {}
+        for mo_file in sorted(pathlib.Path(self.localedir).glob(f"*/LC_MESSAGES/{self.domain}.mo")):
+            language_code = mo_file.parent.parent.name
+            catalogs[language_code] = Catalog.from_mo(language_code, str(mo_file))
+
+        self.catalogs = catalogs
+        self._resolved = {}
+        self.loaded = True
+
+    def _resolve(self, language_code: str) -> Catalog:
+        if not self.loaded:
+            self.load()
+
+        path = gettext.find(self.domain, localedir=self.localedir, languages=[normalize_language_code(language_code)])
+        if path is None:
+            catalog = Catalog(language_code, {}, {})
+        else:
+            catalog = self.catalogs.get(pathlib.Path(path).parent.parent.name)
+            if catalog is None:
+                # Compiled after the catalogs were loaded
+                catalog = Catalog.from_mo(language_code, path)
+
+        self._resolved[language_code] = catalog
+        return catalog
+
+    def get(self, language_code: str) -> Catalog:
+        catalog = self._resolved.get(language_code)
+        if catalog is None:
+            catalog = self._resolve(language_code)
+        return catalog
+
+    def __len__(self):
+        return len(self.catalogs)
+
+
+CATALOGS = CatalogRegistry()
 
 
 def translate(message, language_code):
-    return get_translation(language_code).gettext(message)
+    return CATALOGS.get(language_code).gettext(message)
 
 
 def ntranslate(singular, plural, n, language_code):
-    return get_translation(language_code).ngettext(singular, plural, n)
+    return CATALOGS.get(language_code).ngettext(singular, plural, n)
 
 
 def get_translate_function(bot_or_ctx, language_code, additional_kwargs=None):
     if additional_kwargs is None:
         additional_kwargs = {}
+    gettext = CATALOGS.get(language_code).gettext
 
     def _(message, **kwargs):
         kwargs = {**additional_kwargs, **kwargs}
-        translated_message = translate(message, language_code)
+        translated_message = gettext(message)
         try:
             formatted_message = translated_message.format(**kwargs)
         except KeyError:
@@ -110,10 +229,11 @@ def get_translate_function(bot_or_ctx, language_code, additional_kwargs=None):
 def get_ntranslate_function(bot_or_ctx, language_code, additional_kwargs=None):
     if additional_kwargs is None:
         additional_kwargs = {}
+    catalog = CATALOGS.get(language_code)
 
     def ngettext(singular, plural, n, **kwargs):
         kwargs = {**additional_kwargs, "n": n, **kwargs}
-        translated_message = ntranslate(singular, plural, n, language_code)
+        translated_message = catalog.ngettext(singular, plural, n)
         try:
             formatted_message = translated_message.format(**kwargs)
         except KeyError:
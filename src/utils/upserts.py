@@ -0,0 +1,143 @@
+"""
+Single-statement "get or create" queries, used to create the guild, channel, user, member and player rows in as few
+round trips as possible.
+
+Tortoise's get_or_create() is a SELECT followed by an INSERT (and a SELECT again on conflict). Instead, on PostgreSQL,
+everything is done by a single statement:
+
+- upsert_row: INSERT ... ON CONFLICT (pk) DO UPDATE ... RETURNING, for the tables keyed by Discord IDs. Columns like
+  the names are only updated when they changed, so that unchanged rows aren't rewritten.
+- insert_row_if_missing: a SELECT and a conditional INSERT ... RETURNING chained in CTEs, for the members and players,
+  which don't have a unique constraint to conflict on.
+
+SQLite (used by the tests) can't chain INSERTs in CTEs, so the same queries are split in two statements there.
+"""
+import typing
+
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.models import Model
+
+MODEL = typing.TypeVar("MODEL", bound=Model)
+
+
+class _Parameters:
+    def __init__(self, connection: BaseDBAsyncClient):
+        self.postgres = connection.capabilities.dialect == "postgres"
+        self.values = []
+
+    def add(self, value) -> str:
+        self.values.append(value)
+        return f"${len(self.values)}" if self.postgres else "?"
+
+
+def _insert_values(instance: Model) -> typing.Dict[str, typing.Any]:
+    """
+    The columns and values that Tortoise would INSERT for that instance, defaults included.
+    """
+    meta = instance._meta
+    values = {}
+    for field_name, column in meta.fields_db_projection.items():
+        field = meta.fields_map[field_name]
+        value = getattr(instance, field_name)
+        if field.generated and value is None:
+            # Let the database generate it. Discord IDs primary keys are "generated" too, but always set.
+            continue
+        values[column] = field.to_db_value(value, instance)
+    return values
+
+
+def _insert_sql(table: str, values: typing.Dict[str, typing.Any], parameters: _Parameters, select=False) -> str:
+    columns = ", ".join(f'"{column}"' for column in values.keys())
+    placeholders = ", ".join(parameters.add(value) for value in values.values())
+    if select:
+        return f'INSERT INTO "{table}" ({columns}) SELECT {placeholders}'
+    return f'INSERT INTO "{table}" ({columns}) VALUES ({placeholders})'
+
+
+def _where_sql(values: typing.Dict[str, typing.Any], match_columns: typing.Iterable[str], parameters: _Parameters):
+    return " AND ".join(f'"{column}" = {parameters.add(values[column])}' for column in match_columns)
+
+
+async def upsert_row(
+    connection: BaseDBAsyncClient, instance: MODEL, refresh_fields: typing.Iterable[str] = ()
+) -> MODEL:
+    """
+    Insert that instance, or if a row already exists with the same primary key, update its `refresh_fields` from the
+    instance when they changed. Return the row as a new instance, with every column loaded.
+    """
+    model = type(instance)
+    meta = model._meta
+    table = meta.db_table
+    pk = meta.db_pk_column
+    values = _insert_values(instance)
+    refresh_columns = [meta.fields_db_projection[field_name] for field_name in refresh_fields]
+
+    parameters = _Parameters(connection)
+    insert = _insert_sql(table, values, parameters)
+    if refresh_columns:
+        distinct = "IS DISTINCT FROM" if parameters.postgres else "IS NOT"
+        assignments = ", ".join(f'"{column}" = EXCLUDED."{column}"' for column in refresh_columns)
+        changed = " OR ".join(f'"{table}"."{column}" {distinct} EXCLUDED."{column}"' for column in refresh_columns)
+        on_conflict = f'ON CONFLICT ("{pk}") DO UPDATE SET {assignments} WHERE {changed}'
+    else:
+        on_conflict = f'ON CONFLICT ("{pk}") DO NOTHING'
+
+    if parameters.postgres:
+        # Rows left untouched by the ON CONFLICT aren't RETURNed, so they are selected from the table.
+        sql = (
+            f"WITH upserted AS ({insert} {on_conflict} RETURNING *) "
+            f"SELECT * FROM upserted UNION ALL "
+            f'SELECT * FROM "{table}" WHERE {_where_sql(values, [pk], parameters)} '
+            f"AND NOT EXISTS (SELECT 1 FROM upserted)"
+        )
+        rows = await connection.execute_query_dict(sql, parameters.values)
+    else:
+        rows = await connection.execute_query_dict(f"{insert} {on_conflict} RETURNING *", parameters.values)
+
+    if not rows:
+        # On PostgreSQL, the SELECT of the CTE sees the table as it was when the statement started: a row committed by
+        # another connection after that conflicts with the INSERT, but isn't selected when it's left unchanged. A new
+        # statement sees it.
+        parameters = _Parameters(connection)
+        sql = f'SELECT * FROM "{table}" WHERE {_where_sql(values, [pk], parameters)}'
+        rows = await connection.execute_query_dict(sql, parameters.values)
+
+    return model._init_from_db(**rows[0])
+
+
+async def insert_row_if_missing(
+    connection: BaseDBAsyncClient, instance: MODEL, match_fields: typing.Iterable[str]
+) -> typing.Tuple[MODEL, bool]:
+    """
+    Return the first row matching the instance on `match_fields`, or insert the instance if there is none.
+    Like get_or_create, the second value is True if the row was created.
+
+    Nothing prevents two concurrent calls from inserting the same row: callers must hold a lock on the matched values.
+    """
+    model = type(instance)
+    meta = model._meta
+    table = meta.db_table
+    values = _insert_values(instance)
+    match_columns = [meta.fields_db_projection[field_name] for field_name in match_fields]
+
+    parameters = _Parameters(connection)
+    if parameters.postgres:
+        where = _where_sql(values, match_columns, parameters)
+        insert = _insert_sql(table, values, parameters, select=True)
+        sql = (
+            f'WITH existing AS (SELECT * FROM "{table}" WHERE {where} LIMIT 1), '
+            f"inserted AS ({insert} WHERE NOT EXISTS (SELECT 1 FROM existing) RETURNING *) "
+            f"SELECT *, false AS _created FROM existing UNION ALL SELECT *, true AS _created FROM inserted"
+        )
+        rows = await connection.execute_query_dict(sql, parameters.values)
+    else:
+        sql = f'SELECT *, 0 AS _created FROM "{table}" WHERE {_where_sql(values, match_columns, parameters)} LIMIT 1'
+        rows = await connection.execute_query_dict(sql, parameters.values)
+        if not rows:
+            parameters = _Parameters(connection)
+            sql = f"{_insert_sql(table, values, parameters)} RETURNING *, 1 AS _created"
+            rows = await connection.execute_query_dict(sql, parameters.values)
+
+    row = rows[0]
+    created = bool(row.pop("_created"))
+    return model._init_from_db(**row), created
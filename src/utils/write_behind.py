@@ -0,0 +1,156 @@
+import asyncio
+import typing
+
+from tortoise.models import Model
+
+BufferKey = typing.Tuple[typing.Any, ...]
+
+
+class WriteBehindBuffer:
+    """
+    Coalesces the saves of frequently updated objects.
+
+    When enabled, save() only marks an object as dirty here. The object stays the authoritative version of its row
+    (lookups must check get() before reading the database), and the columns that changed are written every `interval`
+    seconds, with one batched UPDATE per set of changed columns. Objects are expected to use DirtyFieldsModel.
+    """
+
+    def __init__(self, key: typing.Callable[[Model], BufferKey], interval: float = 0, max_pending: int = 5000):
+        self.key = key
+        self.interval = interval
+        self.max_pending = max_pending
+
+        self._pending: typing.Dict[BufferKey, Model] = {}
+        # Objects removed from _pending whose changes are being written
+        self._writing: typing.Dict[BufferKey, Model] = {}
+        self._task: typing.Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self.logger = None
+
+        # Statistics
+        self.coalesced_saves = 0
+        self.rows_written = 0
+        self.statements = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval > 0
+
+    def __len__(self):
+        return len(self._pending)
+
+    def configure(self, interval: float, max_pending: int = 5000):
+        self.interval = interval
+        self.max_pending = max_pending
+
+    def get(self, key: BufferKey) -> typing.Optional[Model]:
+        return self._pending.get(key) or self._writing.get(key)
+
+    def pending(self) -> typing.List[Model]:
+        """
+        The objects with changes that weren't written yet.
+        """
+        return list(self._pending.values()) + list(self._writing.values())
+
+    def add(self, obj: Model) -> bool:
+        """
+        Mark that object as dirty. Return False if another instance of the same row is already pending, in which case
+        the object must be saved directly.
+        """
+        key = self.key(obj)
+        pending = self._pending.get(key)
+        if pending is not None and pending is not obj:
+            return False
+
+        self._pending[key] = obj
+        self.coalesced_saves += 1
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush_loop())
+        elif len(self._pending) >= self.max_pending:
+            asyncio.create_task(self.flush())
+
+        return True
+
+    async def _flush_loop(self):
+        while self._pending:
+            await asyncio.sleep(self.interval)
+            try:
+                # Shielded, so that close() can't interrupt a write half-way
+                await asyncio.shield(self.flush())
+            except Exception:
+                if self.logger:
+                    self.logger.exception("Failed to flush the write-behind buffer, will retry")
+
+    async def flush(self, objects: typing.Optional[typing.Iterable[Model]] = None):
+        """
+        Write the pending changes of these objects (or of every object), and wait for them to be written.
+        """
+        if objects is None:
+            objects = list(self._pending.values())
+        else:
+            objects = [obj for obj in objects if self._pending.get(self.key(obj)) is obj]
+
+        if not objects:
+            # Still wait for the writes in progress
+            async with self._flush_lock:
+                return
+
+        model = type(objects[0])
+        meta = model._meta
+        all_fields = tuple(field for field in meta.fields_db_projection.keys() if not meta.fields_map[field].pk)
+
+        # Serialize everything before yielding, so that changes made during the flush stay pending.
+        batches: typing.Dict[typing.Tuple[str, ...], typing.List[typing.Tuple[Model, list]]] = {}
+        for obj in objects:
+            key = self.key(obj)
+            del self._pending[key]
+            changed_fields = obj.changed_fields()
+            fields = all_fields if changed_fields is None else tuple(changed_fields)
+            if not fields:
+                continue
+
+            self._writing[key] = obj
+
+            values = [meta.fields_map[field].to_db_value(getattr(obj, field), obj) for field in fields]
+            values.append(meta.pk.to_db_value(obj.pk, obj))
+            obj.snapshot_fields(None if changed_fields is None else fields)
+            batches.setdefault(fields, []).append((obj, values))
+
+        async with self._flush_lock:
+            connection = meta.db
+            executor = connection.executor_class(model=model, db=connection)
+            failed = []
+            for fields, rows in batches.items():
+                try:
+                    await connection.execute_many(executor.get_update_sql(fields, None), [values for _, values in rows])
+                except Exception:
+                    failed.extend(obj for obj, _ in rows)
+                else:
+                    self.statements += 1
+                    self.rows_written += len(rows)
+                finally:
+                    for obj, _ in rows:
+                        key = self.key(obj)
+                        if self._writing.get(key) is obj:
+                            del self._writing[key]
+
+        if failed:
+            for obj in failed:
+                # We don't know what was written anymore: write everything next time
+                obj._saved_values = None
+                self._pending.setdefault(self.key(obj), obj)
+            raise RuntimeError(f"{len(failed)} objects couldn't be written, they will be retried")
+
+    async def close(self):
+        """
+        Write everything that's pending, for instance before shutting down.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+    @property
+    def coalescing_ratio(self) -> float:
+        return self.coalesced_saves / self.rows_written if self.rows_written else 0